@@ -0,0 +1,145 @@
+"""
+One Amadeus access token shared by every travel tool in the process.
+
+Each tool used to POST to the OAuth endpoint when it was built (and the booking
+tool before every search), so building a team cost four round trips before any
+work happened. The token manager fetches a token once and hands it to every tool
+until shortly before it expires. A call inside the last REFRESH_AHEAD seconds
+still gets the current token but starts a refresh on a background thread, so a
+busy process never waits for a new token. Only a token that is missing or about
+to expire makes the caller wait, and then only one caller fetches while the
+others wait for its result.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import requests
+from dotenv import load_dotenv
+
+import amadeus_http
+from instrumentation import timed
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_ENDPOINT = amadeus_http.AMADEUS_API_ENDPOINT
+# start refreshing this many seconds before the token expires (Amadeus tokens last 30 minutes)
+REFRESH_AHEAD = int(os.getenv("AMADEUS_TOKEN_REFRESH_AHEAD", "300"))
+# below this many seconds a token is not used any more, callers wait for a new one
+EXPIRY_MARGIN = 30
+# Amadeus sends expires_in, this is only used if it doesn't
+DEFAULT_EXPIRES_IN = 1799
+OAUTH_TIMEOUT = 15
+
+
+class AmadeusAuthError(Exception):
+    """Raised when Amadeus won't give us an access token."""
+
+
+class TokenManager:
+    """Caches one access token for an Amadeus endpoint. Safe to use from threads and from async code."""
+
+    def __init__(self, api_endpoint: str = DEFAULT_API_ENDPOINT, client_id: str = None, client_secret: str = None):
+        self.api_endpoint = api_endpoint
+        self.client_id = client_id or os.getenv("AMADEUS_KEY")
+        self.client_secret = client_secret or os.getenv("AMADEUS_SECRET")
+        # (token, monotonic expiry time), replaced as a whole so readers never see half an update
+        self._current = (None, 0.0)
+        self._lock = threading.Lock()
+        # separate from _lock so a caller with a good token never waits behind a fetch
+        self._refresh_lock = threading.Lock()
+        self._refreshing = False
+        self.fetches = 0
+
+    def _remaining(self) -> float:
+        return self._current[1] - time.monotonic()
+
+    def _fetch(self):
+        base_url = amadeus_http.api_url(self.api_endpoint, "/v1/security/oauth2/token")
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        api_key = {
+            "grant_type": "client_credentials",
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+        }
+        try:
+            with timed("amadeus_request_seconds", tool="amadeus_auth", route="oauth"):
+                response = amadeus_http.get_session().post(base_url, headers=headers, data=api_key, timeout=OAUTH_TIMEOUT)
+            data = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise AmadeusAuthError(f"Could not reach the Amadeus OAuth endpoint: {e}")
+        if "access_token" not in data:
+            raise AmadeusAuthError(f"Amadeus refused the credentials: {data.get('error_description') or data}")
+
+        expires_in = float(data.get("expires_in", DEFAULT_EXPIRES_IN))
+        self._current = (data["access_token"], time.monotonic() + expires_in)
+        self.fetches += 1
+        logger.debug("Fetched a new Amadeus token for %s, expires in %ss", self.api_endpoint, expires_in)
+
+    def _refresh(self):
+        try:
+            with self._lock:
+                # someone may have refreshed while this thread was starting
+                if self._remaining() <= REFRESH_AHEAD:
+                    self._fetch()
+        except AmadeusAuthError:
+            # the current token is still good for a while, the next call tries again
+            logger.warning("Background Amadeus token refresh failed", exc_info=True)
+        finally:
+            self._refreshing = False
+
+    def _refresh_in_background(self):
+        with self._refresh_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, name="amadeus-token-refresh", daemon=True).start()
+
+    def get_token(self) -> str:
+        """Returns a valid access token, fetching one first if there isn't one."""
+        token, _ = self._current
+        remaining = self._remaining()
+        if token is not None and remaining > EXPIRY_MARGIN:
+            if remaining <= REFRESH_AHEAD:
+                self._refresh_in_background()
+            return token
+
+        with self._lock:
+            # only the first caller through fetches, the rest find the new token here
+            if self._current[0] is None or self._remaining() <= EXPIRY_MARGIN:
+                self._fetch()
+            return self._current[0]
+
+    async def aget_token(self) -> str:
+        """Async version of get_token; only leaves the event loop when the caller has to wait for a fetch."""
+        token, _ = self._current
+        remaining = self._remaining()
+        if token is not None and remaining > EXPIRY_MARGIN:
+            if remaining <= REFRESH_AHEAD:
+                # starting the refresh thread doesn't block, the current token is still good
+                self._refresh_in_background()
+            return token
+        return await asyncio.to_thread(self.get_token)
+
+    def invalidate(self, token: str):
+        """Drops a token Amadeus rejected, so the next call fetches a new one."""
+        with self._lock:
+            if self._current[0] == token:
+                self._current = (None, 0.0)
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_token_manager(api_endpoint: str = DEFAULT_API_ENDPOINT) -> TokenManager:
+    """Returns the process-wide token manager for the endpoint."""
+    with _managers_lock:
+        manager = _managers.get(api_endpoint)
+        if manager is None:
+            manager = _managers[api_endpoint] = TokenManager(api_endpoint)
+        return manager
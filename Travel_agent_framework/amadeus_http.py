@@ -0,0 +1,153 @@
+"""
+Shared, connection-pooled HTTP clients for the Amadeus API.
+
+A bare requests.get opens a new TCP connection and TLS session for every call,
+which costs more than many of the Amadeus calls themselves. Every tool now goes
+through one requests.Session per process (and one httpx.AsyncClient per event
+loop for async code), which keeps up to AMADEUS_POOL_SIZE connections per host
+alive between calls.
+
+get()/aget() also add the shared Amadeus token and, if Amadeus answers 401
+because the token was revoked early, retry once with a new one. They wait for a
+slot from the shared rate limiter before every call and retry 429 and 5xx
+answers with backoff (see amadeus_limiter).
+"""
+import asyncio
+import os
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from amadeus_limiter import get_rate_limiter, retry_delay
+
+load_dotenv()
+
+# where Amadeus calls go: api.amadeus.com (production), test.api.amadeus.com (test environment),
+# or a full URL like http://127.0.0.1:8001 for the local stand-in server (benchmarks/amadeus_standin.py)
+AMADEUS_API_ENDPOINT = os.getenv("AMADEUS_API_ENDPOINT", "api.amadeus.com")
+# connections kept open per host, and the most requests in flight per host for the async client
+POOL_SIZE = int(os.getenv("AMADEUS_POOL_SIZE", "10"))
+CONNECT_TIMEOUT = float(os.getenv("AMADEUS_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("AMADEUS_READ_TIMEOUT", "30"))
+# idle connections are closed after this many seconds (async client only, requests keeps them until the server hangs up)
+KEEPALIVE_EXPIRY = float(os.getenv("AMADEUS_KEEPALIVE_EXPIRY", "60"))
+
+_session = None
+_session_lock = threading.Lock()
+# an httpx.AsyncClient only works on the loop it was first used on, so there is one per loop
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def api_url(api_endpoint: str, path: str) -> str:
+    """The URL of an API path; endpoints without a scheme use https."""
+    if "://" not in api_endpoint:
+        api_endpoint = "https://" + api_endpoint
+    return api_endpoint.rstrip("/") + path
+
+
+def get_session() -> requests.Session:
+    """Returns the process-wide session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                # no automatic retries here, a failed call is reported to the caller as before
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Returns the async client for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE, keepalive_expiry=KEEPALIVE_EXPIRY),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def close():
+    """Closes the pooled connections of the shared session."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+async def aclose():
+    """Closes the async client of the running event loop."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def _retry(response, attempt: int, limiter):
+    """Seconds to wait before trying a rate limited or failed call again, or None to return the response."""
+    delay = retry_delay(response.status_code, response.headers.get("Retry-After"), attempt)
+    if delay is not None and response.status_code == 429:
+        limiter.back_off(delay)
+    return delay
+
+
+def get(url: str, params=None, auth=None) -> requests.Response:
+    """
+    GET through the shared session, within the Amadeus rate limit. auth is a
+    TokenManager whose token is sent as a bearer token. 429 and 5xx answers are
+    retried with backoff; raises AmadeusQuotaExceeded once the monthly quota is used up.
+    """
+    limiter = get_rate_limiter()
+    token_refreshed = False
+    attempt = 0
+    while True:
+        limiter.wait()
+        headers = {}
+        if auth is not None:
+            token = auth.get_token()
+            headers["Authorization"] = "Bearer " + token
+        response = get_session().get(url, params=params, headers=headers, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        if response.status_code == 401 and auth is not None and not token_refreshed:
+            # the token was revoked before it expired, fetch a new one and try again
+            auth.invalidate(token)
+            token_refreshed = True
+            continue
+        delay = _retry(response, attempt, limiter)
+        if delay is None:
+            return response
+        attempt += 1
+        time.sleep(delay)
+
+
+async def aget(url: str, params=None, auth=None) -> httpx.Response:
+    """Async version of get(), through the event loop's pooled client."""
+    limiter = get_rate_limiter()
+    token_refreshed = False
+    attempt = 0
+    while True:
+        await limiter.await_slot()
+        headers = {}
+        if auth is not None:
+            token = await auth.aget_token()
+            headers["Authorization"] = "Bearer " + token
+        response = await get_async_client().get(url, params=params, headers=headers)
+        if response.status_code == 401 and auth is not None and not token_refreshed:
+            auth.invalidate(token)
+            token_refreshed = True
+            continue
+        delay = _retry(response, attempt, limiter)
+        if delay is None:
+            return response
+        attempt += 1
+        await asyncio.sleep(delay)
@@ -0,0 +1,196 @@
+"""
+Keeps the travel tools inside the Amadeus quotas.
+
+Every Amadeus GET takes a slot from one token bucket per process, refilled at
+AMADEUS_RATE_LIMIT requests per second with bursts of up to AMADEUS_RATE_BURST.
+A caller that finds the bucket empty waits for its slot (sleeping, or awaiting
+in async code) instead of being answered 429 by Amadeus. Callers are served in
+the order they asked, so under load the calls go out evenly at the configured
+rate.
+
+When Amadeus still answers 429 or a 5xx, the call is retried up to
+AMADEUS_MAX_RETRIES times with jittered exponential backoff (or after the
+Retry-After Amadeus sends). A 429 also holds back every other caller for the
+same time, so the process backs off as a whole.
+
+AMADEUS_MONTHLY_QUOTA (0 means no limit) caps the calls in a calendar month.
+Once it is used up, calls fail straight away with AmadeusQuotaExceeded instead
+of running up charges. Set AMADEUS_USAGE_PATH to count the calls in a SQLite
+file, which keeps the count across restarts and shares it between processes.
+"""
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+from instrumentation import count, observe
+
+load_dotenv()
+
+# Amadeus allows 10 requests per second on the test environment and 40 in production
+AMADEUS_RATE_LIMIT = float(os.getenv("AMADEUS_RATE_LIMIT", "10"))
+# left empty (as in .env.example) it defaults to the rate
+AMADEUS_RATE_BURST = float(os.getenv("AMADEUS_RATE_BURST") or 0) or AMADEUS_RATE_LIMIT
+AMADEUS_MONTHLY_QUOTA = int(os.getenv("AMADEUS_MONTHLY_QUOTA", "0"))
+AMADEUS_USAGE_PATH = os.getenv("AMADEUS_USAGE_PATH", "")
+AMADEUS_MAX_RETRIES = int(os.getenv("AMADEUS_MAX_RETRIES", "3"))
+# the first retry waits about AMADEUS_RETRY_BASE_DELAY seconds, doubling each time up to AMADEUS_RETRY_MAX_DELAY
+AMADEUS_RETRY_BASE_DELAY = float(os.getenv("AMADEUS_RETRY_BASE_DELAY", "0.5"))
+AMADEUS_RETRY_MAX_DELAY = float(os.getenv("AMADEUS_RETRY_MAX_DELAY", "8"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class AmadeusQuotaExceeded(Exception):
+    """Raised instead of calling Amadeus once the monthly quota is used up."""
+
+
+def _month() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m")
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every thread and event loop in the process, plus the
+    monthly call count. reserve() hands out the slots, the caller does the waiting.
+    """
+
+    def __init__(self, rate: float = AMADEUS_RATE_LIMIT, burst: float = AMADEUS_RATE_BURST, monthly_quota: int = AMADEUS_MONTHLY_QUOTA, path: str = AMADEUS_USAGE_PATH):
+        self.rate = rate
+        self.burst = burst or rate
+        self.monthly_quota = monthly_quota
+        self.path = path
+        # may go below zero: every caller takes a token straight away and waits until the bucket is back at zero
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._month = _month()
+        self._month_calls = 0
+        self.calls = 0
+        self.waits = 0
+        self.waited_seconds = 0.0
+        self.backoffs = 0
+        if path:
+            with self._connect() as db:
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute("CREATE TABLE IF NOT EXISTS amadeus_usage (month TEXT PRIMARY KEY, calls INTEGER NOT NULL)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _take_quota(self) -> bool:
+        """Counts one call against this month's quota, or returns False if it is used up."""
+        month = _month()
+        if self.path:
+            with self._connect() as db:
+                row = db.execute(
+                    "INSERT INTO amadeus_usage (month, calls) VALUES (?, 1) "
+                    "ON CONFLICT (month) DO UPDATE SET calls = calls + 1 WHERE calls < ? RETURNING calls",
+                    (month, self.monthly_quota),
+                ).fetchone()
+            return row is not None
+        if month != self._month:
+            self._month, self._month_calls = month, 0
+        if self._month_calls >= self.monthly_quota:
+            return False
+        self._month_calls += 1
+        return True
+
+    def reserve(self) -> float:
+        """Takes a slot for one call and returns how many seconds to wait before making it."""
+        with self._lock:
+            if self.monthly_quota and not self._take_quota():
+                count("amadeus_quota_exceeded")
+                raise AmadeusQuotaExceeded(f"The monthly Amadeus quota of {self.monthly_quota} calls is used up")
+            if self.rate <= 0:
+                self.calls += 1
+                return 0.0
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.calls += 1
+            if wait:
+                self.waits += 1
+                self.waited_seconds += wait
+        if wait:
+            observe("amadeus_rate_limit_wait_seconds", wait)
+        return wait
+
+    def back_off(self, seconds: float):
+        """Holds back every caller for seconds, after Amadeus said we were going too fast."""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            # the next free slot is at least seconds away. Calls already waiting keep their slots
+            # and the rest follow at the normal rate, rather than all going at once when the time is up
+            self._tokens = min(self._tokens, -seconds * self.rate)
+            self.backoffs += 1
+
+    def wait(self):
+        time.sleep(self.reserve())
+
+    async def await_slot(self):
+        if self.path:
+            wait = await asyncio.to_thread(self.reserve)
+        else:
+            wait = self.reserve()
+        await asyncio.sleep(wait)
+
+    def used_this_month(self) -> int:
+        if self.path:
+            with self._connect() as db:
+                row = db.execute("SELECT calls FROM amadeus_usage WHERE month = ?", (_month(),)).fetchone()
+            return row[0] if row else 0
+        with self._lock:
+            return self._month_calls if self._month == _month() else 0
+
+    def stats(self) -> dict:
+        used = self.used_this_month() if self.monthly_quota else None
+        with self._lock:
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "calls": self.calls,
+                "waits": self.waits,
+                "waited_seconds": round(self.waited_seconds, 3),
+                "backoffs": self.backoffs,
+                "monthly_quota": self.monthly_quota,
+                "used_this_month": used,
+            }
+
+
+def retry_delay(status_code: int, retry_after, attempt: int):
+    """
+    Seconds to wait before retrying a call Amadeus answered with status_code, or
+    None if it shouldn't be retried. attempt is the number of retries so far.
+    """
+    if status_code not in RETRY_STATUSES or attempt >= AMADEUS_MAX_RETRIES:
+        return None
+    count("retries", component="amadeus", reason=str(status_code))
+    try:
+        return min(float(retry_after), AMADEUS_RETRY_MAX_DELAY)
+    except (TypeError, ValueError):
+        pass
+    # half fixed and half random, so retries from callers that failed together spread out but never go at once
+    backoff = min(AMADEUS_RETRY_MAX_DELAY, AMADEUS_RETRY_BASE_DELAY * 2 ** attempt)
+    return backoff / 2 + random.uniform(0, backoff / 2)
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Returns the process-wide limiter, creating it on first use."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
@@ -0,0 +1,327 @@
+"""
+Building blocks shared by the caches of the backend and the travel tools.
+
+MemoryStore and SQLiteStore are the LRU stores behind the itinerary cache
+(backend/cache.py) and the flight-offer cache. StaleWhileRevalidate puts a
+fetch in front of a cache: concurrent misses on the same key share one fetch,
+and a stale value is returned straight away while one refresh runs in the
+background. The flight-offer cache and the hotel catalog both use it.
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime
+
+from instrumentation import count
+
+logger = logging.getLogger(__name__)
+
+DATE_FORMATS = ["%Y-%m-%d", "%m/%d/%Y", "%m-%d-%Y", "%Y/%m/%d"]
+# keys whose last fetch time is remembered, see StaleWhileRevalidate._finished
+RECENT_FETCHES = 1024
+
+
+def iso_date(value):
+    """The date in value as YYYY-MM-DD, or None if it isn't in one of DATE_FORMATS."""
+    text = str(value).strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+class MemoryStore:
+    """LRU store kept in this process. Entries are (created_at, value)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key, created_at, value) -> int:
+        """Stores value and returns how many least recently used entries were evicted to make room."""
+        self._entries[key] = (created_at, value)
+        self._entries.move_to_end(key)
+        evicted = 0
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def delete(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteStore:
+    """
+    LRU store in a table of a SQLite file, shared by every process that opens
+    the same path. Values are text, or anything JSON can hold with json_values.
+    """
+
+    def __init__(self, path: str, table: str, max_entries: int, json_values: bool = False):
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.json_values = json_values
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            db.execute(f"CREATE INDEX IF NOT EXISTS {table}_last_used ON {table} (last_used)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key):
+        with self._connect() as db:
+            row = db.execute(f"SELECT created_at, value FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                db.execute(f"UPDATE {self.table} SET last_used = ? WHERE key = ?", (time.time(), key))
+        if row is None:
+            return None
+        created_at, value = row
+        return created_at, json.loads(value) if self.json_values else value
+
+    def set(self, key, created_at, value) -> int:
+        """Stores value and returns how many least recently used entries were evicted to make room."""
+        with self._connect() as db:
+            db.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value) if self.json_values else value, created_at, time.time()),
+            )
+            cursor = db.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            return cursor.rowcount
+
+    def delete(self, key):
+        with self._connect() as db:
+            db.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._connect() as db:
+            db.execute(f"DELETE FROM {self.table}")
+
+    def __len__(self):
+        with self._connect() as db:
+            return db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class StaleWhileRevalidate:
+    """
+    get_or_fetch for a cache that has lookup(key) -> (value, fresh), with value
+    None on a miss, and save(key, value).
+
+    Only one fetch per key runs at a time: callers that miss while it is in
+    flight wait for it (a Future for threads, a shared Task for the callers on
+    an event loop) instead of fetching again. A stale value is returned as is
+    and refreshed once in the background. name is the instrumentation counter
+    the cache reports under; blocking says lookup and save touch the disk and
+    run off the event loop.
+    """
+
+    def __init__(self, lookup, save, name: str, description: str, blocking: bool = False):
+        self.lookup = lookup
+        self.save = save
+        self.name = name
+        self.description = description
+        self.blocking = blocking
+        self._lock = threading.Lock()
+        # misses being fetched: Futures of sync callers by key, Tasks of async callers by (loop, key)
+        self._fetching = {}
+        self._afetching = {}
+        # when the last fetch of each key ended, for a miss that raced it (see _raced)
+        self._finished = OrderedDict()
+        # keys being refreshed in the background, so a busy key gets one refresh at a time
+        self._refreshing = set()
+        # background refresh tasks, kept so they aren't garbage collected mid-flight
+        self._tasks = set()
+        self.coalesced = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    async def _call(self, fn, *args):
+        if self.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def _joined(self):
+        with self._lock:
+            self.coalesced += 1
+        count(self.name, result="coalesced")
+
+    def _fetch_ended(self, key):
+        # called with self._lock held
+        self._finished[key] = time.monotonic()
+        self._finished.move_to_end(key)
+        while len(self._finished) > RECENT_FETCHES:
+            self._finished.popitem(last=False)
+
+    def _raced(self, key, missed_at) -> bool:
+        """
+        True if a fetch of key ended after the lookup that missed started. That
+        lookup may have run just before the fetch saved its value, so look again
+        rather than fetching a second time. Called with self._lock held.
+        """
+        return self._finished.get(key, float("-inf")) >= missed_at
+
+    def _fetch_once(self, key, fetch, missed_at):
+        with self._lock:
+            future = self._fetching.get(key)
+            raced = future is None and self._raced(key, missed_at)
+            leader = future is None and not raced
+            if leader:
+                future = self._fetching[key] = Future()
+        if raced:
+            missed_at = time.monotonic()
+            value, _ = self.lookup(key)
+            if value is not None:
+                self._joined()
+                return value
+            return self._fetch_once(key, fetch, missed_at)
+        if not leader:
+            self._joined()
+            return future.result()
+
+        try:
+            value = fetch()
+            self.save(key, value)
+        except BaseException as e:
+            # the callers waiting on this fetch get the same error
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                del self._fetching[key]
+                self._fetch_ended(key)
+
+    async def _fetch_and_save(self, key, afetch):
+        value = await afetch()
+        await self._call(self.save, key, value)
+        return value
+
+    def _forget(self, loop_key, task):
+        with self._lock:
+            if self._afetching.get(loop_key) is task:
+                del self._afetching[loop_key]
+                self._fetch_ended(loop_key[1])
+        if not task.cancelled():
+            # mark the error as seen in case every caller stopped waiting
+            task.exception()
+
+    async def _afetch_once(self, key, afetch, missed_at):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            future = self._fetching.get(key)
+            task = self._afetching.get((loop, key))
+            raced = future is None and task is None and self._raced(key, missed_at)
+            leader = future is None and task is None and not raced
+            if leader:
+                task = self._afetching[loop, key] = loop.create_task(self._fetch_and_save(key, afetch))
+        if raced:
+            missed_at = time.monotonic()
+            value, _ = await self._call(self.lookup, key)
+            if value is not None:
+                self._joined()
+                return value
+            return await self._afetch_once(key, afetch, missed_at)
+        if not leader:
+            self._joined()
+            if future is not None:
+                # a thread is already fetching it
+                return await asyncio.wrap_future(future)
+        else:
+            task.add_done_callback(lambda done: self._forget((loop, key), done))
+        # a caller that is cancelled stops waiting, the fetch still finishes and fills the cache
+        return await asyncio.shield(task)
+
+    def _start_refresh(self, key) -> bool:
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            self.refreshes += 1
+            return True
+
+    def _refresh_failed(self):
+        with self._lock:
+            self.refresh_errors += 1
+        count(self.name, result="refresh_error")
+        # the stale value keeps being served, the next lookup tries again
+        logger.warning("Background refresh of %s failed", self.description, exc_info=True)
+
+    def _refresh(self, key, fetch):
+        try:
+            self.save(key, fetch())
+        except Exception:
+            self._refresh_failed()
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    async def _arefresh(self, key, afetch):
+        try:
+            await self._fetch_and_save(key, afetch)
+        except Exception:
+            self._refresh_failed()
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get_or_fetch(self, key, fetch):
+        """
+        Returns the cached value for key, calling fetch() to get one on a miss.
+        A stale value is returned as is and refreshed on a background thread.
+        """
+        missed_at = time.monotonic()
+        value, fresh = self.lookup(key)
+        if value is None:
+            return self._fetch_once(key, fetch, missed_at)
+        if not fresh and self._start_refresh(key):
+            threading.Thread(target=self._refresh, args=(key, fetch), name=f"{self.name}-refresh", daemon=True).start()
+        return value
+
+    async def aget_or_fetch(self, key, afetch):
+        """Async version of get_or_fetch; afetch is a coroutine function and stale values refresh as a task."""
+        missed_at = time.monotonic()
+        value, fresh = await self._call(self.lookup, key)
+        if value is None:
+            return await self._afetch_once(key, afetch, missed_at)
+        if not fresh and self._start_refresh(key):
+            task = asyncio.create_task(self._arefresh(key, afetch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "coalesced": self.coalesced,
+                "refreshes": self.refreshes,
+                "refresh_errors": self.refresh_errors,
+            }
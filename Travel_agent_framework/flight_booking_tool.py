@@ -1,17 +1,21 @@
 import requests
 import json
-import os
 from dotenv import load_dotenv
 from fairlib.core.interfaces.tools import AbstractTool
+from instrumentation import timed
+from amadeus_auth import get_token_manager
+import amadeus_http
+from amadeus_limiter import AmadeusQuotaExceeded
 load_dotenv()
 
 class FlightTool(AbstractTool):
     def __init__(self):
         super().__init__()
-        self.api_endpoint = "api.amadeus.com" # production environment
-        # self.api_endpoint = "api.amadeus.com" # test environment
+        # production by default, set AMADEUS_API_ENDPOINT for the test environment or the local stand-in server
+        self.api_endpoint = amadeus_http.AMADEUS_API_ENDPOINT
 
-        self.token = self.get_auth_token()
+        # every tool shares one token per endpoint, fetched on first use
+        self.auth = get_token_manager(self.api_endpoint)
 
     name = "flight_booking_tool"
     description = (
@@ -28,22 +32,10 @@ class FlightTool(AbstractTool):
         return flights
 
     def get_auth_token(self):
-        base_url = f"https://{self.api_endpoint}/v1/security/oauth2/token"
-        headers = {"Content-Type": "application/x-www-form-urlencoded"}
-        api_key = {
-            "grant_type":"client_credentials",
-            "client_id":os.getenv("AMADEUS_KEY"),
-            "client_secret":os.getenv("AMADEUS_SECRET")
-        }
-        try:
-            response = requests.post(base_url, headers=headers, data=api_key).json()
-            token = response["access_token"]
-            return token
-        except:
-            print(response)
+        return self.auth.get_token()
 
     def search_flights(self, flightInfo):
-        base_url = f"https://{self.api_endpoint}/v2/shopping/flight-offers"
+        base_url = amadeus_http.api_url(self.api_endpoint, "/v2/shopping/flight-offers")
         
         # Gather user input
         origin = flightInfo["ORIGIN"].strip().upper()
@@ -66,14 +58,10 @@ class FlightTool(AbstractTool):
             "returnDate":return_date
         }
 
-        token = self.get_auth_token()
-        headers = {
-            "Authorization": "Bearer " + token
-        }
-
         try:
 
-            response = requests.get(base_url, headers=headers, params=params)
+            with timed("amadeus_request_seconds", tool=self.name, route="flight_offers"):
+                response = amadeus_http.get(base_url, params=params, auth=self.auth)
             response.raise_for_status()
             data = response.json()
             output_str = ""
@@ -97,7 +85,7 @@ class FlightTool(AbstractTool):
                         output_str += (f"    {flightNumber}: {dep} -> {arr} ({dep_time} -> {arr_time})")
 
             return output_str
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, AmadeusQuotaExceeded) as e:
             return(f"API request failed: {e}")
 
 
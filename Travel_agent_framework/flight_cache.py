@@ -0,0 +1,153 @@
+"""
+Short-lived cache of Amadeus flight-offer responses, keyed on the search parameters.
+
+The flight researcher repeats the same search a lot, within a run when the
+manager asks again and across runs for popular routes. Responses are kept for
+FLIGHT_CACHE_TTL seconds. For FLIGHT_CACHE_STALE_TTL seconds after that an old
+response is still returned straight away, while one refresh runs in the
+background (stale-while-revalidate), so a repeated search never waits for
+Amadeus. After that the entry is dropped and the next search waits for a new
+response. Searches that miss while the same search is already on its way to
+Amadeus wait for that response instead of sending their own.
+
+The cache lives in memory by default. Set FLIGHT_CACHE_PATH to keep it in a
+SQLite file that survives restarts and is shared by every process. Only
+successful responses are cached.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from caching import MemoryStore, SQLiteStore, StaleWhileRevalidate, iso_date
+from instrumentation import count
+
+load_dotenv()
+
+FLIGHT_CACHE_TTL = int(os.getenv("FLIGHT_CACHE_TTL", "600"))
+FLIGHT_CACHE_STALE_TTL = int(os.getenv("FLIGHT_CACHE_STALE_TTL", "1200"))
+FLIGHT_CACHE_SIZE = int(os.getenv("FLIGHT_CACHE_SIZE", "512"))
+FLIGHT_CACHE_PATH = os.getenv("FLIGHT_CACHE_PATH", "")
+
+
+def _normalize_price(value) -> str:
+    text = str(value).strip().replace("$", "").replace(",", "")
+    try:
+        return f"{float(text):.0f}"
+    except ValueError:
+        return text
+
+
+def flight_cache_key(params: dict, api_endpoint: str = "") -> str:
+    """Returns the cache key for a flight-offers query, the same for equivalent parameters."""
+    # the endpoint is part of the key so test or stand-in responses never answer production searches
+    normalized = {"endpoint": api_endpoint}
+    for name, value in params.items():
+        if value is None or value == "":
+            continue
+        if name in ("departureDate", "returnDate"):
+            value = iso_date(value) or str(value).strip()
+        elif name == "maxPrice":
+            value = _normalize_price(value)
+        elif isinstance(value, str):
+            value = value.strip().upper()
+        normalized[name] = value
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class FlightCache:
+    """
+    TTL + LRU cache of flight-offer responses with stale-while-revalidate.
+
+    Cached responses are shared, callers must not modify them.
+    """
+
+    def __init__(self, ttl: int = FLIGHT_CACHE_TTL, stale_ttl: int = FLIGHT_CACHE_STALE_TTL, max_entries: int = FLIGHT_CACHE_SIZE, path: str = FLIGHT_CACHE_PATH):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        if path:
+            self._store = SQLiteStore(path, "flight_offers", max_entries, json_values=True)
+        else:
+            self._store = MemoryStore(max_entries)
+        self._lock = threading.Lock()
+        self._revalidator = StaleWhileRevalidate(self.lookup, self.set, "flight_cache", "a cached flight search", blocking=self.on_disk)
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def on_disk(self) -> bool:
+        return isinstance(self._store, SQLiteStore)
+
+    def lookup(self, key: str):
+        """Returns (response, fresh), or (None, False) if there is nothing usable."""
+        with self._lock:
+            entry = self._store.get(key)
+            if entry is None:
+                self.misses += 1
+                count("flight_cache", result="miss")
+                return None, False
+            created_at, value = entry
+            age = time.time() - created_at
+            if age <= self.ttl:
+                self.hits += 1
+                count("flight_cache", result="hit")
+                return value, True
+            if age <= self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                count("flight_cache", result="stale")
+                return value, False
+            self._store.delete(key)
+            self.misses += 1
+            count("flight_cache", result="miss")
+            return None, False
+
+    def set(self, key: str, response):
+        with self._lock:
+            self.evictions += self._store.set(key, time.time(), response)
+
+    def get_or_fetch(self, key: str, fetch):
+        """
+        Returns the cached response for key, calling fetch() to get one on a miss.
+        Concurrent misses on the same key share one fetch. A stale response is
+        returned as is and refreshed on a background thread.
+        """
+        return self._revalidator.get_or_fetch(key, fetch)
+
+    async def aget_or_fetch(self, key: str, afetch):
+        """Async version of get_or_fetch; afetch is a coroutine function and stale entries refresh as a task."""
+        return await self._revalidator.aget_or_fetch(key, afetch)
+
+    def stats(self) -> dict:
+        fetches = self._revalidator.stats()
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "backend": "sqlite" if self.on_disk else "memory",
+                "entries": len(self._store),
+                "ttl": self.ttl,
+                "stale_ttl": self.stale_ttl,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                **fetches,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.stale_hits) / lookups, 3) if lookups else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_flight_cache() -> FlightCache:
+    """Returns the process-wide flight-offer cache, creating it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = FlightCache()
+        return _cache
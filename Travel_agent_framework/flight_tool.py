@@ -1,52 +1,77 @@
 import requests
+import httpx
 import json
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
 from dotenv import load_dotenv
 from fairlib.core.interfaces.tools import AbstractTool
+from instrumentation import timed
+from amadeus_auth import get_token_manager
+import amadeus_http
+from amadeus_limiter import AmadeusQuotaExceeded
+from flight_cache import get_flight_cache, flight_cache_key
+from travel_offers import parse_flight_offers, rank_flights, format_flights, format_price_matrix, flex_date_pairs
 load_dotenv()
 
+# flight offers shown to the agent, out of the up to 20 Amadeus returns
+FLIGHT_TOP_K = int(os.getenv("FLIGHT_TOP_K", "5"))
+# a flexible-date search tries up to this many days either side of each date, this many searches at a time
+FLIGHT_FLEX_MAX_DAYS = int(os.getenv("FLIGHT_FLEX_MAX_DAYS", "3"))
+FLIGHT_FLEX_CONCURRENCY = int(os.getenv("FLIGHT_FLEX_CONCURRENCY", "4"))
+# offers shown for the cheapest date pair of a flexible-date search
+FLEX_OPTIONS_SHOWN = 3
+
 class FlightTool(AbstractTool):
     def __init__(self):
         super().__init__()
-        self.api_endpoint = "api.amadeus.com" # production environment
-        # self.api_endpoint = "api.amadeus.com" # test environment
+        # production by default, set AMADEUS_API_ENDPOINT for the test environment or the local stand-in server
+        self.api_endpoint = amadeus_http.AMADEUS_API_ENDPOINT
 
-        self.token = self.get_auth_token()
+        # every tool shares one token per endpoint, fetched on first use
+        self.auth = get_token_manager(self.api_endpoint)
+        # identical searches are answered from here instead of Amadeus
+        self.cache = get_flight_cache()
+        # offers shown per search
+        self.top_k = FLIGHT_TOP_K
     
     name = "flight_search_tool"
     description = (
         "A tool for finding flights."
         "Inputs must follow the exact format of the examples, with no additional entries."
         "Leave out the return date field if you are looking for a one way flight. Must specify Max_Price."
+        "Optionally add Max_Stops (0 for nonstop) and Max_Hours (longest flight time each way)."
+        "If the dates are flexible add Flex_Days (e.g. 3 for plus or minus 3 days) to get the cheapest price for every "
+        "departure and return date in that window, and the best flights on the cheapest dates, in one call."
         "Example inputs:\n"
         '{"Origin": "DEN", "Destination": "MCO",  "Departure": "2025-11-20", "Return":"2025-11-22", "Max_Price": "600"}\n'
-        '{"Origin": "BOS", "Destination": "LAX",  "Departure": "2026-01-17", "Max_Price": "750"}'
+        '{"Origin": "BOS", "Destination": "LAX",  "Departure": "2026-01-17", "Max_Price": "750"}\n'
+        '{"Origin": "JFK", "Destination": "FCO",  "Departure": "2026-05-02", "Return":"2026-05-12", "Max_Price": "1200", "Max_Stops": "1", "Max_Hours": "14"}\n'
+        '{"Origin": "DEN", "Destination": "MCO",  "Departure": "2026-03-11", "Return":"2026-03-18", "Max_Price": "600", "Flex_Days": "3"}'
     )
 
     def use(self, expression: str) -> str:
         expression = expression.upper()
         user_specs_obj = json.loads(expression)
+        if "FLEX_DAYS" in user_specs_obj:
+            return self.search_flex(user_specs_obj)
         flights = self.search_flights(user_specs_obj)
         return flights
 
     def get_auth_token(self):
-        base_url = f"https://{self.api_endpoint}/v1/security/oauth2/token"
-        headers = {"Content-Type": "application/x-www-form-urlencoded"}
-        api_key = {
-            "grant_type":"client_credentials",
-            "client_id":os.getenv("AMADEUS_KEY"),
-            "client_secret":os.getenv("AMADEUS_SECRET")
-        }
-        try:
-            response = requests.post(base_url, headers=headers, data=api_key).json()
-            token = response["access_token"]
-            return token
-        except:
-            print(response)
+        return self.auth.get_token()
 
-    def search_flights(self, flightInfo):
-        base_url = f"https://{self.api_endpoint}/v2/shopping/flight-offers"
-        
+    async def ause(self, expression: str) -> str:
+        # same as use() but waits for Amadeus without blocking the event loop
+        expression = expression.upper()
+        user_specs_obj = json.loads(expression)
+        if "FLEX_DAYS" in user_specs_obj:
+            return await self.asearch_flex(user_specs_obj)
+        flights = await self.asearch_flights(user_specs_obj)
+        return flights
+
+    def flight_params(self, flightInfo):
         # Gather user input
         origin = flightInfo["ORIGIN"].strip().upper()
         destination = flightInfo["DESTINATION"].strip().upper()
@@ -68,42 +93,155 @@ class FlightTool(AbstractTool):
         }
         if return_date:
             params["returnDate"] = return_date
+        return params
 
-        # Replace this with your real token
-        token = self.token
-        headers = {
-            "Authorization": "Bearer " + token
-        }
+    def flight_limits(self, flightInfo):
+        # optional, offers with more stops or longer legs are dropped before ranking. Values that aren't numbers are ignored
+        try:
+            max_stops = int(str(flightInfo["MAX_STOPS"]).strip())
+        except (KeyError, ValueError):
+            max_stops = None
+        try:
+            max_minutes = int(float(str(flightInfo["MAX_HOURS"]).strip()) * 60)
+        except (KeyError, ValueError):
+            max_minutes = None
+        return max_stops, max_minutes
+
+    def format_flights(self, data, flightInfo=None):
+        # parse once, rank here and only show the agent the best few
+        offers = parse_flight_offers(data)
+        max_stops, max_minutes = self.flight_limits(flightInfo or {})
+        top = rank_flights(offers, self.top_k, max_stops, max_minutes)
+        return format_flights(top, len(offers))
+
+    def error_details(self, e):
+        # Amadeus explains what was wrong with the search in the error response
+        try:
+            return e.response.json()["errors"][0]["detail"]
+        except Exception:
+            return "none"
+
+    def fetch_flights(self, params):
+        base_url = amadeus_http.api_url(self.api_endpoint, "/v2/shopping/flight-offers")
+        with timed("amadeus_request_seconds", tool=self.name, route="flight_offers"):
+            response = amadeus_http.get(base_url, params=params, auth=self.auth)
+        response.raise_for_status()
+        return response.json()
+
+    async def afetch_flights(self, params):
+        base_url = amadeus_http.api_url(self.api_endpoint, "/v2/shopping/flight-offers")
+        with timed("amadeus_request_seconds", tool=self.name, route="flight_offers"):
+            response = await amadeus_http.aget(base_url, params=params, auth=self.auth)
+        response.raise_for_status()
+        return response.json()
+
+    def search_flights(self, flightInfo):
+        params = self.flight_params(flightInfo)
+
+        try:
+            data = self.cache.get_or_fetch(flight_cache_key(params, self.api_endpoint), lambda: self.fetch_flights(params))
+            return self.format_flights(data, flightInfo)
+        except (requests.exceptions.RequestException, AmadeusQuotaExceeded) as e:
+            return(f"API request failed: {e}\nDetails: {self.error_details(e)}")
+
+    async def asearch_flights(self, flightInfo):
+        params = self.flight_params(flightInfo)
+
+        try:
+            data = await self.cache.aget_or_fetch(flight_cache_key(params, self.api_endpoint), lambda: self.afetch_flights(params))
+            return self.format_flights(data, flightInfo)
+        except (httpx.HTTPError, AmadeusQuotaExceeded) as e:
+            return(f"API request failed: {e}\nDetails: {self.error_details(e)}")
+
+    def flex_dates(self, flightInfo):
+        """
+        The departure dates, the return dates ([None] for one way) and the
+        (departure, return) pairs to search. Raises ValueError on bad input.
+        """
+        flex_days = max(0, min(int(str(flightInfo["FLEX_DAYS"]).strip()), FLIGHT_FLEX_MAX_DAYS))
+        departure = date.fromisoformat(flightInfo["DEPARTURE"].strip())
+        return_date = None
+        if str(flightInfo.get("RETURN", "")).strip():
+            return_date = date.fromisoformat(flightInfo["RETURN"].strip())
+        return flex_date_pairs(departure, return_date, flex_days)
+
+    def flex_params(self, flightInfo, departure, return_date):
+        # the same parameters as a normal search, so the date pairs share the flight cache with them
+        params = self.flight_params(flightInfo)
+        params["departureDate"] = departure.isoformat()
+        if return_date is not None:
+            params["returnDate"] = return_date.isoformat()
+        return params
+
+    def search_date_pair(self, params):
+        return self.cache.get_or_fetch(flight_cache_key(params, self.api_endpoint), lambda: self.fetch_flights(params))
+
+    async def asearch_date_pair(self, params, semaphore):
+        async with semaphore:
+            return await self.cache.aget_or_fetch(flight_cache_key(params, self.api_endpoint), lambda: self.afetch_flights(params))
+
+    def format_flex(self, flightInfo, departures, returns, results):
+        """results maps (departure, return date) to the response or the exception of that search."""
+        errors = [result for result in results.values() if isinstance(result, Exception)]
+        if errors and len(errors) == len(results):
+            return f"API request failed: {errors[0]}\nDetails: {self.error_details(errors[0])}"
+
+        max_stops, max_minutes = self.flight_limits(flightInfo)
+        cells = {}
+        best = None
+        for pair, result in results.items():
+            if isinstance(result, Exception):
+                cells[pair] = "error"
+                continue
+            offers = parse_flight_offers(result)
+            top = rank_flights(offers, FLEX_OPTIONS_SHOWN, max_stops, max_minutes)
+            cells[pair] = top[0].price if top else None
+            if top and (best is None or top[0].price < best[1][0].price):
+                best = (pair, top, len(offers))
+
+        output_str = format_price_matrix(departures, returns, cells)
+        if best is not None:
+            (departure, return_date), top, found = best
+            dates = departure.isoformat() + (f" returning {return_date.isoformat()}" if return_date else "")
+            output_str += f"\n\nCheapest dates: {dates}\n" + format_flights(top, found)
+        return output_str
+
+    def search_flex(self, flightInfo):
+        try:
+            departures, returns, pairs = self.flex_dates(flightInfo)
+        except (KeyError, ValueError):
+            return "A flexible-date search needs Departure (and Return) as YYYY-MM-DD and Flex_Days as a number of days."
+        if not pairs:
+            return "No dates in the window are in the future."
+
+        # every date pair is its own search, a few at a time on top of the Amadeus rate limit
+        results = {}
+        with ThreadPoolExecutor(max_workers=min(FLIGHT_FLEX_CONCURRENCY, len(pairs))) as executor:
+            futures = {pair: executor.submit(self.search_date_pair, self.flex_params(flightInfo, *pair)) for pair in pairs}
+            for pair, future in futures.items():
+                try:
+                    results[pair] = future.result()
+                except (requests.exceptions.RequestException, AmadeusQuotaExceeded) as e:
+                    results[pair] = e
+        return self.format_flex(flightInfo, departures, returns, results)
 
+    async def asearch_flex(self, flightInfo):
         try:
+            departures, returns, pairs = self.flex_dates(flightInfo)
+        except (KeyError, ValueError):
+            return "A flexible-date search needs Departure (and Return) as YYYY-MM-DD and Flex_Days as a number of days."
+        if not pairs:
+            return "No dates in the window are in the future."
 
-            response = requests.get(base_url, headers=headers, params=params)
-            data = response.json()
-            response.raise_for_status()
-            output_str = ""
-
-            output_str += ("--- Flight Options: ---\n")
-            for offer_num, offer in enumerate(data.get("data", []), start =1):
-                price = offer["price"]["total"]
-                itineraries = offer["itineraries"]
-                output_str += f"\n Option {offer_num}"
-                output_str += (f"\n   Total Price: {price}")
-                for i, itinerary in enumerate(itineraries, start=1):
-                    if i == 1: output_str += (f"\n   Departure:")
-                    else: output_str += (f"\n   Return:")
-
-                    for segment in itinerary["segments"]:
-                        flightNumber = segment["carrierCode"] + segment["number"]
-                        dep = segment["departure"]["iataCode"]
-                        arr = segment["arrival"]["iataCode"]
-                        dep_time = segment["departure"]["at"]
-                        arr_time = segment["arrival"]["at"]
-                        output_str += (f"    flight number [{flightNumber}]: {dep} -> {arr} ({dep_time} -> {arr_time})")
-            if(len(data.get("data", [])) == 0):
-                output_str += "No available flights given the input parameters."
-            return output_str
-        except requests.exceptions.RequestException as e:
-            return(f"API request failed: {e}\nDetails: {data["errors"][0]["detail"]}")
+        semaphore = asyncio.Semaphore(FLIGHT_FLEX_CONCURRENCY)
+        responses = await asyncio.gather(
+            *(self.asearch_date_pair(self.flex_params(flightInfo, *pair), semaphore) for pair in pairs), return_exceptions=True
+        )
+        for response in responses:
+            # anything other than an HTTP failure is a bug and shouldn't be hidden
+            if isinstance(response, Exception) and not isinstance(response, (httpx.HTTPError, AmadeusQuotaExceeded)):
+                raise response
+        return self.format_flex(flightInfo, departures, returns, dict(zip(pairs, responses)))
 
 
 if __name__ == "__main__":
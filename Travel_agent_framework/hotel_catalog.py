@@ -0,0 +1,185 @@
+"""
+Local copy of the Amadeus hotel-by-city catalog.
+
+The list of hotels in a city hardly ever changes, but HotelTool used to fetch it
+from /v1/reference-data/locations/hotels/by-city before every offer search. The
+catalog keeps each (city, ratings) listing in a SQLite file, so the hotel IDs
+come from disk and only the hotel-offers pricing call still goes to Amadeus.
+
+A listing older than HOTEL_CATALOG_MAX_AGE days is still used, but refreshed on
+a background thread (or task) the first time it is read, and searches for a
+city that is already being fetched wait for that listing. Hotels are stored
+once each with their ID as the primary key, and every listing only holds the IDs.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from dotenv import load_dotenv
+
+import amadeus_http
+from caching import StaleWhileRevalidate
+from instrumentation import count
+
+load_dotenv()
+
+HOTEL_CATALOG_PATH = os.getenv("HOTEL_CATALOG_PATH", os.path.join(os.path.dirname(__file__), "hotel_catalog.db"))
+HOTEL_CATALOG_MAX_AGE = float(os.getenv("HOTEL_CATALOG_MAX_AGE", "7"))
+
+DAY = 24 * 60 * 60
+
+
+def normalize_ratings(ratings) -> str:
+    """Sorts the ratings so that "4, 3" and "3,4" are the same listing."""
+    return ",".join(sorted({rating.strip() for rating in str(ratings).split(",") if rating.strip()}))
+
+
+class HotelCatalog:
+    """SQLite catalog of hotels, and of which hotels each (city, ratings) listing returned."""
+
+    def __init__(self, path: str = HOTEL_CATALOG_PATH, max_age_days: float = HOTEL_CATALOG_MAX_AGE):
+        self.path = path
+        self.max_age_days = max_age_days
+        # one writer at a time from this process, other processes wait on SQLite's own lock
+        self._lock = threading.Lock()
+        self._revalidator = StaleWhileRevalidate(self._lookup, self._save, "hotel_catalog", "a hotel listing", blocking=True)
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS hotels ("
+                "hotel_id TEXT PRIMARY KEY, name TEXT, city_code TEXT, rating TEXT, latitude REAL, longitude REAL) WITHOUT ROWID"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS listings ("
+                "city_code TEXT NOT NULL, ratings TEXT NOT NULL, fetched_at REAL NOT NULL, PRIMARY KEY (city_code, ratings)) WITHOUT ROWID"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS listing_hotels ("
+                "city_code TEXT NOT NULL, ratings TEXT NOT NULL, position INTEGER NOT NULL, hotel_id TEXT NOT NULL, "
+                "PRIMARY KEY (city_code, ratings, position)) WITHOUT ROWID"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS hotels_city ON hotels (city_code, rating)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _count(self, result: str):
+        with self._lock:
+            if result == "hit":
+                self.hits += 1
+            elif result == "stale":
+                self.stale_hits += 1
+            elif result == "miss":
+                self.misses += 1
+        count("hotel_catalog", result=result)
+
+    def get(self, city_code: str, ratings: str):
+        """Returns (hotels, fetched_at) for the listing, or None if it was never fetched."""
+        city_code, ratings = city_code.strip().upper(), normalize_ratings(ratings)
+        with self._connect() as db:
+            listing = db.execute("SELECT fetched_at FROM listings WHERE city_code = ? AND ratings = ?", (city_code, ratings)).fetchone()
+            if listing is None:
+                return None
+            rows = db.execute(
+                "SELECT h.hotel_id, h.name, h.city_code, h.rating, h.latitude, h.longitude "
+                "FROM listing_hotels l JOIN hotels h ON h.hotel_id = l.hotel_id "
+                "WHERE l.city_code = ? AND l.ratings = ? ORDER BY l.position",
+                (city_code, ratings),
+            ).fetchall()
+        return [self._hotel_dict(row) for row in rows], listing[0]
+
+    def save(self, city_code: str, ratings: str, hotels: list):
+        """Replaces the listing with the hotels Amadeus returned (the "data" list of the response)."""
+        city_code, ratings = city_code.strip().upper(), normalize_ratings(ratings)
+        rows = []
+        for hotel in hotels:
+            geo = hotel.get("geoCode") or {}
+            rows.append((hotel["hotelId"], hotel.get("name"), hotel.get("iataCode", city_code), str(hotel.get("rating", "")) or None, geo.get("latitude"), geo.get("longitude")))
+        with self._lock, self._connect() as db:
+            db.executemany("INSERT OR REPLACE INTO hotels (hotel_id, name, city_code, rating, latitude, longitude) VALUES (?, ?, ?, ?, ?, ?)", rows)
+            db.execute("DELETE FROM listing_hotels WHERE city_code = ? AND ratings = ?", (city_code, ratings))
+            db.executemany(
+                "INSERT INTO listing_hotels (city_code, ratings, position, hotel_id) VALUES (?, ?, ?, ?)",
+                [(city_code, ratings, position, row[0]) for position, row in enumerate(rows)],
+            )
+            db.execute("INSERT OR REPLACE INTO listings (city_code, ratings, fetched_at) VALUES (?, ?, ?)", (city_code, ratings, time.time()))
+
+    @staticmethod
+    def _hotel_dict(row) -> dict:
+        # the same shape as an entry of the by-city response
+        hotel_id, name, city_code, rating, latitude, longitude = row
+        hotel = {"hotelId": hotel_id, "name": name, "iataCode": city_code}
+        if rating:
+            hotel["rating"] = rating
+        if latitude is not None:
+            hotel["geoCode"] = {"latitude": latitude, "longitude": longitude}
+        return hotel
+
+    def _lookup(self, listing):
+        found = self.get(*listing)
+        if found is None:
+            self._count("miss")
+            return None, False
+        hotels, fetched_at = found
+        if time.time() - fetched_at <= self.max_age_days * DAY:
+            self._count("hit")
+            return hotels, True
+        self._count("stale")
+        return hotels, False
+
+    def _save(self, listing, hotels):
+        self.save(*listing, hotels)
+
+    def get_or_fetch(self, city_code: str, ratings: str, fetch) -> list:
+        """
+        Returns the listing's hotels, calling fetch() for them if the listing was
+        never fetched. An old listing is returned as is and refreshed in the background.
+        """
+        return self._revalidator.get_or_fetch((city_code.strip().upper(), normalize_ratings(ratings)), fetch)
+
+    async def aget_or_fetch(self, city_code: str, ratings: str, afetch) -> list:
+        """Async version of get_or_fetch; afetch is a coroutine function and old listings refresh as a task."""
+        return await self._revalidator.aget_or_fetch((city_code.strip().upper(), normalize_ratings(ratings)), afetch)
+
+    def stats(self) -> dict:
+        with self._connect() as db:
+            listings = db.execute("SELECT COUNT(*) FROM listings").fetchone()[0]
+            hotels = db.execute("SELECT COUNT(*) FROM hotels").fetchone()[0]
+        fetches = self._revalidator.stats()
+        with self._lock:
+            return {
+                "listings": listings,
+                "hotels": hotels,
+                "max_age_days": self.max_age_days,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                **fetches,
+            }
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def catalog_path(api_endpoint: str) -> str:
+    """Production listings go in HOTEL_CATALOG_PATH, any other endpoint's in a file next to it."""
+    if api_endpoint == "api.amadeus.com":
+        return HOTEL_CATALOG_PATH
+    root, extension = os.path.splitext(HOTEL_CATALOG_PATH)
+    return f"{root}-{re.sub(r'[^A-Za-z0-9]+', '_', api_endpoint).strip('_')}{extension}"
+
+
+def get_hotel_catalog(api_endpoint: str = None) -> HotelCatalog:
+    """Returns the process-wide hotel catalog for the endpoint (the configured one by default), opening it on first use."""
+    api_endpoint = api_endpoint or amadeus_http.AMADEUS_API_ENDPOINT
+    with _catalogs_lock:
+        catalog = _catalogs.get(api_endpoint)
+        if catalog is None:
+            catalog = _catalogs[api_endpoint] = HotelCatalog(catalog_path(api_endpoint))
+        return catalog
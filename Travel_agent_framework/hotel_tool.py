@@ -1,19 +1,44 @@
 import requests
+import httpx
 import json
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from fairlib.core.interfaces.tools import AbstractTool
 import os
 from tqdm import tqdm
+from instrumentation import timed
+from amadeus_auth import get_token_manager
+import amadeus_http
+from amadeus_limiter import AmadeusQuotaExceeded
+from hotel_catalog import get_hotel_catalog
+from travel_offers import parse_hotel_offers, rank_hotels, format_hotels
 # load API keys from .env
 from dotenv import load_dotenv
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# hotel IDs per hotel-offers request, and how many of those requests run at once
+HOTEL_OFFERS_CHUNK_SIZE = int(os.getenv("HOTEL_OFFERS_CHUNK_SIZE", "30"))
+HOTEL_OFFERS_CONCURRENCY = int(os.getenv("HOTEL_OFFERS_CONCURRENCY", "4"))
+# the most hotels of one city that get priced, to keep big cities within quota
+HOTEL_OFFERS_MAX_HOTELS = int(os.getenv("HOTEL_OFFERS_MAX_HOTELS", "300"))
+# hotels shown to the agent, cheapest first, each with its cheapest two rooms
+HOTEL_TOP_K = int(os.getenv("HOTEL_TOP_K", "10"))
+
 class HotelTool(AbstractTool):
     def __init__(self):
         super().__init__()
-        self.api_endpoint = "api.amadeus.com" # production environment
-        # self.api_endpoint = "api.amadeus.com" # test environment
+        # production by default, set AMADEUS_API_ENDPOINT for the test environment or the local stand-in server
+        self.api_endpoint = amadeus_http.AMADEUS_API_ENDPOINT
 
-        self.token = self.get_auth_token()
+        # every tool shares one token per endpoint, fetched on first use
+        self.auth = get_token_manager(self.api_endpoint)
+        # hotel listings per city come from disk, only the offers are fetched live
+        self.catalog = get_hotel_catalog(self.api_endpoint)
+        # hotels shown per search
+        self.top_k = HOTEL_TOP_K
 
     name = "hotel_search_tool"
     description = (
@@ -27,64 +52,36 @@ class HotelTool(AbstractTool):
     def use(self, expression: str) -> str:
         expression = expression.upper()
         user_specs_obj = json.loads(expression)
-        hotel_list = self.list_hotels(user_specs_obj)
+        return self.search_city(user_specs_obj)
+
+    async def ause(self, expression: str) -> str:
+        # same as use() but waits for Amadeus without blocking the event loop
+        expression = expression.upper()
+        user_specs_obj = json.loads(expression)
+        return await self.asearch_city(user_specs_obj)
+
+    def search_city(self, hotelInfo):
+        # hotelInfo has the tool's input fields, upper case
+        hotel_list = self.list_hotels(hotelInfo)
+        if isinstance(hotel_list, str):
+            # the listing request failed, pass the error on to the agent
+            return hotel_list
         hotelIDs = [hotel["hotelId"] for hotel in hotel_list["data"]]
-        hotels = self.search_hotels(user_specs_obj, hotelIDs)
-        return hotels
-
-    def format_hotels(self, data):
-        output_str = ""
-
-        for hotel_num, hotel_entry in enumerate(data.get("data", []), start=1):
-            hotel_info = hotel_entry.get("hotel", {})
-            name = hotel_info.get("name", "Unknown Hotel")
-            city = hotel_info.get("cityCode", "N/A")
-
-            output_str += f"\n Option"
-            output_str += f"\n   Hotel: {name} ({city})"
-
-            offers = hotel_entry.get("offers", [])
-            for offer in offers:
-                check_in = offer.get("checkInDate", "N/A")
-                check_out = offer.get("checkOutDate", "N/A")
-                price_total = offer.get("price", {}).get("total", "N/A")
-                currency = offer.get("price", {}).get("currency", "N/A")
-
-                room = offer.get("room", {})
-                desc = room.get("description", {}).get("text", "").replace("\n", " ")
-                room_type = room.get("typeEstimated", {}).get("category", "N/A")
-                bed_info = room.get("typeEstimated", {})
-
-                beds = bed_info.get("beds", "N/A")
-                bed_type = bed_info.get("bedType", "N/A")
-
-                output_str += f"\n   Stay:"
-                output_str += f"\n     Check-in: {check_in}"
-                output_str += f"\n     Check-out: {check_out}"
-                output_str += f"\n     Total Price: {price_total} {currency}"
-                output_str += f"\n     Room Type: {room_type.replace('_',' ').title()}"
-                output_str += f"\n     Beds: {beds} ({bed_type.title()})"
-                output_str += f"\n     Description: {desc}"
-        if(len(data.get("data", [])) == 0):
-            output_str += "No available hotels."
-        return output_str
+        ratings = {hotel["hotelId"]: hotel.get("rating") for hotel in hotel_list["data"]}
+        return self.search_hotels(hotelInfo, hotelIDs, ratings)
 
-    def get_auth_token(self):
-        base_url = f"https://{self.api_endpoint}/v1/security/oauth2/token"
-        headers = {"Content-Type": "application/x-www-form-urlencoded"}
-        api_key = {
-            "grant_type":"client_credentials",
-            "client_id":os.getenv("AMADEUS_KEY"),
-            "client_secret":os.getenv("AMADEUS_SECRET")
-        }
+    async def asearch_city(self, hotelInfo):
+        hotel_list = await self.alist_hotels(hotelInfo)
+        if isinstance(hotel_list, str):
+            return hotel_list
+        hotelIDs = [hotel["hotelId"] for hotel in hotel_list["data"]]
+        ratings = {hotel["hotelId"]: hotel.get("rating") for hotel in hotel_list["data"]}
+        return await self.asearch_hotels(hotelInfo, hotelIDs, ratings)
 
-        response = requests.post(base_url, headers=headers, data=api_key).json()
-        token = response["access_token"]
-        return token
+    def get_auth_token(self):
+        return self.auth.get_token()
     
-    def list_hotels(self, hotelInfo):
-        base_url = f"https://{self.api_endpoint}/v1/reference-data/locations/hotels/by-city"
-        
+    def list_params(self, hotelInfo):
         # Gather user input
         cityCode = hotelInfo["CITYCODE"].strip().upper()
         ratings = hotelInfo["RATINGS"].strip().upper()
@@ -94,25 +91,9 @@ class HotelTool(AbstractTool):
             "cityCode": cityCode,
             "ratings": ratings
         }
+        return params
 
-        # Replace this with your real token
-        
-        headers = {
-            "Authorization": "Bearer " + self.token
-        }
-
-        try:
-            response = requests.get(base_url, headers=headers, params=params)
-            response.raise_for_status()
-            data = response.json()
-            return data
-        
-        except requests.exceptions.RequestException as e:
-            return(f"API request failed: {e}")
-
-    def search_hotels(self, hotelInfo, hotelIDs):
-        base_url = f"https://{self.api_endpoint}/v3/shopping/hotel-offers"
-        
+    def offer_params(self, hotelInfo):
         # Gather user input
         adults = hotelInfo["ADULTS"].strip()
         checkInDate = hotelInfo["CHECKINDATE"].strip()
@@ -121,7 +102,6 @@ class HotelTool(AbstractTool):
 
         # Optional: you could also let users specify returnDate, adults, etc.
         params = {
-            "hotelIds": hotelIDs[0:30],
             "adults": adults,
             "checkInDate": checkInDate,
             "checkOutDate": checkOutDate,
@@ -129,19 +109,115 @@ class HotelTool(AbstractTool):
             "currency": "USD",
             #"includeClosed":"True"
         }
+        return params
+
+    def fetch_hotel_list(self, params):
+        base_url = amadeus_http.api_url(self.api_endpoint, "/v1/reference-data/locations/hotels/by-city")
+        with timed("amadeus_request_seconds", tool=self.name, route="hotels_by_city"):
+            response = amadeus_http.get(base_url, params=params, auth=self.auth)
+        response.raise_for_status()
+        return response.json().get("data", [])
+
+    async def afetch_hotel_list(self, params):
+        base_url = amadeus_http.api_url(self.api_endpoint, "/v1/reference-data/locations/hotels/by-city")
+        with timed("amadeus_request_seconds", tool=self.name, route="hotels_by_city"):
+            response = await amadeus_http.aget(base_url, params=params, auth=self.auth)
+        response.raise_for_status()
+        return response.json().get("data", [])
 
-        headers = {
-            "Authorization": "Bearer " + self.token
-        }
+    def list_hotels(self, hotelInfo):
+        params = self.list_params(hotelInfo)
 
         try:
-            r = requests.get(base_url, headers=headers, params=params)
-            data = r.json()
-            output_str = self.format_hotels(data)
-        except requests.exceptions.HTTPError as e:
-            output_str = e
+            hotels = self.catalog.get_or_fetch(params["cityCode"], params["ratings"], lambda: self.fetch_hotel_list(params))
+            return {"data": hotels}
         
-        return output_str
+        except (requests.exceptions.RequestException, AmadeusQuotaExceeded) as e:
+            return(f"API request failed: {e}")
+
+    async def alist_hotels(self, hotelInfo):
+        params = self.list_params(hotelInfo)
+
+        try:
+            hotels = await self.catalog.aget_or_fetch(params["cityCode"], params["ratings"], lambda: self.afetch_hotel_list(params))
+            return {"data": hotels}
+
+        except (httpx.HTTPError, AmadeusQuotaExceeded) as e:
+            return(f"API request failed: {e}")
+
+    def chunk_ids(self, hotelIDs):
+        hotelIDs = hotelIDs[:HOTEL_OFFERS_MAX_HOTELS]
+        return [hotelIDs[i:i + HOTEL_OFFERS_CHUNK_SIZE] for i in range(0, len(hotelIDs), HOTEL_OFFERS_CHUNK_SIZE)]
+
+    def fetch_offers(self, params, chunk):
+        base_url = amadeus_http.api_url(self.api_endpoint, "/v3/shopping/hotel-offers")
+        with timed("amadeus_request_seconds", tool=self.name, route="hotel_offers"):
+            r = amadeus_http.get(base_url, params={**params, "hotelIds": chunk}, auth=self.auth)
+        r.raise_for_status()
+        return r.json().get("data", [])
+
+    async def afetch_offers(self, params, chunk, semaphore):
+        base_url = amadeus_http.api_url(self.api_endpoint, "/v3/shopping/hotel-offers")
+        async with semaphore:
+            with timed("amadeus_request_seconds", tool=self.name, route="hotel_offers"):
+                r = await amadeus_http.aget(base_url, params={**params, "hotelIds": chunk}, auth=self.auth)
+        r.raise_for_status()
+        return r.json().get("data", [])
+
+    def merge_offers(self, chunk_results, ratings, searched):
+        hotel_entries = []
+        errors = []
+        for result in chunk_results:
+            if isinstance(result, Exception):
+                errors.append(result)
+            else:
+                hotel_entries.extend(result)
+        if errors and len(errors) == len(chunk_results):
+            return f"API request failed: {errors[0]}"
+        for error in errors:
+            logger.warning("A hotel-offers request failed, its hotels are left out: %s", error)
+
+        hotels = parse_hotel_offers(hotel_entries, ratings)
+        top = rank_hotels(hotels, self.top_k)
+        lines = []
+        if hotels:
+            lines.append(f"--- Cheapest {len(top)} of {len(hotels)} hotels with offers ({searched} hotels searched) ---")
+        if errors:
+            lines.append(f" ({len(errors)} of {len(chunk_results)} searches failed, some hotels are missing)")
+        return "\n".join(lines) + format_hotels(top)
+
+    def search_hotels(self, hotelInfo, hotelIDs, ratings=None):
+        params = self.offer_params(hotelInfo)
+        chunks = self.chunk_ids(hotelIDs)
+        if not chunks:
+            return format_hotels([])
+
+        # every chunk is its own request, a few at a time so the quota isn't blown
+        chunk_results = []
+        with ThreadPoolExecutor(max_workers=min(HOTEL_OFFERS_CONCURRENCY, len(chunks))) as executor:
+            futures = [executor.submit(self.fetch_offers, params, chunk) for chunk in chunks]
+            for future in futures:
+                try:
+                    chunk_results.append(future.result())
+                except (requests.exceptions.RequestException, AmadeusQuotaExceeded) as e:
+                    chunk_results.append(e)
+        return self.merge_offers(chunk_results, ratings or {}, sum(len(chunk) for chunk in chunks))
+
+    async def asearch_hotels(self, hotelInfo, hotelIDs, ratings=None):
+        params = self.offer_params(hotelInfo)
+        chunks = self.chunk_ids(hotelIDs)
+        if not chunks:
+            return format_hotels([])
+
+        semaphore = asyncio.Semaphore(HOTEL_OFFERS_CONCURRENCY)
+        chunk_results = await asyncio.gather(
+            *(self.afetch_offers(params, chunk, semaphore) for chunk in chunks), return_exceptions=True
+        )
+        for result in chunk_results:
+            # anything other than an HTTP failure is a bug and shouldn't be hidden
+            if isinstance(result, Exception) and not isinstance(result, (httpx.HTTPError, AmadeusQuotaExceeded)):
+                raise result
+        return self.merge_offers(chunk_results, ratings or {}, sum(len(chunk) for chunk in chunks))
 
 
 if __name__ == "__main__":
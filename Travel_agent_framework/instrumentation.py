@@ -0,0 +1,116 @@
+"""
+Lightweight hooks for timing and counting what the travel team does.
+
+The tools and the team report timings (observe) and counts (count) here. Nothing
+is recorded unless something has registered an observer, like the backend's
+/metrics registry, so the CLI pays almost nothing for these calls.
+"""
+import functools
+import time
+from contextlib import contextmanager
+
+# callables taking (kind, name, value, labels) where kind is "observe" or "count"
+_observers = []
+
+
+def add_observer(observer):
+    if observer not in _observers:
+        _observers.append(observer)
+
+
+def remove_observer(observer):
+    if observer in _observers:
+        _observers.remove(observer)
+
+
+def observe(name: str, value: float, **labels):
+    """Reports a measurement, usually a duration in seconds."""
+    for observer in _observers:
+        observer("observe", name, value, labels)
+
+
+def count(name: str, amount: float = 1, **labels):
+    """Reports that something happened amount times."""
+    for observer in _observers:
+        observer("count", name, amount, labels)
+
+
+@contextmanager
+def timed(name: str, **labels):
+    """Times the block and reports it with an outcome label of ok or error."""
+    if not _observers:
+        yield
+        return
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        observe(name, time.perf_counter() - start, outcome=outcome, **labels)
+
+
+def _estimate_tokens(text) -> int:
+    # roughly four characters per token for English text
+    return max(1, len(str(text)) // 4) if text else 0
+
+
+def _record_llm_call(messages, response, seconds, outcome):
+    observe("llm_call_seconds", seconds, outcome=outcome)
+    if response is None:
+        return
+    usage = getattr(response, "usage", None)
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    completion_tokens = getattr(usage, "completion_tokens", None)
+    source = "reported"
+    if prompt_tokens is None or completion_tokens is None:
+        # the adapter didn't pass token usage through, so estimate it from the text
+        source = "estimated"
+        prompt_tokens = sum(_estimate_tokens(getattr(message, "content", message)) for message in messages)
+        completion_tokens = _estimate_tokens(getattr(response, "content", ""))
+    count("llm_tokens", prompt_tokens, kind="prompt", source=source)
+    count("llm_tokens", completion_tokens, kind="completion", source=source)
+
+
+def instrument_llm(llm):
+    """Wraps the adapter's invoke and ainvoke in place to report call time and token counts."""
+    if getattr(llm, "_instrumented", False):
+        return llm
+
+    original_invoke = llm.invoke
+    original_ainvoke = llm.ainvoke
+
+    @functools.wraps(original_invoke)
+    def invoke(messages, *args, **kwargs):
+        if not _observers:
+            return original_invoke(messages, *args, **kwargs)
+        start = time.perf_counter()
+        response = None
+        outcome = "error"
+        try:
+            response = original_invoke(messages, *args, **kwargs)
+            outcome = "ok"
+            return response
+        finally:
+            _record_llm_call(messages, response, time.perf_counter() - start, outcome)
+
+    @functools.wraps(original_ainvoke)
+    async def ainvoke(messages, *args, **kwargs):
+        if not _observers:
+            return await original_ainvoke(messages, *args, **kwargs)
+        start = time.perf_counter()
+        response = None
+        outcome = "error"
+        try:
+            response = await original_ainvoke(messages, *args, **kwargs)
+            outcome = "ok"
+            return response
+        finally:
+            _record_llm_call(messages, response, time.perf_counter() - start, outcome)
+
+    llm.invoke = invoke
+    llm.ainvoke = ainvoke
+    llm._instrumented = True
+    return llm
@@ -0,0 +1,147 @@
+"""
+Structured itinerary returned by the travel team.
+
+The manager's final answer is free text, so parse_itinerary splits it into the
+sections the master prompt asks for (flights, hotels, daily activities and the
+cost breakdown). It also keeps the raw worker results the answer was built from.
+The backend gets this object directly in-process, or as JSON from a subprocess,
+instead of searching the run's stdout for the itinerary marker.
+"""
+import re
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+ITINERARY_MARKER = '_________________________TRAVEL ITINERARY_________________________'
+
+# heading keyword -> section name, checked in order
+SECTION_KEYWORDS = [
+    ("flights", ("flight", "air travel", "airfare")),
+    ("hotels", ("hotel", "accommodation", "lodging", "stay")),
+    ("activities", ("activit", "day-by-day", "day by day", "daily", "things to do")),
+    ("costs", ("cost", "budget", "price", "total")),
+]
+
+DOLLAR_AMOUNT = re.compile(r"\$\s*(\d[\d,]*(?:\.\d+)?)")
+AMOUNT = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+
+@dataclass
+class Itinerary:
+    """A finished trip plan. text is the manager's full answer, the rest is parsed from it."""
+    text: str
+    title: str = ""
+    flights: List[str] = field(default_factory=list)
+    hotels: List[str] = field(default_factory=list)
+    activities: List[str] = field(default_factory=list)
+    costs: Dict[str, float] = field(default_factory=dict)
+    notes: List[str] = field(default_factory=list)
+    # what each worker reported during the run: worker, task, seconds, result
+    worker_results: List[dict] = field(default_factory=list)
+    error: Optional[str] = None
+
+    def to_text(self) -> str:
+        """The itinerary as the plain text block the PDF is rendered from."""
+        return ITINERARY_MARKER + "\n\n" + self.text.strip()
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Itinerary":
+        return cls(**data)
+
+
+def _clean(line: str) -> str:
+    # drop markdown bullets, emphasis and heading marks
+    line = re.sub(r"^\s*(?:[-*•]|\d+\.)\s+", "", line)
+    return line.replace("**", "").replace("__", "").lstrip("#").strip()
+
+
+def _heading_section(line: str) -> Optional[str]:
+    """Returns the section a heading line starts, '' for an unknown heading, None if it isn't a heading."""
+    stripped = line.strip()
+    cleaned = _clean(stripped)
+    is_bold_line = stripped.startswith("**") and stripped.rstrip(":").endswith("**")
+    is_heading = stripped.startswith("#") or is_bold_line or (cleaned.endswith(":") and len(cleaned.split()) <= 6)
+    if not is_heading:
+        return None
+    lowered = cleaned.lower()
+    for section, keywords in SECTION_KEYWORDS:
+        if any(keyword in lowered for keyword in keywords):
+            return section
+    return ""
+
+
+def _cost_label(line: str) -> Optional[str]:
+    lowered = line.lower()
+    if lowered.startswith("total"):
+        return "total"
+    if "flight" in lowered or "ticket" in lowered:
+        return "flights"
+    if "hotel" in lowered or "accommodation" in lowered:
+        return "hotels"
+    if "total" in lowered:
+        return "total"
+    return None
+
+
+def _line_amount(line: str) -> Optional[float]:
+    # prefer the last dollar amount, otherwise the last number after the label
+    amounts = DOLLAR_AMOUNT.findall(line) or AMOUNT.findall(line.split(":", 1)[-1])
+    if not amounts:
+        return None
+    return float(amounts[-1].replace(",", ""))
+
+
+def parse_costs(lines: List[str]) -> Dict[str, float]:
+    """Pulls the flight, hotel and total cost out of the cost breakdown lines."""
+    costs = {}
+    for line in lines:
+        label = _cost_label(line)
+        if label is None or label in costs:
+            continue
+        amount = _line_amount(line)
+        if amount is not None:
+            costs[label] = amount
+    return costs
+
+
+def parse_itinerary(text: str, worker_results: List[dict] = None) -> Itinerary:
+    """Splits the manager's final answer into an Itinerary."""
+    text = (text or "").strip()
+    if text.startswith(ITINERARY_MARKER):
+        text = text[len(ITINERARY_MARKER):].strip()
+
+    sections = {"flights": [], "hotels": [], "activities": [], "costs": [], "notes": []}
+    title = ""
+    current = "notes"
+
+    for raw_line in text.splitlines():
+        if not raw_line.strip():
+            continue
+        section = _heading_section(raw_line)
+        if section:
+            current = section
+            continue
+        if section == "" and current != "notes":
+            # an unknown sub-heading such as "Rome (June 4-10):" stays in its section
+            sections[current].append(_clean(raw_line))
+            continue
+        line = _clean(raw_line)
+        if not title and current == "notes":
+            title = line
+            continue
+        sections[current].append(line)
+
+    costs = parse_costs(sections["costs"]) or parse_costs(text.splitlines())
+
+    return Itinerary(
+        text=text,
+        title=title,
+        flights=sections["flights"],
+        hotels=sections["hotels"],
+        activities=sections["activities"],
+        costs=costs,
+        notes=sections["notes"],
+        worker_results=list(worker_results or []),
+    )
@@ -36,7 +36,8 @@ import asyncio
 import json
 import logging
 import re
-from typing import Dict, List, Any, Union, Tuple
+import time
+from typing import Callable, Dict, List, Any, Optional, Union, Tuple
 
 # --- Core Framework Imports ---
 from fairlib.core.interfaces.llm import AbstractChatModel
@@ -130,7 +131,7 @@ class ManagerPlanner(AbstractPlanner):
         Parses the raw JSON response from the LLM, assuming the entire response
         is a JSON object, with a fallback for conversational answers.
         """
-        print(f"\n\nMANAGER STRING: {response_text}\n\n")
+        logger.debug(f"MANAGER STRING: {response_text}")
         try:
             # First, try to find a JSON blob in the text, as manager prompts
             # can sometimes elicit conversational text before the JSON.
@@ -166,13 +167,13 @@ class ManagerPlanner(AbstractPlanner):
                 
             # Manager will sometimes use a worker as a tool instead of delegating to it
             if(tool_name.lower() != "delegate" and tool_name.lower != "final_answer"):
-                print("TRIED TO USE A WORKER AS A TOOL")
+                logger.debug("TRIED TO USE A WORKER AS A TOOL")
                 input = {"worker_name":tool_name, "task":tool_input}
                 tool_name = "delegate"
                 tool_input = input
             # =======================================================
 
-            print(f"\n\nPARSED OUTPUT- toolname = {tool_name} toolinput = {tool_input}\n\n")
+            logger.debug(f"PARSED OUTPUT- toolname = {tool_name} toolinput = {tool_input}")
             thought = Thought(text=thought_text if thought_text else "No thought provided.")
             
             if tool_name == "final_answer":
@@ -194,38 +195,56 @@ class HierarchicalAgentRunner:
         self.workers = workers
         self.max_steps = max_steps
         
-    async def arun(self, user_input: str) -> str:
-        """Runs the hierarchical multi-agent workflow from start to finish."""
+    async def arun(self, user_input: str, on_event: Optional[Callable[[Dict[str, Any]], None]] = None) -> str:
+        """
+        Runs the hierarchical multi-agent workflow from start to finish.
+
+        If on_event is given it is called with a dict for every manager turn, worker
+        delegation and the final answer, so callers can follow the run as it happens.
+        """
         logger.info(f"\n--- Running Hierarchical Team for Request: '{user_input}' ---")
         self.manager.memory.add_message(Message(role="user", content=user_input))
         
+        def emit(event_type: str, **data):
+            if on_event is not None:
+                on_event({"type": event_type, **data})
+
         current_request = user_input
 
         for i in range(self.max_steps):
             logger.info(f"\n--- Manager Turn {i+1}/{self.max_steps} ---")
             
+            turn_start = time.perf_counter()
             plan_result = await self.manager.planner.aplan(self.manager.memory.get_history(), current_request)
+            plan_seconds = time.perf_counter() - turn_start
 
             if isinstance(plan_result, FinalAnswer):
                 logger.info(f"Manager has concluded the task with a final answer.")
+                emit("final_answer", turn=i + 1, seconds=plan_seconds, text=plan_result.text)
                 return plan_result.text
 
             thought, action = plan_result
             self.manager.memory.add_message(Message(role="assistant", content=thought.text))
             logger.info(f"Manager Thought: {thought.text}")
+            emit("manager_turn", turn=i + 1, max_steps=self.max_steps, seconds=plan_seconds, thought=thought.text)
 
             if action.tool_name == "delegate":
                 if not isinstance(action.tool_input, dict):
                     error_msg = f"Error: Manager's delegate input was not a valid dictionary."
                     self.manager.memory.add_message(Message(role="tool", content=error_msg, name="delegate"))
+                    emit("invalid_action", turn=i + 1, message=error_msg)
                     continue
                 worker_name = action.tool_input.get("worker_name")
                 task = action.tool_input.get("task")
                 
                 if worker_name in self.workers and task:
                     logger.info(f"Manager Action: Delegating task to '{worker_name}': '{task}'")
+                    emit("delegation", turn=i + 1, worker=worker_name, task=task)
                     worker = self.workers[worker_name]
+                    worker_start = time.perf_counter()
                     worker_result = await worker.arun(task)
+                    emit("delegation_result", turn=i + 1, worker=worker_name,
+                         seconds=time.perf_counter() - worker_start, result=str(worker_result))
                     observation = f"Result from {worker_name}: {worker_result}"
                     logger.info(f"Observation for Manager: {observation}")
                     # Use the 'system' role to provide observations from workers
@@ -235,18 +254,22 @@ class HierarchicalAgentRunner:
                     error_msg = f"Error: Manager delegation failed. Worker '{worker_name}' not found or task not specified."
                     logger.error(error_msg)
                     self.manager.memory.add_message(Message(role="tool", content=error_msg, name="delegate"))
+                    emit("invalid_action", turn=i + 1, message=error_msg)
             else:
                 error_msg = f"Error: Manager attempted an invalid action '{action.tool_name}'."
                 logger.error(error_msg)
                 self.manager.memory.add_message(Message(role="tool", content=error_msg, name="delegate"))
+                emit("invalid_action", turn=i + 1, message=error_msg)
             
             current_request = ""
 
         logger.warning("Agent team stopped after reaching max steps.")
+        emit("max_steps", turn=self.max_steps)
         return "The team could not complete the request in the maximum number of steps."
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
     planner = ManagerPlanner(None, None)
 
     planner._parse_json_response('Thought: Proceed to obtain Fairbanks hotel options for the remaining 7 nights (2026-01-20 to 2026-01-27) for 3 adults, city-wide search, mid-range to upscale with hiking/outdoor access in mind, so I can select a pairing after reviewing options. Action: {"tool_name": "hotel_researcher", "tool_input": "Search Fairbanks hotels for 7 nights (check-in 2026-01-20, check-out 2026-01-27) for 3 adults, city-wide (no neighborhoods), mid-range to upscale, with good access to hiking and outdoor activities."}')
\ No newline at end of file
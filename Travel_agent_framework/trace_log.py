@@ -0,0 +1,57 @@
+"""
+Rotating trace log for agent runs.
+
+Log records are handed to a queue and written to disk by a background thread, so
+the manager's debug output never blocks a run or piles up in memory.
+"""
+import io
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+TRACE_LOG_MAX_BYTES = int(os.getenv("TRACE_LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+TRACE_LOG_BACKUPS = int(os.getenv("TRACE_LOG_BACKUPS", "3"))
+
+# loggers whose debug output belongs in the trace
+TRACE_LOGGERS = ("fairlib", "trace")
+
+
+def setup_trace_log(path: str, level=logging.DEBUG) -> QueueListener:
+    """
+    Sends log records to a rotating file at path from a background thread.
+    Returns the listener; call .stop() on shutdown to flush what is left.
+    """
+    file_handler = RotatingFileHandler(path, maxBytes=TRACE_LOG_MAX_BYTES, backupCount=TRACE_LOG_BACKUPS, encoding="utf-8")
+    file_handler.setFormatter(logging.Formatter("%(asctime)s %(process)d %(threadName)s %(name)s %(levelname)s: %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    logging.getLogger().addHandler(QueueHandler(log_queue))
+    for name in TRACE_LOGGERS:
+        logging.getLogger(name).setLevel(level)
+
+    listener.start()
+    return listener
+
+
+class LogWriter(io.TextIOBase):
+    """A file-like object that turns everything written to it into log records, one per line."""
+
+    def __init__(self, logger: logging.Logger, level=logging.DEBUG):
+        self.logger = logger
+        self.level = level
+        self._partial = ""
+
+    def write(self, text: str) -> int:
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            if line.strip():
+                self.logger.log(self.level, line)
+        return len(text)
+
+    def flush(self):
+        if self._partial.strip():
+            self.logger.log(self.level, self._partial)
+        self._partial = ""
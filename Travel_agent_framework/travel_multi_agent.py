@@ -1,4 +1,7 @@
+import argparse
 import asyncio
+import contextlib
+import logging
 import os
 import json
 import sys
@@ -22,6 +25,11 @@ from fairlib import (
 )
 from hotel_tool import HotelTool
 from flight_tool import FlightTool
+from trip_tool import MultiCityTool
+from itinerary import Itinerary, parse_itinerary, ITINERARY_MARKER
+from trace_log import setup_trace_log, LogWriter
+from instrumentation import instrument_llm
+from amadeus_auth import get_token_manager
 
 # LOAD API KEYS AND SETTNGS FROM ENV VARS
 from dotenv import load_dotenv
@@ -50,25 +58,31 @@ def create_agent(llm, tools, role_description):
     agent.role_description = role_description
     return agent
 
-# main function to set up agents and produce an itinerary
-async def main():
+# builds the agent team, shared by main() and the backend agent pool
+def build_team(llm=None):
     """
-    The main function to set up and run the multi-agent system.
+    Builds the manager and worker agents and returns the HierarchicalAgentRunner.
+    The backend's warm agent pool calls this once per pooled team and reuses the result.
     """
     
 
     # --- Step 2: Initialize Core Components ---
     print("\n📚 Initializing fairlib.core.components...")
-    llm = OpenAIAdapter(
-        api_key=settings.api_keys.openai_api_key,
-        model_name="gpt-4.1-mini-2025-04-14"
-    )
+    if llm is None:
+        llm = OpenAIAdapter(
+            api_key=settings.api_keys.openai_api_key,
+            model_name="gpt-4.1-mini-2025-04-14"
+        )
+    # reports llm call time and token counts when metrics are being collected
+    llm = instrument_llm(llm)
 
     # --- Step 3: Create Specialized Worker Agents ---
     print("👥 Building the agent team...")
     
     # The get_web_searcher_tool function automatically chooses the right implementation
 
+    # the tools share one Amadeus token, fetch it now so the first search doesn't wait for it
+    get_token_manager().get_token()
     flight_tool = FlightTool()
     hotel_tool = HotelTool()
     
@@ -76,7 +90,8 @@ async def main():
     flight_researcher = create_agent(
         llm, 
         [flight_tool],
-        "A research agent that uses a flight tool to find current, real-time information on flights. If you cannot meet set requirements you will return the closest options."
+        "A research agent that uses a flight tool to find current, real-time information on flights. If you cannot meet set requirements you will return the closest options. "
+        "If the user's dates are flexible, search the whole window in one call with Flex_Days instead of one call per date."
     )
     print("   ✓ Flight Researcher agent created")
     
@@ -88,6 +103,15 @@ async def main():
     )
     print("   ✓ Hotel Researcher agent created")
 
+    # Trip researcher: the flights and hotels of every stop of a multi-city trip in one search
+    trip_researcher = create_agent(
+        llm,
+        [MultiCityTool()],
+        "A research agent that uses a multi-city search tool to find the flights and hotels for every stop of a trip with several locations at once. "
+        "Give the tool the whole route in one call, never one stop at a time."
+    )
+    print("   ✓ Trip Researcher agent created")
+
     # The Analyst: Its only tool is the SafeCalculator
     analyst = create_agent(
         llm,
@@ -98,7 +122,7 @@ async def main():
     
 
     # We organize the workers in a dictionary so the manager can find them by name.
-    workers = {"flight_researcher": flight_researcher, "Analyst": analyst, "hotel_researcher": hotel_researcher}
+    workers = {"flight_researcher": flight_researcher, "Analyst": analyst, "hotel_researcher": hotel_researcher, "trip_researcher": trip_researcher}
 
     # --- Step 4: Create the Manager Agent ---
     manager_memory = WorkingMemory()
@@ -106,6 +130,7 @@ async def main():
     manager_tool_registry = ToolRegistry()
     manager_tool_registry.register_tool(FlightTool())
     manager_tool_registry.register_tool(HotelTool())
+    manager_tool_registry.register_tool(MultiCityTool())
     manager_tool_registry.register_tool(SafeCalculatorTool())
     manager_executor = ToolExecutor(manager_tool_registry)
     manager_agent = SimpleAgent(llm, manager_planner, manager_executor, manager_memory)
@@ -115,36 +140,33 @@ async def main():
     # --- Step 5: Initialize the Hierarchical Runner ---
     team_runner = HierarchicalAgentRunner(manager_agent, workers)
     print("\n🚀 Agent team ready!\n")
-    
-    # === (g) Interaction Loop ===
-    #     try:
-    #         user_input = input("👤 You: ")
-    #         if user_input.lower() in ["exit", "quit"]:
-    #             print("🤖 Agent: Goodbye! 👋")
-    #             break
+    return team_runner
 
-    #         # Run the agent’s full Reason+Act cycle
-    #         agent_response = await team_runner.arun(user_input)
-    #         print(f"🤖 Agent: {agent_response}")
 
-    #     except KeyboardInterrupt:
-    #         print("\n🤖 Agent: Session ended by user.")
-    #         break
-    #     except Exception as e:
-    #         print(f"❌ Agent error: {e}")
-    
-    # ======== Prompt and response ==============
-    user_request = input("Where do you want to go and when: ")
+def reset_team(team_runner):
+    """
+    Clears the manager's conversation so a pooled team can take a new request.
+    The workers are stateless so they don't need to be reset.
+    """
+    team_runner.manager.memory = WorkingMemory()
+
+
+def build_master_prompt(user_request):
+    """
+    Wraps the user's request in the instructions the manager follows to plan a trip.
+    """
     workflow_steps = [
         "Delegate to the 'flight_researcher' to find flight options for the trip, pick flights based on user constraints. The price shown will be for 1 ticket. Ask the researcher to return flight numbers and times.",
         "Delegate to the the 'hotel_researcher' to find hotel options, pick a hotel based on user constraints. You WILL NOT request locations more specific than a city, DO NOT request specific neighboorhoods or attractions.",
         "Come up with activites for each day",
     ]
+    numbered_steps = "".join([f"{i+1}. {step}\n" for i, step in enumerate(workflow_steps)])
     master_prompt = f"""
     Coordinate with your team to produce a complete vacation plan for the user.\n
     Use the user's request as a guide for planning. If the request is specific you will follow their request, if it is non-specific you will still plan a specific trip based on their request, selecting locations and activities you believe the user will enjoy.\n 
     Then,for each location in the trip you will:\n
-    {"".join([f"{i+1}. {step}\n" for i, step in enumerate(workflow_steps)])}
+    {numbered_steps}
+    If the trip has more than one location, do not do steps 1 and 2 for each location. Instead delegate the whole route once to the 'trip_researcher' (the home airport, every location in order with its arrival and departure dates, whether a flight is needed to reach it, the number of travelers and the price limits), it finds the flights and hotels of every location at the same time.
     If the trip involves multiple locations you must consider travel between the different locations. If the distance between the locations requires a flight, you must find flights, if not you must say whether the user will drive, take the train, or take a bus.
     You will then select one flight and hotel pairing for the trip\n
     Finally, Delegate to the analyst to calculate the total cost of all flights and hotels (you MUST tell the analyst to multiply the ticket cost you recevied from the flight researcher by the number of travelers to get the total cost of tickets).
@@ -163,16 +185,209 @@ async def main():
     USER REQUEST:\n
     {user_request}
     """
+    return master_prompt
+
+
+async def plan_trip(team_runner, user_request, on_event=None):
+    """
+    Runs the team on the user's request and returns a structured Itinerary.
+    on_event is passed through to the runner for progress updates.
+    """
+    worker_results = []
+
+    def record(event):
+        if event["type"] == "delegation_result":
+            worker_results.append({
+                "worker": event["worker"],
+                "seconds": event["seconds"],
+                "result": event["result"],
+            })
+        if on_event is not None:
+            on_event(event)
+
+    final_answer = await team_runner.arun(build_master_prompt(user_request), on_event=record)
+    return parse_itinerary(final_answer, worker_results)
+
+
+# the worker behind each planning stage; activities are written by the manager itself
+STAGE_WORKERS = {
+    "flights": "flight_researcher",
+    "hotels": "hotel_researcher",
+    "costs": "Analyst",
+}
+# workers whose results cover more than one stage, they search again if any of those stages has to be redone
+MULTI_STAGE_WORKERS = {
+    "trip_researcher": ("flights", "hotels"),
+}
+
+
+def worker_stages():
+    """(worker, the stages its results cover) for every worker whose results can be reused."""
+    return [(worker_name, (stage,)) for stage, worker_name in STAGE_WORKERS.items()] + list(MULTI_STAGE_WORKERS.items())
+
+
+class ReplayWorker:
+    """
+    Stands in for a worker whose earlier results are still valid. If the manager
+    delegates to it anyway it answers right away with those results instead of
+    searching again.
+    """
+
+    def __init__(self, worker, results):
+        self.worker = worker
+        self.results = results
+        self.role_description = worker.role_description
+
+    async def arun(self, task):
+        return "These results from earlier in this conversation are still valid:\n\n" + "\n\n".join(self.results)
+
+    def __getattr__(self, name):
+        return getattr(self.worker, name)
+
+
+def build_revision_prompt(user_request, previous, rerun_stages, changes):
+    """
+    Asks the manager to revise a previous itinerary, redoing only the stages the
+    user's change affects and reusing the earlier worker results for the rest.
+    """
+    kept = []
+    redo = []
+    for worker_name, stages in worker_stages():
+        results = [result["result"] for result in previous.worker_results if result["worker"] == worker_name]
+        if not set(stages) & set(rerun_stages):
+            if results:
+                kept.append(f"{' AND '.join(stage.upper() for stage in stages)} (from '{worker_name}'):\n" + "\n\n".join(results))
+        # the trip researcher is only worth naming if the trip was planned with it
+        elif len(stages) == 1 or results:
+            redo.append(f"'{worker_name}'")
+
+    kept_results = "\n\n".join(kept) if kept else "None"
+    instructions = "You do not need to delegate to any worker, the results above are enough."
+    if redo:
+        instructions = f"Only delegate to {', '.join(redo)}, using the updated request. Do not delegate to the other workers, their results above are still valid."
+
+    revision_prompt = f"""
+    You already planned a trip for this user and they have changed their request.\n
+    What changed: {changes}\n
+    {instructions}
+    Keep everything from the previous itinerary that the change does not affect, and update the activities for each day if the change calls for it.
+    If the flights or hotels changed, or the user changed their budget, Delegate to the analyst to calculate the new total cost (the ticket cost multiplied by the number of travelers, plus the hotel price which already covers every night).\n
+    Still valid results from the previous run:\n
+    {kept_results}
+    \n
+    PREVIOUS ITINERARY:\n
+    {previous.text}
+    \n
+    Then you will produce the complete updated itinerary in the same easy to read format, with all flight times, flight numbers, hotel info, activities for each day and the cost of the trip broken down into flight cost, hotel cost, and a total cost.
+    You WILL NOT produce conversational text or questions for the user in the final answer, you will just include the information relevant to the trip.
+    \n\n
+    UPDATED USER REQUEST:\n
+    {user_request}
+    """
+    return revision_prompt
+
+
+async def replan_trip(team_runner, user_request, previous, rerun_stages, changes, on_event=None):
+    """
+    Revises a previous Itinerary after the user edited their request. Workers for
+    stages outside rerun_stages are replaced by their earlier results for this run,
+    so a change to the notes or budget takes a few manager turns instead of new
+    flight and hotel searches.
+    """
+    rerun_workers = {worker_name for worker_name, stages in worker_stages() if set(stages) & set(rerun_stages)}
+    # earlier results that are still valid carry over, so the next revision can reuse them too
+    worker_results = [result for result in previous.worker_results if result["worker"] not in rerun_workers]
+
+    def record(event):
+        if event["type"] == "delegation_result" and event["worker"] in rerun_workers:
+            worker_results.append({
+                "worker": event["worker"],
+                "seconds": event["seconds"],
+                "result": event["result"],
+            })
+        if on_event is not None:
+            on_event(event)
+
+    # the runner and the manager's planner share this dict, swap the reused workers in place for this run
+    workers = team_runner.workers
+    originals = dict(workers)
+    for worker_name, stages in worker_stages():
+        results = [result["result"] for result in previous.worker_results if result["worker"] == worker_name]
+        if worker_name not in rerun_workers and results and worker_name in workers:
+            workers[worker_name] = ReplayWorker(workers[worker_name], results)
+    try:
+        prompt = build_revision_prompt(user_request, previous, rerun_stages, changes)
+        final_answer = await team_runner.arun(prompt, on_event=record)
+    finally:
+        workers.update(originals)
+    return parse_itinerary(final_answer, worker_results)
+
+
+# main function to set up agents and produce an itinerary
+async def main():
+    """
+    The main function to set up and run the multi-agent system.
+
+    With --json the only thing written to stdout is the itinerary as JSON; everything
+    else the run prints goes to the trace log instead. This is how the backend runs
+    the team in a subprocess.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--json", action="store_true", help="write the itinerary to stdout as JSON")
+    parser.add_argument("--trace-log", help="rotating file for the run's debug output")
+    args = parser.parse_args()
+
+    listener = setup_trace_log(args.trace_log) if args.trace_log else None
+    output = sys.stdout
+    try:
+        if args.json:
+            # keep stdout as a clean channel for the result
+            with contextlib.redirect_stdout(LogWriter(logging.getLogger("trace.stdout"))):
+                itinerary = await run_once(json_mode=True)
+            json.dump(itinerary.to_dict(), output)
+            output.flush()
+        else:
+            itinerary = await run_once(json_mode=False)
+        return itinerary
+    finally:
+        if listener is not None:
+            listener.stop()
+
+
+async def run_once(json_mode):
+    team_runner = build_team()
+    
+    # === (g) Interaction Loop ===
+    #     try:
+    #         user_input = input("👤 You: ")
+    #         if user_input.lower() in ["exit", "quit"]:
+    #             print("🤖 Agent: Goodbye! 👋")
+    #             break
+
+    #         # Run the agent’s full Reason+Act cycle
+    #         agent_response = await team_runner.arun(user_input)
+    #         print(f"🤖 Agent: {agent_response}")
+
+    #     except KeyboardInterrupt:
+    #         print("\n🤖 Agent: Session ended by user.")
+    #         break
+    #     except Exception as e:
+    #         print(f"❌ Agent error: {e}")
+    
+    # ======== Prompt and response ==============
+    user_request = input("" if json_mode else "Where do you want to go and when: ")
     
     try:
-        final_evaluation = await team_runner.arun(master_prompt)
-        print("\n\n_________________________TRAVEL ITINERARY_________________________\n\n")
-        print(final_evaluation)
+        itinerary = await plan_trip(team_runner, user_request)
+        print(f"\n\n{ITINERARY_MARKER}\n\n")
+        print(itinerary.text)
     except Exception as e:
-        print(json.dumps({"error": f"A an error occurred: {e}"}))
+        itinerary = Itinerary(text="", error=f"A an error occurred: {e}")
+        print(json.dumps({"error": itinerary.error}))
+    return itinerary
 
 
 
 if __name__ == "__main__":
     # Run the asynchronous main function.
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
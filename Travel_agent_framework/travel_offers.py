@@ -0,0 +1,265 @@
+"""
+Compact records for Amadeus flight and hotel offers.
+
+The tools used to turn every offer Amadeus returned into text and leave the
+worker LLM to read through all of it and pick the best ones. Now the response is
+parsed once into small slotted records holding only what the agents use, the
+offers are filtered and sorted here (price, stops, duration, rating) and only
+the top few are rendered for the LLM.
+"""
+import re
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Optional, Tuple
+
+DURATION = re.compile(r"PT(?:(\d+)H)?(?:(\d+)M)?")
+# room descriptions are cut to this many characters, the first line says what the room is
+DESCRIPTION_LENGTH = 80
+
+
+def parse_duration(value) -> int:
+    """Minutes in an ISO 8601 duration like PT5H30M, 0 if it can't be read."""
+    match = DURATION.fullmatch(value or "")
+    if match is None:
+        return 0
+    hours, minutes = match.groups()
+    return int(hours or 0) * 60 + int(minutes or 0)
+
+
+def format_duration(minutes: int) -> str:
+    return f"{minutes // 60}h{minutes % 60:02d}m"
+
+
+def _price(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass(slots=True)
+class Segment:
+    """One flight of an itinerary."""
+    flight_number: str
+    origin: str
+    destination: str
+    departs: str
+    arrives: str
+
+
+@dataclass(slots=True)
+class Leg:
+    """The outbound or return itinerary of a flight offer."""
+    segments: Tuple[Segment, ...]
+    minutes: int
+
+    @property
+    def stops(self) -> int:
+        return len(self.segments) - 1
+
+
+@dataclass(slots=True)
+class FlightOffer:
+    price: float
+    currency: str
+    legs: Tuple[Leg, ...]
+    seats: Optional[int] = None
+
+    @property
+    def stops(self) -> int:
+        """Stops on the worst leg, so "nonstop only" means nonstop both ways."""
+        return max(leg.stops for leg in self.legs)
+
+    @property
+    def minutes(self) -> int:
+        return sum(leg.minutes for leg in self.legs)
+
+
+@dataclass(slots=True)
+class RoomOffer:
+    price: float
+    currency: str
+    check_in: str
+    check_out: str
+    room_type: str
+    beds: str
+    description: str
+
+
+@dataclass(slots=True)
+class HotelOffer:
+    hotel_id: str
+    name: str
+    city: str
+    rating: float
+    # cheapest first
+    rooms: Tuple[RoomOffer, ...]
+
+    @property
+    def price(self) -> float:
+        return self.rooms[0].price
+
+
+def parse_flight_offers(data: dict) -> list:
+    """FlightOffer records for a flight-offers response. Offers without a price or segments are left out."""
+    offers = []
+    for offer in data.get("data", []):
+        price = _price(offer.get("price", {}).get("total"))
+        if price is None:
+            continue
+        legs = []
+        for itinerary in offer.get("itineraries", []):
+            segments = tuple(
+                Segment(
+                    segment["carrierCode"] + segment["number"],
+                    segment["departure"]["iataCode"],
+                    segment["arrival"]["iataCode"],
+                    segment["departure"]["at"],
+                    segment["arrival"]["at"],
+                )
+                for segment in itinerary.get("segments", [])
+            )
+            if segments:
+                legs.append(Leg(segments, parse_duration(itinerary.get("duration"))))
+        if legs:
+            offers.append(FlightOffer(price, offer["price"].get("currency", ""), tuple(legs), offer.get("numberOfBookableSeats")))
+    return offers
+
+
+def rank_flights(offers: list, k: int, max_stops: Optional[int] = None, max_minutes: Optional[int] = None) -> list:
+    """The k best offers within the limits: cheapest, then fewest stops, then shortest."""
+    if max_stops is not None:
+        offers = [offer for offer in offers if offer.stops <= max_stops]
+    if max_minutes is not None:
+        offers = [offer for offer in offers if max(leg.minutes for leg in offer.legs) <= max_minutes]
+    return sorted(offers, key=lambda offer: (offer.price, offer.stops, offer.minutes))[:k]
+
+
+def format_flights(top: list, found: int) -> str:
+    """The text the flight researcher sees: the top offers, one line per flight."""
+    if not top:
+        if found:
+            return f"--- Flight Options: ---\nNone of the {found} flights found match the stops and duration limits."
+        return "--- Flight Options: ---\nNo available flights given the input parameters."
+    lines = [f"--- Flight Options: best {len(top)} of {found} (price is per ticket) ---"]
+    for offer_num, offer in enumerate(top, start=1):
+        seats = f", {offer.seats} seats left" if offer.seats else ""
+        lines.append(f" Option {offer_num}: {offer.price:.2f} {offer.currency}{seats}")
+        for leg_num, leg in enumerate(offer.legs):
+            stops = "nonstop" if not leg.stops else f"{leg.stops} stop{'s' if leg.stops > 1 else ''}"
+            lines.append(f"   {'Departure' if leg_num == 0 else 'Return'} ({stops}, {format_duration(leg.minutes)}):")
+            for segment in leg.segments:
+                lines.append(
+                    f"    flight number [{segment.flight_number}]: {segment.origin} -> {segment.destination} "
+                    f"({segment.departs} -> {segment.arrives})"
+                )
+    return "\n".join(lines)
+
+
+def parse_hotel_offers(entries: list, ratings: dict = None) -> list:
+    """
+    HotelOffer records for the "data" entries of hotel-offers responses. ratings
+    maps hotel ID to star rating, for hotels whose offers don't carry one.
+    Hotels without a priced offer are left out.
+    """
+    ratings = ratings or {}
+    hotels = []
+    for entry in entries:
+        hotel = entry.get("hotel", {})
+        rooms = []
+        for offer in entry.get("offers", []):
+            price = _price(offer.get("price", {}).get("total"))
+            if price is None:
+                continue
+            room = offer.get("room", {})
+            estimated = room.get("typeEstimated", {})
+            description = room.get("description", {}).get("text", "").replace("\n", " ")
+            if len(description) > DESCRIPTION_LENGTH:
+                description = description[:DESCRIPTION_LENGTH - 3].rstrip() + "..."
+            rooms.append(RoomOffer(
+                price,
+                offer.get("price", {}).get("currency", ""),
+                offer.get("checkInDate", "N/A"),
+                offer.get("checkOutDate", "N/A"),
+                estimated.get("category", "N/A").replace("_", " ").title(),
+                f"{estimated.get('beds', 'N/A')} ({estimated.get('bedType', 'N/A').title()})",
+                description,
+            ))
+        if not rooms:
+            continue
+        hotel_id = hotel.get("hotelId", "")
+        rating = _price(hotel.get("rating") or ratings.get(hotel_id)) or 0.0
+        rooms.sort(key=lambda room: room.price)
+        hotels.append(HotelOffer(hotel_id, hotel.get("name", "Unknown Hotel"), hotel.get("cityCode", "N/A"), rating, tuple(rooms)))
+    return hotels
+
+
+def rank_hotels(hotels: list, k: int) -> list:
+    """The k cheapest hotels, the better rated first at the same price."""
+    return sorted(hotels, key=lambda hotel: (hotel.price, -hotel.rating))[:k]
+
+
+def format_hotels(top: list, rooms_per_hotel: int = 2) -> str:
+    """The text the hotel researcher sees: each hotel with its cheapest rooms."""
+    if not top:
+        return "\nNo available hotels."
+    lines = []
+    for hotel_num, hotel in enumerate(top, start=1):
+        stars = f", {hotel.rating:g} stars" if hotel.rating else ""
+        lines.append(f" Option {hotel_num}: {hotel.name} ({hotel.city}){stars}")
+        for room in hotel.rooms[:rooms_per_hotel]:
+            lines.append(
+                f"   {room.price:.2f} {room.currency}, {room.check_in} to {room.check_out}, "
+                f"{room.room_type}, beds: {room.beds}. {room.description}"
+            )
+    return "\n" + "\n".join(lines)
+
+
+def flex_date_pairs(departure: date, return_date: Optional[date], flex_days: int, today: Optional[date] = None):
+    """
+    The dates of a flexible-date search, up to flex_days either side of each
+    date: (departures, return dates, (departure, return date) pairs to search).
+    Departures before today are dropped (Amadeus refuses them) and so are pairs
+    that return before they leave. A one way search has the return dates [None].
+    """
+    today = today or date.today()
+    offsets = [timedelta(days=days) for days in range(-flex_days, flex_days + 1)]
+    departures = [departure + offset for offset in offsets if departure + offset >= today]
+    returns = [None] if return_date is None else [return_date + offset for offset in offsets]
+    pairs = [(leave, back) for leave in departures for back in returns if back is None or back >= leave]
+    return departures, returns, pairs
+
+
+def _cell(value) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, str):
+        return value
+    return f"{value:.0f}"
+
+
+def format_price_matrix(departures: list, returns: list, cells: dict) -> str:
+    """
+    Cheapest price per date pair, departures down and return dates across.
+    cells maps (departure, return date) to a price, None for no flights or
+    "error"; pairs that weren't searched are left blank. One way searches have
+    the single return date None and come out as a list.
+    """
+    if returns == [None]:
+        lines = ["--- Cheapest one way price per ticket by departure date (- means no flights) ---"]
+        for departure in departures:
+            lines.append(f" {departure.isoformat()}  {_cell(cells.get((departure, None)))}")
+        return "\n".join(lines)
+
+    width = 7
+    lines = [
+        "--- Cheapest round trip price per ticket, departure down and return across (- means no flights) ---",
+        " " * 7 + "".join(f"{return_date.strftime('%m-%d'):>{width}}" for return_date in returns),
+    ]
+    for departure in departures:
+        row = "".join(
+            f"{_cell(cells[(departure, return_date)]) if (departure, return_date) in cells else '':>{width}}"
+            for return_date in returns
+        )
+        lines.append(f" {departure.strftime('%m-%d')} {row}")
+    return "\n".join(lines)
@@ -0,0 +1,164 @@
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from fairlib.core.interfaces.tools import AbstractTool
+
+from flight_tool import FlightTool
+from hotel_tool import HotelTool
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# flights and hotels shown per leg, fewer than a single search since every leg gets its own list
+MULTI_CITY_TOP_K = int(os.getenv("MULTI_CITY_TOP_K", "3"))
+# flight and hotel searches of one trip that run at once (the Amadeus rate limit still applies)
+MULTI_CITY_CONCURRENCY = int(os.getenv("MULTI_CITY_CONCURRENCY", "8"))
+
+class MultiCityTool(AbstractTool):
+    """
+    Searches the flights and hotels for every stop of a multi-city trip in one
+    call. All the searches run at the same time, and the results come back
+    grouped by leg.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.flight_tool = FlightTool()
+        self.flight_tool.top_k = MULTI_CITY_TOP_K
+        self.hotel_tool = HotelTool()
+        self.hotel_tool.top_k = MULTI_CITY_TOP_K
+
+    name = "multi_city_search_tool"
+    description = (
+        "A tool for finding the flights and hotels of a trip with several stops in one call.\n"
+        "Give the home airport, the travellers, the budget limits and every stop in order. Each stop has a city code, "
+        "the date you arrive (the flight into it leaves that day) and the date you leave. "
+        'Add "Flight": "no" to a stop reached by train, bus or car. The flight home leaves on the last stop\'s Leave date, '
+        'set "Return_To" to another airport or to "none" for no flight home.\n'
+        "Max_Price is the most for one flight ticket, Hotel_Price the nightly price range.\n"
+        "Example input:\n"
+        '{"Origin": "DEN", "Adults": "2", "Max_Price": "900", "Ratings": "3,4,5", "Hotel_Price": "100-300", "Legs": ['
+        '{"City": "PAR", "Arrive": "2026-06-03", "Leave": "2026-06-07"}, '
+        '{"City": "BRU", "Arrive": "2026-06-07", "Leave": "2026-06-09", "Flight": "no"}, '
+        '{"City": "ROM", "Arrive": "2026-06-09", "Leave": "2026-06-13"}]}'
+    )
+
+    def use(self, expression: str) -> str:
+        expression = expression.upper()
+        user_specs_obj = json.loads(expression)
+        return self.search_trip(user_specs_obj)
+
+    async def ause(self, expression: str) -> str:
+        # same as use() but waits for Amadeus without blocking the event loop
+        expression = expression.upper()
+        user_specs_obj = json.loads(expression)
+        return await self.asearch_trip(user_specs_obj)
+
+    def trip_searches(self, tripInfo):
+        """
+        The searches for the trip, in the order they are shown: (title, "flight"
+        or "hotel", the input for that tool, upper case like the tools expect).
+        Raises KeyError if a required field is missing.
+        """
+        legs = tripInfo["LEGS"]
+        if not legs:
+            raise KeyError("LEGS")
+        # numbers in the input arrive as numbers, the tools expect text
+        max_price, adults = str(tripInfo["MAX_PRICE"]), str(tripInfo["ADULTS"])
+        ratings, price_range = str(tripInfo["RATINGS"]), str(tripInfo["HOTEL_PRICE"])
+        origin = tripInfo["ORIGIN"].strip()
+        return_to = str(tripInfo.get("RETURN_TO", origin)).strip()
+        searches = []
+        previous = origin
+        for leg_num, leg in enumerate(legs, start=1):
+            city, arrive, leave = leg["CITY"].strip(), leg["ARRIVE"].strip(), leg["LEAVE"].strip()
+            if str(leg.get("FLIGHT", "YES")).strip() != "NO":
+                searches.append((
+                    f"Leg {leg_num} flight: {previous} -> {city} on {arrive}",
+                    "flight",
+                    {"ORIGIN": previous, "DESTINATION": city, "DEPARTURE": arrive, "MAX_PRICE": max_price},
+                ))
+            searches.append((
+                f"Leg {leg_num} hotel: {city}, {arrive} to {leave}",
+                "hotel",
+                {
+                    "CITYCODE": city,
+                    "RATINGS": ratings,
+                    "ADULTS": adults,
+                    "CHECKINDATE": arrive,
+                    "CHECKOUTDATE": leave,
+                    "PRICERANGE": price_range,
+                },
+            ))
+            previous = city
+        if return_to and return_to != "NONE":
+            searches.append((
+                f"Flight home: {previous} -> {return_to} on {leave}",
+                "flight",
+                {"ORIGIN": previous, "DESTINATION": return_to, "DEPARTURE": leave, "MAX_PRICE": max_price},
+            ))
+        return searches
+
+    def format_trip(self, searches, results):
+        output_str = f"--- Multi-city search: {len(searches)} searches, best {MULTI_CITY_TOP_K} of each ---"
+        for (title, kind, info), result in zip(searches, results):
+            output_str += f"\n\n=== {title} ===\n{result.strip()}"
+        return output_str
+
+    def search_failed(self, title, error):
+        # one leg going wrong shouldn't cost the agent the results of the others
+        logger.warning("Multi-city search '%s' failed", title, exc_info=error)
+        return f"This search failed ({type(error).__name__}: {error}), the other searches are not affected."
+
+    def search(self, title, kind, info):
+        try:
+            if kind == "flight":
+                return self.flight_tool.search_flights(info)
+            return self.hotel_tool.search_city(info)
+        except Exception as e:
+            return self.search_failed(title, e)
+
+    async def asearch(self, title, kind, info):
+        try:
+            if kind == "flight":
+                return await self.flight_tool.asearch_flights(info)
+            return await self.hotel_tool.asearch_city(info)
+        except Exception as e:
+            return self.search_failed(title, e)
+
+    def search_trip(self, tripInfo):
+        try:
+            searches = self.trip_searches(tripInfo)
+        except (KeyError, TypeError, AttributeError) as e:
+            return f"Missing or invalid field {e} in the trip, see the example input."
+
+        # every search runs in its own thread, a failed one is reported in its own section
+        with ThreadPoolExecutor(max_workers=min(MULTI_CITY_CONCURRENCY, len(searches))) as executor:
+            results = list(executor.map(lambda search: self.search(*search), searches))
+        return self.format_trip(searches, results)
+
+    async def asearch_trip(self, tripInfo):
+        try:
+            searches = self.trip_searches(tripInfo)
+        except (KeyError, TypeError, AttributeError) as e:
+            return f"Missing or invalid field {e} in the trip, see the example input."
+
+        semaphore = asyncio.Semaphore(MULTI_CITY_CONCURRENCY)
+
+        async def search(title, kind, info):
+            async with semaphore:
+                return await self.asearch(title, kind, info)
+
+        results = await asyncio.gather(*(search(*search_info) for search_info in searches))
+        return self.format_trip(searches, results)
+
+
+if __name__ == "__main__":
+    tool = MultiCityTool()
+    trip = tool.use('{"Origin": "DEN", "Adults": "2", "Max_Price": "900", "Ratings": "3,4,5", "Hotel_Price": "100-300", "Legs": [{"City": "PAR", "Arrive": "2026-06-03", "Leave": "2026-06-07"}, {"City": "ROM", "Arrive": "2026-06-07", "Leave": "2026-06-11"}]}')
+    print(trip)
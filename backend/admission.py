@@ -0,0 +1,132 @@
+"""
+Admission control and load shedding for /plan, /plan/batch and /ws/plan.
+
+Every trip costs minutes of LLM time and a burst of Amadeus calls, so during a
+spike it is better to turn requests away quickly than to let everyone queue into
+multi-minute timeouts. The controller caps the number of unfinished jobs per
+client and overall, sheds load once the queue is deep enough, and tells the
+client when to come back with a Retry-After estimate.
+
+Batches and refinement sessions start agent runs without going through the job
+scheduler. A batch or a session plan counts as one unfinished job for its
+client, and each of their runs counts against the overall limit while it lasts.
+"""
+import asyncio
+import math
+import os
+from contextlib import contextmanager
+
+from .jobs import MAX_CONCURRENT_RUNS, MAX_QUEUED_JOBS
+
+MAX_JOBS_PER_CLIENT = int(os.getenv("MAX_JOBS_PER_CLIENT", "2"))
+MAX_ACTIVE_JOBS = int(os.getenv("MAX_ACTIVE_JOBS", str(MAX_CONCURRENT_RUNS + MAX_QUEUED_JOBS)))
+SHED_QUEUE_DEPTH = int(os.getenv("SHED_QUEUE_DEPTH", str(MAX_QUEUED_JOBS)))
+# only trust X-Forwarded-For when the app sits behind our own proxy
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "false").lower() == "true"
+
+# used for Retry-After before any job has finished
+DEFAULT_RUN_SECONDS = 120
+MAX_RETRY_AFTER = 600
+
+
+class Rejected(Exception):
+    """Raised when a request is not admitted. Carries the HTTP status and Retry-After seconds."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+def client_id(request) -> str:
+    """Identifies the client a request came from."""
+    if TRUST_PROXY_HEADERS:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def _finished(job) -> bool:
+    # scheduler jobs and batches say when they are finished, session plans are asyncio tasks
+    if isinstance(job, asyncio.Future):
+        return job.done()
+    return job.finished
+
+
+class AdmissionController:
+    """Decides whether a new job may be queued, and counts what it turns away."""
+
+    def __init__(self, scheduler, max_per_client: int = MAX_JOBS_PER_CLIENT, max_active: int = MAX_ACTIVE_JOBS, shed_queue_depth: int = SHED_QUEUE_DEPTH):
+        self.scheduler = scheduler
+        self.max_per_client = max_per_client
+        self.max_active = max_active
+        self.shed_queue_depth = shed_queue_depth
+        self._client_jobs = {}
+        # agent runs started outside the scheduler (batch trips, session plans)
+        self.outside_runs = 0
+        self.admitted = 0
+        self.rejected_client = 0
+        self.rejected_overload = 0
+
+    def _active_for(self, client: str) -> list:
+        jobs = [job for job in self._client_jobs.get(client, []) if not _finished(job)]
+        if jobs:
+            self._client_jobs[client] = jobs
+        else:
+            self._client_jobs.pop(client, None)
+        return jobs
+
+    def active(self) -> int:
+        """Queued and running jobs plus the agent runs started outside the scheduler."""
+        return self.scheduler.active() + self.outside_runs
+
+    @contextmanager
+    def outside_run(self):
+        """Counts an agent run that doesn't go through the scheduler against max_active while it lasts."""
+        self.outside_runs += 1
+        try:
+            yield
+        finally:
+            self.outside_runs -= 1
+
+    def retry_after(self) -> int:
+        """Rough seconds until a slot frees up: the queue ahead divided over the running workers."""
+        run_seconds = self.scheduler.average_run_seconds() or DEFAULT_RUN_SECONDS
+        waves = (self.scheduler.queue_depth() + 1) / self.scheduler.max_concurrent
+        return max(1, min(MAX_RETRY_AFTER, math.ceil(run_seconds * waves)))
+
+    def admit(self, client: str):
+        """Raises Rejected if the client or the server is over its limit."""
+        if len(self._active_for(client)) >= self.max_per_client:
+            self.rejected_client += 1
+            raise Rejected(429, f"You already have {self.max_per_client} trips being planned, wait for one to finish", self.retry_after())
+
+        if self.scheduler.queue_depth() >= self.shed_queue_depth or self.active() >= self.max_active:
+            self.rejected_overload += 1
+            raise Rejected(503, "Too many trips are being planned right now, try again later", self.retry_after())
+
+    def track(self, client: str, job):
+        """Counts a submitted job, batch or session plan against the client until it finishes."""
+        self.admitted += 1
+        self._client_jobs.setdefault(client, []).append(job)
+
+    def overloaded(self):
+        """Records a rejection that came from the scheduler's own queue limit."""
+        self.rejected_overload += 1
+        return Rejected(503, "Too many trips are being planned right now, try again later", self.retry_after())
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.scheduler.queue_depth(),
+            "running": self.scheduler.running(),
+            "outside_runs": self.outside_runs,
+            "active_clients": sum(1 for client in list(self._client_jobs) if self._active_for(client)),
+            "admitted": self.admitted,
+            "rejected_client": self.rejected_client,
+            "rejected_overload": self.rejected_overload,
+            "max_per_client": self.max_per_client,
+            "max_active": self.max_active,
+            "shed_queue_depth": self.shed_queue_depth,
+        }
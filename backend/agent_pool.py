@@ -0,0 +1,181 @@
+"""
+Warm pool of pre-built travel agent teams that lives inside the FastAPI process.
+
+Starting a new interpreter for every /plan means re-importing fairlib, rebuilding
+every agent and fetching new Amadeus tokens before any work happens. The pool
+builds each HierarchicalAgentRunner team once at startup and hands them out to
+requests. Every team is pinned to its own thread and event loop, so the blocking
+work inside a run never stalls the server's event loop. The flight and hotel
+tools await Amadeus on the team's loop (their ause), so a team waiting on the
+API holds no extra thread.
+"""
+import asyncio
+import logging
+import os
+import threading
+
+from . import run_agents  # noqa: F401  (puts the travel framework on sys.path)
+
+# isort: split
+import amadeus_http
+import travel_multi_agent
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = int(os.getenv("AGENT_POOL_SIZE", "2"))
+
+
+class TeamWorker:
+    """A single warm agent team running on a dedicated thread with its own event loop."""
+
+    def __init__(self, worker_id: int):
+        self.worker_id = worker_id
+        self.team = None
+        self.runs = 0
+        # the run in progress on this worker's loop, if any
+        self.current = None
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop, name=f"agent-team-{worker_id}", daemon=True)
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def _build(self):
+        # built on the worker's own loop so anything loop-bound inside the llm adapter belongs to it
+        self.team = travel_multi_agent.build_team()
+
+    async def _run(self, user_request: str, on_event=None, revision=None):
+        self.current = asyncio.current_task()
+        try:
+            travel_multi_agent.reset_team(self.team)
+            self.runs += 1
+            if revision is not None:
+                return await travel_multi_agent.replan_trip(self.team, user_request, on_event=on_event, **revision)
+            return await travel_multi_agent.plan_trip(self.team, user_request, on_event)
+        finally:
+            self.current = None
+
+    async def _wait_idle(self):
+        if self.current is not None:
+            await asyncio.wait({self.current})
+
+    def wait_idle(self) -> asyncio.Future:
+        """
+        Resolves once the team has actually stopped working. A cancelled run only
+        stops at its next await, so a blocking call in progress finishes first.
+        """
+        return asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._wait_idle(), self.loop))
+
+    def start(self) -> asyncio.Future:
+        """Starts the thread and builds the team. Returns an awaitable for the build."""
+        self.thread.start()
+        return asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._build(), self.loop))
+
+    def submit(self, user_request: str, on_event=None, revision=None):
+        """Schedules a run on this worker's loop and returns a concurrent future."""
+        return asyncio.run_coroutine_threadsafe(self._run(user_request, on_event, revision), self.loop)
+
+    def stop(self):
+        # close this loop's pooled Amadeus connections while the loop still runs
+        closing = asyncio.run_coroutine_threadsafe(amadeus_http.aclose(), self.loop)
+        try:
+            closing.result(timeout=2)
+        except Exception:
+            logger.warning("Could not close the Amadeus client of team %d", self.worker_id, exc_info=True)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+
+
+class AgentPool:
+    """
+    Hands out pre-initialized agent teams to requests.
+
+    Callers await run(); if every team is busy they wait in line for the next free one.
+    """
+
+    def __init__(self, size: int = DEFAULT_POOL_SIZE):
+        if size < 1:
+            raise ValueError("Agent pool size must be at least 1")
+        self.size = size
+        self.workers = []
+        self._idle = None
+        self._next_id = 0
+
+    async def start(self):
+        """
+        Builds every team in parallel, from the app's event loop. If some teams
+        fail to build the error is raised, and calling start again builds only
+        the missing ones.
+        """
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+        workers = []
+        for _ in range(self.size - len(self.workers)):
+            workers.append(TeamWorker(self._next_id))
+            self._next_id += 1
+        results = await asyncio.gather(*(worker.start() for worker in workers), return_exceptions=True)
+        failed = []
+        for worker, result in zip(workers, results):
+            if isinstance(result, BaseException):
+                failed.append((worker, result))
+            else:
+                self.workers.append(worker)
+                self._idle.put_nowait(worker)
+        if failed:
+            # stopping joins the worker's thread, keep that off the server's loop
+            await asyncio.gather(*(asyncio.to_thread(worker.stop) for worker, _ in failed))
+            raise failed[0][1]
+        logger.info("Agent pool ready with %d warm teams", self.size)
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+        self.workers = []
+
+    async def run(self, user_request: str, timeout: float = None, on_event=None, revision: dict = None):
+        """
+        Runs the user's request on the next free team and returns its Itinerary.
+
+        on_event is called on the caller's event loop for every event the team reports.
+        revision holds replan_trip's previous, rerun_stages and changes arguments
+        to revise an earlier itinerary instead of planning from scratch.
+        """
+        if self._idle is None:
+            raise RuntimeError("Agent pool has not been started")
+
+        if on_event is not None:
+            # the team runs on its own thread, hop its events back onto our loop
+            loop = asyncio.get_running_loop()
+            callback = on_event
+            on_event = lambda event: loop.call_soon_threadsafe(callback, event)
+
+        worker = await self._idle.get()
+        finished = False
+        try:
+            # cancelling or timing out the wrapped future also cancels the run on the worker's loop
+            future = asyncio.wrap_future(worker.submit(user_request, on_event, revision))
+            result = await asyncio.wait_for(future, timeout)
+            finished = True
+            return result
+        finally:
+            if finished:
+                self._idle.put_nowait(worker)
+            else:
+                # hand the team back once a cancelled or failed run has wound down, not while it still holds the team
+                asyncio.ensure_future(self._release_when_idle(worker))
+
+    async def _release_when_idle(self, worker):
+        try:
+            await worker.wait_idle()
+        finally:
+            self._idle.put_nowait(worker)
+
+    def stats(self) -> dict:
+        idle = self._idle.qsize() if self._idle is not None else 0
+        return {
+            "size": self.size,
+            "idle": idle,
+            "busy": len(self.workers) - idle,
+            "runs": sum(worker.runs for worker in self.workers),
+        }
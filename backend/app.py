@@ -1,29 +1,252 @@
+import asyncio
+import json
+import logging
 import os
-from fastapi import FastAPI, Form, Request
-from fastapi.responses import StreamingResponse
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import (
+    FastAPI,
+    File,
+    Form,
+    HTTPException,
+    Request,
+    UploadFile,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from fastapi import BackgroundTasks
-from io import BytesIO
-from reportlab.pdfgen import canvas
-import asyncio
-from .run_agents import run_multi_agent_and_get_itinerary  # relative import
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.units import inch
 
-app = FastAPI()
+from . import run_agents  # noqa: F401  (puts the travel framework on sys.path)
+
+# isort: split
+from amadeus_limiter import get_rate_limiter
+from flight_cache import get_flight_cache
+from hotel_catalog import get_hotel_catalog
+from instrumentation import add_observer, remove_observer
+from itinerary import Itinerary
+from trace_log import setup_trace_log
+
+from . import metrics, renderer
+from .admission import AdmissionController, Rejected, client_id
+from .agent_pool import DEFAULT_POOL_SIZE, AgentPool
+from .batch import BatchError, BatchRunner, clean_trip, parse_trips, render_zip
+from .cache import ItineraryCache, request_key
+from .jobs import CANCELLED_JOBS, DONE, JobScheduler, QueueFullError
+from .run_agents import (  # relative import
+    TRACE_LOG_PATH,
+    run_itinerary_in_pool,
+    run_multi_agent_in_subprocess,
+)
+from .sessions import (
+    ALL_STAGES,
+    CACHED,
+    FULL,
+    INCREMENTAL,
+    UNCHANGED,
+    SessionLimitError,
+    SessionStore,
+)
+from .singleflight import SingleFlight
+from .store import ITINERARY_COMPACT_INTERVAL, ItineraryStore
+from .warmup import WARMUP_RETRY_AFTER, WarmUp
+
+# "pool" runs requests on warm in-process agent teams, "subprocess" starts a new interpreter per request
+AGENT_RUN_MODE = os.getenv("AGENT_RUN_MODE", "pool")
+AGENT_TIMEOUT = int(os.getenv("AGENT_TIMEOUT", "5000"))
+# seconds between keep-alive comments on the event stream
+SSE_KEEPALIVE = 15
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # agent debug output is written to a rotating file from a background thread
+    trace_listener = setup_trace_log(TRACE_LOG_PATH)
+    # tool and LLM timings from the travel framework go into /metrics
+    add_observer(metrics.record_framework_metric)
+    app.state.agent_pool = None
+    if AGENT_RUN_MODE == "pool":
+        app.state.agent_pool = AgentPool(DEFAULT_POOL_SIZE)
+    app.state.itinerary_cache = ItineraryCache()
+    app.state.itinerary_store = ItineraryStore()
+    compactor = asyncio.create_task(compact_store_periodically(app.state.itinerary_store))
+    app.state.singleflight = SingleFlight()
+    app.state.scheduler = JobScheduler(run_job)
+    app.state.admission = AdmissionController(app.state.scheduler)
+    app.state.batches = BatchRunner(run_batch_trip)
+    app.state.sessions = SessionStore()
+    register_gauges(app.state)
+    await app.state.scheduler.start()
+
+    # build the agent teams, start the render processes and load the page while
+    # the server already answers health checks; /health/ready says when it's done
+    warm_up_stages = {
+        "renderer": renderer.warm_up,
+        "templates": lambda: asyncio.to_thread(templates.get_template, "index.html"),
+    }
+    if app.state.agent_pool is not None:
+        warm_up_stages["agent_pool"] = app.state.agent_pool.start
+    # only the agent teams hold trips up, a cold renderer or template just makes their first use slower
+    app.state.warmup = WarmUp(required=("agent_pool",))
+    app.state.warmup.start(**warm_up_stages)
+    yield
+    # stop taking new trips before anything is torn down
+    await app.state.warmup.stop()
+    compactor.cancel()
+    await app.state.batches.stop()
+    await app.state.scheduler.stop()
+    if app.state.agent_pool is not None:
+        app.state.agent_pool.stop()
+    renderer.shutdown()
+    remove_observer(metrics.record_framework_metric)
+    trace_listener.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # label by route template (/jobs/{job_id}) so every job doesn't get its own series
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method, route=path, status=status)
 
 # Tell FastAPI where your templates are
 templates = Jinja2Templates(directory=os.path.join(os.path.dirname(__file__), "templates"))
 
+def ensure_ready(request: Request):
+    """Turns trips away with a 503 while the server is still warming up or shutting down."""
+    if not request.app.state.warmup.ready:
+        raise HTTPException(status_code=503, detail="The server is starting up, try again shortly", headers={"Retry-After": str(WARMUP_RETRY_AFTER)})
+
+
+# GET endpoint for liveness probes, the process is up and answering
+@app.get("/health/live")
+async def health_live():
+    return {"status": "ok"}
+
+
+# GET endpoint for readiness probes, 200 only once the agent teams are warm
+@app.get("/health/ready")
+async def health_ready(request: Request):
+    status = request.app.state.warmup.status()
+    if not status["ready"]:
+        return JSONResponse(status, status_code=503)
+    return status
+
+
 # GET endpoint to show HTML form
 @app.get("/")
 async def index(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
-# POST endpoint to handle form submission
-@app.post("/plan")
+def build_user_request(origin, destination, departure_date, nights, budget, notes):
+    return f"I want to leave {origin} and go to {destination} for {nights} nights starting {departure_date}. I don't want to spend more than {budget} on flights and hotels. EXTRA NOTES: {notes}"
+    # I want to leave Denver and go to Europe for 21 nights starting 03/11/2026. I don't want to spend more than 15000 on flights and hotels. EXTRA NOTES: 2 adults, interested in art and culture.
+
+
+async def run_itinerary(user_request: str, on_event=None, key: str = None, revision: dict = None) -> Itinerary:
+    """
+    Runs one request on a warm agent team, or in a new interpreter if the pool is turned off.
+    Progress events and revisions of an earlier itinerary are only available from the pool.
+
+    Concurrent calls with the same request key share a single run; only the first
+    caller's on_event sees progress.
+    """
+    if key is not None:
+        return await app.state.singleflight.do(key, lambda: run_itinerary(user_request, on_event))
+
+    if app.state.agent_pool is not None:
+        def record_and_forward(event):
+            metrics.record_agent_event(event)
+            if on_event is not None:
+                on_event(event)
+
+        return await run_itinerary_in_pool(app.state.agent_pool, user_request, AGENT_TIMEOUT, record_and_forward, revision)
+    return await run_multi_agent_in_subprocess(user_request, AGENT_TIMEOUT)
+
+
+async def run_job(job) -> Itinerary:
+    """Runs a queued job and keeps the finished itinerary in the result cache."""
+    outcome = "error"
+    try:
+        itinerary = await run_itinerary(job.user_request, job.publish, job.key)
+        outcome = "ok"
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        raise
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    finally:
+        # measured from submission, so time spent waiting in the queue counts too
+        metrics.JOB_SECONDS.observe(time.time() - job.created_at, outcome=outcome)
+        metrics.JOBS.inc(outcome=outcome)
+    if job.key is not None:
+        await remember_itinerary(job.key, itinerary)
+    await store_itinerary(job, itinerary)
+    return itinerary
+
+
+async def store_itinerary(job, itinerary: Itinerary, cached: bool = False):
+    """Keeps the finished job in the itinerary store so it can be downloaded again later."""
+    try:
+        await asyncio.to_thread(app.state.itinerary_store.save, job, itinerary, cached)
+    except Exception:
+        # the user still gets this download, it just can't be fetched again later
+        logger.exception("Could not store itinerary %s", job.id)
+
+
+async def compact_store_periodically(store):
+    while True:
+        await asyncio.sleep(ITINERARY_COMPACT_INTERVAL)
+        try:
+            removed = await asyncio.to_thread(store.compact)
+            logger.info("Compacted itinerary store, removed %s", removed)
+        except Exception:
+            logger.exception("Itinerary store compaction failed")
+
+
+async def cached_itinerary(key: str):
+    """Returns the cached Itinerary for the request key, or None."""
+    cached = await asyncio.to_thread(app.state.itinerary_cache.get, key)
+    return Itinerary.from_dict(json.loads(cached)) if cached is not None else None
+
+
+async def remember_itinerary(key: str, itinerary: Itinerary):
+    if itinerary.error is None:
+        await asyncio.to_thread(app.state.itinerary_cache.set, key, json.dumps(itinerary.to_dict()))
+
+
+async def run_batch_trip(trip) -> Itinerary:
+    """Plans one trip of a batch, reusing cached and in-flight runs of the same trip."""
+    fields = trip.fields
+    user_request = build_user_request(**fields)
+    key = request_key(**fields)
+    itinerary = await cached_itinerary(key)
+    if itinerary is not None:
+        trip.cached = True
+        return itinerary
+    # the batch was admitted as a whole, its runs still count against the overall limit
+    with app.state.admission.outside_run():
+        itinerary = await run_itinerary(user_request, key=key)
+    await remember_itinerary(key, itinerary)
+    return itinerary
+
+
+# POST endpoint to handle form submission, queues the run and returns a job ID right away
+@app.post("/plan", status_code=202)
 async def plan(
     request: Request,
     origin: str = Form("Denver"),
@@ -33,51 +256,413 @@ async def plan(
     budget: str = Form("4000"),
     notes: str = Form("None")
 ):
-    user_request = f"I want to leave {origin} and go to {destination} for {nights} nights starting {departure_date}. I don't want to spend more than {budget} on flights and hotels. EXTRA NOTES: {notes}"
-    # I want to leave Denver and go to Europe for 21 nights starting 03/11/2026. I don't want to spend more than 15000 on flights and hotels. EXTRA NOTES: 2 adults, interested in art and culture.
+    ensure_ready(request)
+    user_request = build_user_request(origin, destination, departure_date, nights, budget, notes)
+    key = request_key(origin, destination, departure_date, nights, budget, notes)
+
+    # the same trip was planned recently, hand back that itinerary instead of running the team again
+    itinerary = await cached_itinerary(key)
+    if itinerary is not None:
+        job = request.app.state.scheduler.add_finished(user_request, itinerary, key, cached=True)
+        await store_itinerary(job, itinerary, cached=True)
+        return {
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/jobs/{job.id}",
+        }
+
+    # the same trip is already being planned, share that job (no new run, so nothing to admit)
+    job = request.app.state.scheduler.join(key)
+    if job is None:
+        client = client_id(request)
+        admission = request.app.state.admission
+        try:
+            admission.admit(client)
+            try:
+                job = request.app.state.scheduler.submit(user_request, key)
+            except QueueFullError:
+                raise admission.overloaded()
+        except Rejected as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+        admission.track(client, job)
+
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+    }
+
+
+def rejection(e: Rejected) -> dict:
+    return {"type": "error", "detail": e.detail, "status_code": e.status_code, "retry_after": e.retry_after}
+
+
+async def plan_in_session(session, fields: dict, send, client: str):
+    """Plans the trip for a refinement session, redoing only what the edit invalidated."""
+    async with session.lock:
+        mode, stages, changes = session.plan_for(fields)
+        user_request = build_user_request(**fields)
+        key = request_key(**fields)
+        if mode == INCREMENTAL and app.state.agent_pool is None:
+            # revisions need a warm team, a new interpreter has nothing to reuse
+            mode, stages = FULL, ALL_STAGES
+        send({"type": "plan_started", "mode": mode, "rerun": sorted(stages), "changes": changes})
+
+        start = time.perf_counter()
+        try:
+            if mode == UNCHANGED:
+                itinerary = session.itinerary
+            else:
+                itinerary = await cached_itinerary(key)
+                if itinerary is not None:
+                    mode = CACHED
+                else:
+                    # only plans that start an agent run are admitted, like /plan
+                    admission = app.state.admission
+                    try:
+                        admission.admit(client)
+                    except Rejected as e:
+                        send(rejection(e))
+                        return
+                    admission.track(client, asyncio.current_task())
+                    with admission.outside_run():
+                        if mode == INCREMENTAL:
+                            revision = {"previous": session.itinerary, "rerun_stages": stages, "changes": changes}
+                            itinerary = await run_itinerary(user_request, send, revision=revision)
+                        else:
+                            itinerary = await run_itinerary(user_request, send, key)
+                await remember_itinerary(key, itinerary)
+        except asyncio.CancelledError:
+            send({"type": "cancelled"})
+            raise
+        except Exception as e:
+            send({"type": "error", "detail": str(e)})
+            return
+
+        session.remember(fields, itinerary, mode)
+        send({
+            "type": "itinerary",
+            "mode": mode,
+            "seconds": round(time.perf_counter() - start, 3),
+            "itinerary": itinerary.to_dict(),
+        })
+
 
+async def send_messages(websocket: WebSocket, outbox: asyncio.Queue):
+    # one sender so messages go out in the order they were produced
+    while True:
+        await websocket.send_json(await outbox.get())
+
+
+# WebSocket for refining a trip: send {"type": "plan", "trip": {...form fields}} as often as you like,
+# every edit after the first reuses what the previous plan found. {"type": "cancel"} stops the current plan.
+@app.websocket("/ws/plan")
+async def plan_session_socket(websocket: WebSocket, session_id: str = None):
+    await websocket.accept()
+    if not websocket.app.state.warmup.ready:
+        await websocket.close(code=1013, reason="The server is starting up, try again shortly")
+        return
     try:
-        itinerary_text = await asyncio.to_thread(
-            run_multi_agent_and_get_itinerary,
-            user_request,
-            5000  # timeout
-        )
-    except Exception as e:
-        return {"error": str(e)}
-
-    # Generate PDF in memory
-    buffer = BytesIO()
-
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=letter,
-        rightMargin=40,
-        leftMargin=40,
-        topMargin=40,
-        bottomMargin=40,
+        session = websocket.app.state.sessions.open(session_id)
+    except SessionLimitError as e:
+        await websocket.close(code=1013, reason=str(e))
+        return
+
+    client = client_id(websocket)
+    outbox = asyncio.Queue()
+    sender = asyncio.create_task(send_messages(websocket, outbox))
+    outbox.put_nowait({"type": "session", "session_id": session.id, "trip": session.fields})
+    plan_task = None
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except json.JSONDecodeError:
+                outbox.put_nowait({"type": "error", "detail": "Messages must be JSON"})
+                continue
+            message_type = message.get("type") if isinstance(message, dict) else None
+
+            if message_type in ("plan", "cancel") and plan_task is not None and not plan_task.done():
+                # a newer edit replaces the plan in progress
+                plan_task.cancel()
+            if message_type == "plan":
+                try:
+                    fields = clean_trip(1, message.get("trip"))
+                except BatchError as e:
+                    outbox.put_nowait({"type": "error", "detail": str(e)})
+                    continue
+                plan_task = asyncio.create_task(plan_in_session(session, fields, outbox.put_nowait, client))
+            elif message_type != "cancel":
+                outbox.put_nowait({"type": "error", "detail": "Expected a message with type 'plan' or 'cancel'"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if plan_task is not None and not plan_task.done():
+            # nobody is left to receive the plan
+            plan_task.cancel()
+            CANCELLED_JOBS.inc(reason="disconnected", stage="session")
+        sender.cancel()
+
+
+# POST endpoint for the travel desk: a CSV or JSON file of trips, planned together in the background
+@app.post("/plan/batch", status_code=202)
+async def plan_batch(request: Request, trips: UploadFile = File(...)):
+    ensure_ready(request)
+    try:
+        parsed = parse_trips(await trips.read(), trips.filename or "")
+    except BatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # a batch counts as one job for its client, its trips count against the overall limit as they run
+    client = client_id(request)
+    admission = request.app.state.admission
+    try:
+        admission.admit(client)
+    except Rejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+    batch = request.app.state.batches.submit(parsed)
+    admission.track(client, batch)
+    return {
+        "batch_id": batch.id,
+        "status": batch.status,
+        "trips": len(batch.trips),
+        "status_url": f"/batches/{batch.id}",
+    }
+
+
+# GET endpoint with the batch's progress and the summary table so far
+@app.get("/batches/{batch_id}")
+async def batch_status(request: Request, batch_id: str):
+    batch = request.app.state.batches.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Unknown batch")
+
+    info = batch.to_dict()
+    if batch.finished:
+        info["result_url"] = f"/batches/{batch.id}/zip"
+    return info
+
+
+# DELETE endpoint to stop the trips of a batch that haven't been planned yet
+@app.delete("/batches/{batch_id}")
+async def cancel_batch(request: Request, batch_id: str):
+    batch = request.app.state.batches.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Unknown batch")
+
+    request.app.state.batches.cancel(batch)
+    return {"batch_id": batch.id, "status": batch.status}
+
+
+# GET endpoint to download a finished batch as a ZIP of itinerary PDFs plus summary.csv
+@app.get("/batches/{batch_id}/zip")
+async def batch_zip(request: Request, batch_id: str):
+    batch = request.app.state.batches.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Unknown batch")
+    if not batch.finished:
+        raise HTTPException(status_code=409, detail=f"Batch is {batch.status}")
+
+    data = await render_zip(batch)
+    return StreamingResponse(
+        renderer.iter_chunks(data),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename=itineraries-{batch.id[:8]}.zip",
+            "Content-Length": str(len(data)),
+        }
     )
 
-    styles = getSampleStyleSheet()
-    body = styles["BodyText"]
-    body.fontName = "Helvetica"
-    body.fontSize = 10
-    body.leading = 14  # line spacing
-    body.encoding = "UTF-8"
 
-    story = []
+# GET endpoint to poll a job
+@app.get("/jobs/{job_id}")
+async def job_status(request: Request, job_id: str):
+    job = request.app.state.scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
 
-    # Convert each line to a Paragraph (auto-wraps)
-    for line in itinerary_text.split("\n"):
-        if line.strip() == "":
-            story.append(Spacer(1, 0.2 * inch))
-        else:
-            story.append(Paragraph(line, body))
+    # polling counts as still waiting for the result
+    job.touch()
+    info = job.to_dict()
+    info["queue_depth"] = request.app.state.scheduler.queue_depth()
+    if job.status == DONE:
+        info["result_url"] = f"/itineraries/{job.id}"
+    return info
+
+
+# DELETE endpoint for a client that no longer wants the itinerary (the page sends it when the tab closes)
+@app.delete("/jobs/{job_id}")
+async def leave_job(request: Request, job_id: str):
+    job = request.app.state.scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+
+    # the run is only stopped once every client sharing the job has left
+    if not job.finished:
+        request.app.state.scheduler.leave(job, "client_left")
+    return job.to_dict()
+
+
+async def sse_events(job):
+    """Formats a job's progress events as Server-Sent Events, with keep-alives while the team works."""
+    events = job.stream()
+    next_event = asyncio.ensure_future(anext(events))
+    try:
+        while True:
+            done, _ = await asyncio.wait({next_event}, timeout=SSE_KEEPALIVE)
+            if not done:
+                # comment lines keep proxies from closing a quiet connection
+                yield ": keep-alive\n\n"
+                continue
+            try:
+                event = next_event.result()
+            except StopAsyncIteration:
+                break
+            if event.get("type") == "status" and event.get("status") == DONE:
+                event = {**event, "result_url": f"/itineraries/{job.id}"}
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+            next_event = asyncio.ensure_future(anext(events))
+    finally:
+        next_event.cancel()
+        await events.aclose()
 
-    await asyncio.to_thread(doc.build, story)
-    buffer.seek(0)
 
+# GET endpoint that streams manager turns, worker delegations and the final itinerary as they happen
+@app.get("/jobs/{job_id}/events")
+async def job_events(request: Request, job_id: str):
+    job = request.app.state.scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+
+    return StreamingResponse(
+        sse_events(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# GET endpoint with the itinerary cache, flight-offer cache and hotel catalog counters and request deduplication counts
+@app.get("/cache/stats")
+async def cache_stats(request: Request):
+    stats = await asyncio.to_thread(request.app.state.itinerary_cache.stats)
+    # only the pool's teams search from this process, subprocess runs have their own
+    stats["flight_offers"] = await asyncio.to_thread(get_flight_cache().stats)
+    stats["hotel_catalog"] = await asyncio.to_thread(get_hotel_catalog().stats)
+    stats["amadeus_rate_limit"] = await asyncio.to_thread(get_rate_limiter().stats)
+    stats["singleflight"] = request.app.state.singleflight.stats()
+    stats["deduplicated_jobs"] = request.app.state.scheduler.deduplicated
+    stats["sessions"] = request.app.state.sessions.stats()
+    return stats
+
+
+# GET endpoint with queue depth and rejection counters, for sizing the deployment
+@app.get("/admission/stats")
+async def admission_stats(request: Request):
+    return request.app.state.admission.stats()
+
+
+def register_gauges(state):
+    """
+    Gauges, and totals counted elsewhere, are read from the scheduler, admission
+    controller, pool and caches when /metrics is scraped.
+    """
+    metrics.REGISTRY.gauge("travel_queue_depth", "Jobs waiting for a free agent team.", state.scheduler.queue_depth)
+    metrics.REGISTRY.gauge("travel_running_jobs", "Jobs being planned right now.", state.scheduler.running)
+    metrics.REGISTRY.gauge("travel_average_run_seconds", "Average run time of recent jobs.", lambda: state.scheduler.average_run_seconds() or 0)
+    metrics.REGISTRY.counter_func("travel_deduplicated_jobs_total", "Plan requests that joined a job already in progress.", lambda: state.scheduler.deduplicated)
+    metrics.REGISTRY.counter_func(
+        "travel_admission_rejections_total",
+        "Plan requests turned away by admission control, by reason.",
+        lambda: {(("reason", "client"),): state.admission.rejected_client, (("reason", "overload"),): state.admission.rejected_overload},
+    )
+    metrics.REGISTRY.gauge("travel_singleflight_in_flight", "Distinct runs shared between identical requests.", lambda: state.singleflight.stats()["in_flight"])
+    limiter = get_rate_limiter()
+    metrics.REGISTRY.counter_func("travel_amadeus_calls_total", "Amadeus calls let through by the rate limiter.", lambda: limiter.calls)
+    metrics.REGISTRY.counter_func("travel_amadeus_backoffs_total", "Times Amadeus answered 429 and every call was held back.", lambda: limiter.backoffs)
+    if limiter.monthly_quota:
+        metrics.REGISTRY.gauge("travel_amadeus_calls_this_month", "Amadeus calls counted against the monthly quota.", limiter.used_this_month)
+    if state.agent_pool is not None:
+        metrics.REGISTRY.gauge(
+            "travel_agent_pool_teams",
+            "Warm agent teams, by state.",
+            lambda: {(("state", name),): state.agent_pool.stats()[name] for name in ("idle", "busy")},
+        )
+
+
+# GET endpoint in the Prometheus text format: stage latencies, LLM tokens, retries and queue gauges
+@app.get("/metrics")
+async def metrics_endpoint(request: Request):
+    body = metrics.REGISTRY.expose()
+    cache = await asyncio.to_thread(request.app.state.itinerary_cache.stats)
+    lines = ["# HELP travel_itinerary_cache_events_total Itinerary cache lookups, by result.", "# TYPE travel_itinerary_cache_events_total counter"]
+    for name in ("hits", "misses", "expired", "evictions"):
+        lines.append(f'travel_itinerary_cache_events_total{{result="{name}"}} {cache[name]}')
+    return PlainTextResponse(body + "\n".join(lines) + "\n", media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+async def itinerary_download(itinerary_id: str, output_format: str, itinerary: Itinerary = None):
+    """
+    Streams the itinerary in the requested format. Files rendered before come
+    straight from the store, anything else is rendered from the stored itinerary.
+    """
+    if output_format not in renderer.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format, expected one of {', '.join(renderer.FORMATS)}")
+
+    store = app.state.itinerary_store
+    data = await asyncio.to_thread(store.get_artifact, itinerary_id, output_format)
+    if data is None:
+        if itinerary is None:
+            stored = await asyncio.to_thread(store.get, itinerary_id)
+            if stored is None:
+                raise HTTPException(status_code=404, detail="Unknown itinerary, it may have expired")
+            itinerary = Itinerary.from_dict(stored[0])
+        start = time.perf_counter()
+        data = await renderer.render(itinerary, output_format)
+        try:
+            await asyncio.to_thread(store.save_artifact, itinerary_id, output_format, data, time.perf_counter() - start)
+        except Exception:
+            logger.exception("Could not store the %s for itinerary %s", output_format, itinerary_id)
+
+    media_type, extension = renderer.FORMATS[output_format]
     return StreamingResponse(
-        buffer,
-        media_type="application/pdf",
-        headers={"Content-Disposition": "attachment; filename=itinerary.pdf"}
-    )
\ No newline at end of file
+        renderer.iter_chunks(data),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename=itinerary.{extension}",
+            "Content-Length": str(len(data)),
+        }
+    )
+
+
+# GET endpoint to download an itinerary again by its ID, for as long as the store keeps it
+@app.get("/itineraries/{itinerary_id}")
+async def stored_itinerary(itinerary_id: str, format: str = "pdf"):
+    return await itinerary_download(itinerary_id, format)
+
+
+# GET endpoint with what the store knows about an itinerary: request, timings and rendered formats
+@app.get("/itineraries/{itinerary_id}/info")
+async def stored_itinerary_info(itinerary_id: str):
+    stored = await asyncio.to_thread(app.state.itinerary_store.get, itinerary_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Unknown itinerary, it may have expired")
+    itinerary, info = stored
+    return {**info, "itinerary": itinerary}
+
+
+# GET endpoint with the itinerary store's size and retention
+@app.get("/itineraries")
+async def itinerary_store_stats(request: Request):
+    return await asyncio.to_thread(request.app.state.itinerary_store.stats)
+
+
+# GET endpoint to download a finished job's itinerary, as a PDF unless another format is asked for
+@app.get("/jobs/{job_id}/itinerary")
+async def job_itinerary(request: Request, job_id: str, format: str = "pdf"):
+    job = request.app.state.scheduler.get(job_id)
+    if job is None:
+        # forgotten by the scheduler, but the store may still have it
+        return await itinerary_download(job_id, format)
+    if job.status != DONE:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    return await itinerary_download(job.id, format, job.result)
@@ -0,0 +1,289 @@
+"""
+Bulk itinerary planning for the travel desk.
+
+A batch is a CSV or JSON list of trips with the same fields as the /plan form.
+Its trips run concurrently, at most BATCH_CONCURRENCY at a time, through the same
+path as single requests: the itinerary cache, single-flight and the warm agent
+pool. A 50-person conference group leaving from the same city is planned once,
+and every run reuses the warm teams' tools and Amadeus tokens instead of
+starting from nothing. When the batch finishes it is downloaded as a ZIP of
+itinerary PDFs with a summary.csv.
+"""
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import re
+import time
+import uuid
+import zipfile
+
+from . import renderer
+from .jobs import (
+    CANCELLED,
+    DONE,
+    FAILED,
+    JOB_RESULT_TTL,
+    MAX_CONCURRENT_RUNS,
+    QUEUED,
+    RUNNING,
+)
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", str(MAX_CONCURRENT_RUNS)))
+MAX_BATCH_TRIPS = int(os.getenv("MAX_BATCH_TRIPS", "100"))
+
+# same fields and defaults as the /plan form
+FIELDS = ("origin", "destination", "departure_date", "nights", "budget", "notes")
+DEFAULTS = {
+    "origin": "Denver",
+    "destination": "Rome, Italy",
+    "nights": 7,
+    "budget": "4000",
+    "notes": "None",
+}
+
+SUMMARY_COLUMNS = ("trip", "origin", "destination", "departure_date", "nights", "budget", "notes", "status", "cached", "seconds", "flights_cost", "hotels_cost", "total_cost", "file", "error")
+
+BATCH_TRIPS = REGISTRY.counter("travel_batch_trips_total", "Trips planned as part of a batch, by outcome.")
+
+
+class BatchError(ValueError):
+    """Raised when an uploaded batch can't be read. The message says which trip is wrong."""
+
+
+def clean_trip(number: int, raw: dict) -> dict:
+    if not isinstance(raw, dict):
+        raise BatchError(f"Trip {number}: expected an object with {', '.join(FIELDS)}")
+    # CSV headers from spreadsheets come with stray spaces and capitals
+    raw = {str(name).strip().lower(): value for name, value in raw.items() if name is not None}
+    trip = {}
+    for field in FIELDS:
+        value = raw.get(field)
+        if isinstance(value, str):
+            value = value.strip()
+        trip[field] = DEFAULTS.get(field) if value in (None, "") else value
+    if not trip["departure_date"]:
+        raise BatchError(f"Trip {number}: departure_date is required")
+    try:
+        trip["nights"] = int(trip["nights"])
+    except (TypeError, ValueError):
+        raise BatchError(f"Trip {number}: nights must be a whole number, got {trip['nights']!r}")
+    trip["budget"] = str(trip["budget"])
+    trip["notes"] = str(trip["notes"])
+    return trip
+
+
+def parse_trips(data: bytes, filename: str = "") -> list:
+    """Reads the uploaded trips. JSON if the file is .json or starts with '[' or '{', CSV otherwise."""
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise BatchError("The file must be UTF-8 text")
+
+    if filename.lower().endswith(".json") or text.lstrip()[:1] in ("[", "{"):
+        try:
+            rows = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise BatchError(f"Not valid JSON: {e}")
+        if isinstance(rows, dict):
+            rows = rows.get("trips")
+        if not isinstance(rows, list):
+            raise BatchError("Expected a JSON list of trips (or an object with a 'trips' list)")
+    else:
+        reader = csv.DictReader(io.StringIO(text))
+        if not reader.fieldnames or "departure_date" not in [name.strip().lower() for name in reader.fieldnames]:
+            raise BatchError(f"The CSV needs a header row with at least departure_date (columns: {', '.join(FIELDS)})")
+        rows = [row for row in reader if any((value or "").strip() for value in row.values() if isinstance(value, str))]
+
+    if not rows:
+        raise BatchError("The batch has no trips")
+    if len(rows) > MAX_BATCH_TRIPS:
+        raise BatchError(f"A batch can have at most {MAX_BATCH_TRIPS} trips, this one has {len(rows)}")
+    return [clean_trip(number, row) for number, row in enumerate(rows, start=1)]
+
+
+class Trip:
+    """One trip in a batch and, once planned, its itinerary or error."""
+
+    def __init__(self, number: int, fields: dict):
+        self.number = number
+        self.fields = fields
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        # set by the run function when the itinerary came from the cache
+        self.cached = False
+        self.seconds = None
+
+    @property
+    def filename(self) -> str:
+        destination = re.sub(r"[^a-z0-9]+", "-", self.fields["destination"].lower()).strip("-") or "trip"
+        return f"itinerary-{self.number:03d}-{destination}.pdf"
+
+    def summary(self) -> dict:
+        costs = self.result.costs if self.result is not None else {}
+        return {
+            "trip": self.number,
+            **self.fields,
+            "status": self.status,
+            "cached": self.cached,
+            "seconds": round(self.seconds, 1) if self.seconds is not None else None,
+            "flights_cost": costs.get("flights"),
+            "hotels_cost": costs.get("hotels"),
+            "total_cost": costs.get("total"),
+            "file": self.filename if self.status == DONE else None,
+            "error": self.error,
+        }
+
+
+class Batch:
+    def __init__(self, trips: list):
+        self.id = uuid.uuid4().hex
+        self.trips = [Trip(number, fields) for number, fields in enumerate(trips, start=1)]
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.finished_at = None
+        self._task = None
+        # the ZIP is built on the first download and kept, a finished batch doesn't change
+        self._zip = None
+        self._zip_lock = asyncio.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, CANCELLED)
+
+    def counts(self) -> dict:
+        counts = {status: 0 for status in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)}
+        for trip in self.trips:
+            counts[trip.status] += 1
+        return counts
+
+    def to_dict(self) -> dict:
+        return {
+            "batch_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "counts": self.counts(),
+            "trips": [trip.summary() for trip in self.trips],
+        }
+
+
+class BatchRunner:
+    """
+    Plans every trip of a batch with at most `concurrency` trips in flight.
+
+    run_fn is an async callable that takes the Trip and returns its Itinerary;
+    it may set trip.cached.
+    """
+
+    def __init__(self, run_fn, concurrency: int = BATCH_CONCURRENCY):
+        if concurrency < 1:
+            raise ValueError("Batch concurrency must be at least 1")
+        self.run_fn = run_fn
+        self.concurrency = concurrency
+        self.batches = {}
+
+    def submit(self, trips: list) -> Batch:
+        self._prune()
+        batch = Batch(trips)
+        self.batches[batch.id] = batch
+        batch._task = asyncio.create_task(self._run(batch))
+        return batch
+
+    def get(self, batch_id: str):
+        return self.batches.get(batch_id)
+
+    def cancel(self, batch: Batch) -> bool:
+        """Stops the trips that haven't finished. Trips already planned stay downloadable."""
+        if batch.finished:
+            return False
+        batch._task.cancel()
+        return True
+
+    def _prune(self):
+        # finished batches are kept for download as long as single jobs are
+        cutoff = time.time() - JOB_RESULT_TTL
+        expired = [batch_id for batch_id, batch in self.batches.items() if batch.finished and batch.finished_at < cutoff]
+        for batch_id in expired:
+            del self.batches[batch_id]
+
+    async def stop(self):
+        tasks = [batch._task for batch in self.batches.values() if not batch.finished]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run_trip(self, trip: Trip, limit: asyncio.Semaphore):
+        async with limit:
+            trip.status = RUNNING
+            start = time.perf_counter()
+            try:
+                trip.result = await self.run_fn(trip)
+                trip.status = DONE
+            except asyncio.CancelledError:
+                trip.status = CANCELLED
+                raise
+            except Exception as e:
+                logger.exception("Batch trip %d failed", trip.number)
+                trip.status = FAILED
+                trip.error = str(e)
+            finally:
+                trip.seconds = time.perf_counter() - start
+                BATCH_TRIPS.inc(outcome=trip.status)
+
+    async def _run(self, batch: Batch):
+        batch.status = RUNNING
+        limit = asyncio.Semaphore(self.concurrency)
+        try:
+            # a failed trip is recorded on the trip and doesn't stop the rest
+            await asyncio.gather(*(self._run_trip(trip, limit) for trip in batch.trips))
+            batch.status = DONE
+        except asyncio.CancelledError:
+            batch.status = CANCELLED
+            for trip in batch.trips:
+                if trip.status == QUEUED:
+                    trip.status = CANCELLED
+        finally:
+            batch.finished_at = time.time()
+            logger.info("Batch %s %s: %s", batch.id, batch.status, batch.counts())
+
+
+def _summary_csv(batch: Batch) -> str:
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=SUMMARY_COLUMNS)
+    writer.writeheader()
+    for trip in batch.trips:
+        writer.writerow(trip.summary())
+    return out.getvalue()
+
+
+def _build_zip(batch: Batch, pdfs: dict) -> bytes:
+    buffer = io.BytesIO()
+    # PDFs are already compressed, storing them saves time for almost no size
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("summary.csv", _summary_csv(batch), compress_type=zipfile.ZIP_DEFLATED)
+        for trip in batch.trips:
+            if trip.number in pdfs:
+                archive.writestr(trip.filename, pdfs[trip.number], compress_type=zipfile.ZIP_STORED)
+    return buffer.getvalue()
+
+
+async def render_zip(batch: Batch) -> bytes:
+    """
+    Renders every finished trip's PDF on the render pool and packs them with
+    summary.csv. Only the first download of a finished batch renders, later ones
+    (and downloads waiting on the first) get the same bytes.
+    """
+    async with batch._zip_lock:
+        if batch._zip is None:
+            done = [trip for trip in batch.trips if trip.status == DONE]
+            rendered = await asyncio.gather(*(renderer.render(trip.result, "pdf") for trip in done))
+            pdfs = {trip.number: data for trip, data in zip(done, rendered)}
+            batch._zip = await asyncio.to_thread(_build_zip, batch, pdfs)
+        return batch._zip
@@ -0,0 +1,123 @@
+"""
+Result cache for finished itineraries, keyed on the planning form fields.
+
+Lots of /plan submissions repeat the same trip, so the form fields are
+normalized (case, spacing, date and budget formats) into a key and the finished
+itinerary is kept for ITINERARY_CACHE_TTL seconds. Entries expire because flight
+and hotel prices go stale. The cache lives in memory by default; set
+ITINERARY_CACHE_PATH to keep it in a SQLite file that survives restarts and is
+shared by every uvicorn worker.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+
+from . import run_agents  # noqa: F401  (puts the travel framework on sys.path)
+
+# isort: split
+from caching import MemoryStore, SQLiteStore, iso_date
+
+ITINERARY_CACHE_TTL = int(os.getenv("ITINERARY_CACHE_TTL", "1800"))
+ITINERARY_CACHE_SIZE = int(os.getenv("ITINERARY_CACHE_SIZE", "256"))
+ITINERARY_CACHE_PATH = os.getenv("ITINERARY_CACHE_PATH", "")
+
+EMPTY_NOTES = {"", "none", "n/a", "na", "no", "nothing"}
+
+
+def _normalize_text(value) -> str:
+    text = unicodedata.normalize("NFKC", str(value)).casefold()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.strip(" .,;")
+
+
+def _normalize_date(value) -> str:
+    return iso_date(value) or _normalize_text(value)
+
+
+def _normalize_budget(value) -> str:
+    text = _normalize_text(value).replace("usd", "").replace("$", "").replace(",", "").strip()
+    try:
+        return f"{float(text):.2f}"
+    except ValueError:
+        return text
+
+
+def normalize_request(origin, destination, departure_date, nights, budget, notes) -> dict:
+    """Puts the planning form fields into a canonical form so equivalent trips compare equal."""
+    notes = _normalize_text(notes)
+    return {
+        "origin": _normalize_text(origin),
+        "destination": _normalize_text(destination),
+        "departure_date": _normalize_date(departure_date),
+        "nights": int(nights),
+        "budget": _normalize_budget(budget),
+        "notes": "" if notes in EMPTY_NOTES else notes,
+    }
+
+
+def request_key(origin, destination, departure_date, nights, budget, notes) -> str:
+    """Returns the cache key for a set of planning form fields."""
+    normalized = normalize_request(origin, destination, departure_date, nights, budget, notes)
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ItineraryCache:
+    """
+    TTL + LRU cache of finished itineraries with hit/miss counters.
+
+    The counters are per process; the entries are shared when a SQLite path is used.
+    """
+
+    def __init__(self, ttl: int = ITINERARY_CACHE_TTL, max_entries: int = ITINERARY_CACHE_SIZE, path: str = ITINERARY_CACHE_PATH):
+        self.ttl = ttl
+        if path:
+            self._store = SQLiteStore(path, "itineraries", max_entries)
+        else:
+            self._store = MemoryStore(max_entries)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        """Returns the cached itinerary for key, or None if it is missing or stale."""
+        with self._lock:
+            entry = self._store.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            created_at, value = entry
+            if time.time() - created_at > self.ttl:
+                self._store.delete(key)
+                self.expired += 1
+                self.misses += 1
+                return None
+            self.hits += 1
+            return value
+
+    def set(self, key: str, itinerary: str):
+        with self._lock:
+            self.evictions += self._store.set(key, time.time(), itinerary)
+
+    def clear(self):
+        with self._lock:
+            self._store.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "sqlite" if isinstance(self._store, SQLiteStore) else "memory",
+                "entries": len(self._store),
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,293 @@
+"""
+Background job scheduler for itinerary runs.
+
+POST /plan queues a job and returns its ID right away; the browser polls
+GET /jobs/{id} until the itinerary is ready. A fixed number of worker tasks pull
+jobs off a bounded queue, so the number of agent runs in flight is set by
+MAX_CONCURRENT_RUNS (our LLM and Amadeus quotas) rather than by however many
+threads the server happens to have free.
+
+A job nobody is waiting for any more is cancelled: when every client that asked
+for it has said it is leaving (DELETE /jobs/{id}), or when nobody has streamed
+or polled it for JOB_ABANDON_AFTER seconds. Its agent run stops and the slot
+goes to the next job in line.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import deque
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENT_RUNS = int(os.getenv("MAX_CONCURRENT_RUNS", os.getenv("AGENT_POOL_SIZE", "2")))
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", "20"))
+# finished jobs are forgotten after this many seconds
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "3600"))
+# an unfinished job with no event stream open and no poll for this many seconds is cancelled
+# (long enough for EventSource to reconnect and for the 3s polling fallback)
+JOB_ABANDON_AFTER = int(os.getenv("JOB_ABANDON_AFTER", "20"))
+ABANDON_CHECK_INTERVAL = 2
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+CANCELLED_JOBS = REGISTRY.counter("travel_cancelled_jobs_total", "Jobs cancelled because nobody was waiting for them, by reason and by whether they had started.")
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is already full."""
+
+
+class Job:
+    """A single itinerary request and, once it finishes, its result or error."""
+
+    def __init__(self, user_request: str, key: str = None):
+        self.id = uuid.uuid4().hex
+        self.user_request = user_request
+        # normalized request key from the backend cache, if the caller has one
+        self.key = key
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # progress events from the agent team, replayed to anyone who starts listening late
+        self.events = []
+        self._listeners = set()
+        # clients that submitted or joined this job and haven't left
+        self.clients = 1
+        self.last_seen = self.created_at
+        self.cancel_reason = None
+        self._task = None
+
+    def publish(self, event: dict):
+        """Records a progress event and hands it to everyone streaming this job."""
+        event = dict(event)
+        event["elapsed"] = round(time.time() - self.created_at, 3)
+        self.events.append(event)
+        for listener in self._listeners:
+            listener.put_nowait(event)
+
+    async def stream(self):
+        """Yields every event so far, then new ones as they happen, until the job finishes."""
+        # take the history and subscribe in one step so nothing is missed or sent twice
+        history = list(self.events)
+        listener = asyncio.Queue()
+        self._listeners.add(listener)
+        self.touch()
+        try:
+            for event in history:
+                yield event
+            while not self.finished:
+                yield await listener.get()
+            while not listener.empty():
+                yield listener.get_nowait()
+        finally:
+            self._listeners.discard(listener)
+            # the abandon timer starts when the last stream closes
+            self.touch()
+
+    def touch(self):
+        """Marks the job as still wanted by someone."""
+        self.last_seen = time.time()
+
+    @property
+    def watched(self) -> bool:
+        return bool(self._listeners) or time.time() - self.last_seen < JOB_ABANDON_AFTER
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    def to_dict(self) -> dict:
+        info = {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.error is not None:
+            info["error"] = self.error
+        return info
+
+
+class JobScheduler:
+    """
+    Runs queued jobs with at most max_concurrent in flight.
+
+    run_fn is an async callable that takes the Job and returns its Itinerary.
+    It can report progress with job.publish.
+    """
+
+    def __init__(self, run_fn, max_concurrent: int = MAX_CONCURRENT_RUNS, max_queue: int = MAX_QUEUED_JOBS):
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1")
+        self.run_fn = run_fn
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.jobs = {}
+        # unfinished jobs by request key, so identical submissions share one job
+        self._inflight = {}
+        self.deduplicated = 0
+        # how long recent successful runs took, for wait estimates
+        self._durations = deque(maxlen=50)
+        self._queue = None
+        self._workers = []
+        self._reaper = None
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.max_concurrent)]
+        self._reaper = asyncio.create_task(self._cancel_abandoned())
+
+    async def stop(self):
+        tasks = self._workers + [self._reaper]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._reaper = None
+
+    def submit(self, user_request: str, key: str = None) -> Job:
+        """
+        Queues a new job. Raises QueueFullError if max_queue jobs are already waiting.
+
+        If an unfinished job with the same key exists, that job is returned instead.
+        """
+        if self._queue is None:
+            raise RuntimeError("Job scheduler has not been started")
+        self._prune()
+        if key is not None and key in self._inflight:
+            return self.join(key)
+
+        job = Job(user_request, key)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError(f"{self.max_queue} jobs are already waiting")
+        self.jobs[job.id] = job
+        if key is not None:
+            self._inflight[key] = job
+        return job
+
+    def add_finished(self, user_request: str, result, key: str = None, **event) -> Job:
+        """Records a job whose result is already known (a cache hit) without queueing it."""
+        self._prune()
+        job = Job(user_request, key)
+        job.status = DONE
+        job.result = result
+        job.started_at = job.finished_at = time.time()
+        job.publish({"type": "status", "status": DONE, "error": None, **event})
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str):
+        return self.jobs.get(job_id)
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def running(self) -> int:
+        return sum(1 for job in self.jobs.values() if job.status == RUNNING)
+
+    def active(self) -> int:
+        """Jobs that are queued or running."""
+        return sum(1 for job in self.jobs.values() if not job.finished)
+
+    def join(self, key: str):
+        """Returns the unfinished job for key, counting the duplicate, or None if there isn't one."""
+        job = self._inflight.get(key)
+        if job is not None:
+            self.deduplicated += 1
+            job.clients += 1
+            job.touch()
+        return job
+
+    def leave(self, job: Job, reason: str = "client_left") -> bool:
+        """A client no longer wants the job. Cancels it once every client has left. Returns True if cancelled."""
+        job.clients -= 1
+        if job.clients > 0:
+            return False
+        return self.cancel(job, reason)
+
+    def cancel(self, job: Job, reason: str) -> bool:
+        """
+        Stops an unfinished job. A queued job is dropped from the line, a running one
+        has its agent run cancelled. Returns False if the job had already finished.
+        """
+        if job.finished or job.cancel_reason is not None:
+            return False
+        job.cancel_reason = reason
+        CANCELLED_JOBS.inc(reason=reason, stage=job.status)
+        logger.info("Cancelling %s job %s (%s)", job.status, job.id, reason)
+        if job.status == QUEUED:
+            # the worker that dequeues it will skip it
+            self._finish(job, CANCELLED, f"Job was cancelled ({reason})")
+        elif job._task is not None:
+            job._task.cancel()
+        return True
+
+    def average_run_seconds(self):
+        if not self._durations:
+            return None
+        return sum(self._durations) / len(self._durations)
+
+    def _finish(self, job: Job, status: str, error: str = None):
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        if self._inflight.get(job.key) is job:
+            del self._inflight[job.key]
+        job.publish({"type": "status", "status": job.status, "error": job.error})
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job = await self._queue.get()
+            if job.finished:
+                # cancelled while it was waiting in line
+                self._queue.task_done()
+                continue
+            job.status = RUNNING
+            job.started_at = time.time()
+            job.publish({"type": "status", "status": RUNNING})
+            # the run gets its own task so cancelling one job doesn't take the worker down with it
+            job._task = asyncio.ensure_future(self.run_fn(job))
+            try:
+                job.result = await job._task
+                self._finish(job, DONE)
+                self._durations.append(job.finished_at - job.started_at)
+            except asyncio.CancelledError:
+                if job.cancel_reason is None:
+                    # the scheduler itself is stopping
+                    self._finish(job, FAILED, "Job was cancelled")
+                    raise
+                self._finish(job, CANCELLED, f"Job was cancelled ({job.cancel_reason})")
+            except Exception as e:
+                logger.exception("Job %s failed", job.id)
+                self._finish(job, FAILED, str(e))
+            finally:
+                job._task = None
+                self._queue.task_done()
+
+    async def _cancel_abandoned(self):
+        while True:
+            await asyncio.sleep(ABANDON_CHECK_INTERVAL)
+            for job in list(self.jobs.values()):
+                if not job.finished and not job.watched:
+                    self.cancel(job, "disconnected")
+
+    def _prune(self):
+        # drop finished jobs nobody has picked up within JOB_RESULT_TTL
+        cutoff = time.time() - JOB_RESULT_TTL
+        expired = [job_id for job_id, job in self.jobs.items() if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
@@ -0,0 +1,189 @@
+"""
+In-process metrics served in the Prometheus text format at /metrics.
+
+Recording a value is a dict lookup, a bisect and an add under a small lock, so
+it is cheap enough to call on every manager turn and every Amadeus request. The
+travel tools report through the framework's instrumentation hooks, which
+record_framework_metric connects to this registry.
+"""
+import bisect
+import threading
+
+# seconds; agent steps run from well under a second (a hotel lookup) to many minutes (a whole trip)
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = [(name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for name, value in pairs]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def expose(self) -> list:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {_format_number(value)}")
+        return lines
+
+
+class Gauge:
+    """A value read at scrape time from a callable returning {label tuple: value} or a number."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, description: str, read):
+        self.name = name
+        self.description = description
+        self.read = read
+
+    def expose(self) -> list:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type}"]
+        values = self.read()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {_format_number(value)}")
+        return lines
+
+
+class CounterFunc(Gauge):
+    """A running total some other object keeps (a stats attribute), read at scrape time like a Gauge."""
+
+    type = "counter"
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [bucket counts..., sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def expose(self) -> list:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._values.items()}
+        for key, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, series):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', _format_number(float(bound))),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_number(float(series[-2]))}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def counter(self, name: str, description: str) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, description))
+
+    def histogram(self, name: str, description: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, description, buckets))
+
+    def gauge(self, name: str, description: str, read) -> Gauge:
+        gauge = Gauge(name, description, read)
+        self._metrics[name] = gauge
+        return gauge
+
+    def counter_func(self, name: str, description: str, read) -> CounterFunc:
+        counter = CounterFunc(name, description, read)
+        self._metrics[name] = counter
+        return counter
+
+    def expose(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram("travel_http_request_seconds", "Time to answer an HTTP request, by route and status.")
+JOB_SECONDS = REGISTRY.histogram("travel_job_seconds", "End-to-end time of an itinerary job from submission to finish.")
+MANAGER_TURN_SECONDS = REGISTRY.histogram("travel_manager_turn_seconds", "Time the manager LLM spent planning one turn.")
+DELEGATION_SECONDS = REGISTRY.histogram("travel_delegation_seconds", "Time a worker agent took to finish a delegated task.")
+AMADEUS_REQUEST_SECONDS = REGISTRY.histogram("travel_amadeus_request_seconds", "Time of one HTTP call to Amadeus from a travel tool.")
+RENDER_SECONDS = REGISTRY.histogram("travel_render_seconds", "Time to render a finished itinerary, by format.")
+LLM_CALL_SECONDS = REGISTRY.histogram("travel_llm_call_seconds", "Time of one LLM call.")
+LLM_TOKENS = REGISTRY.counter("travel_llm_tokens_total", "LLM tokens used, by prompt/completion and whether the count was reported or estimated.")
+RETRIES = REGISTRY.counter("travel_retries_total", "Retried steps, by component and reason.")
+JOBS = REGISTRY.counter("travel_jobs_total", "Finished itinerary jobs, by outcome.")
+HOTEL_CATALOG = REGISTRY.counter("travel_hotel_catalog_total", "Hotel listings read from the local hotel catalog, by result (hit, stale, miss, coalesced, refresh_error).")
+AMADEUS_RATE_LIMIT_WAIT_SECONDS = REGISTRY.histogram("travel_amadeus_rate_limit_wait_seconds", "Time an Amadeus call waited for a slot from the rate limiter.")
+AMADEUS_QUOTA_EXCEEDED = REGISTRY.counter("travel_amadeus_quota_exceeded_total", "Amadeus calls refused because the monthly quota was used up.")
+FLIGHT_CACHE = REGISTRY.counter("travel_flight_cache_total", "Flight searches answered by the flight-offer cache, by result (hit, stale, miss, coalesced, refresh_error).")
+
+# framework instrumentation names -> how to record them here
+_FRAMEWORK_METRICS = {
+    "amadeus_request_seconds": AMADEUS_REQUEST_SECONDS.observe,
+    "llm_call_seconds": LLM_CALL_SECONDS.observe,
+    "llm_tokens": LLM_TOKENS.inc,
+    "retries": RETRIES.inc,
+    "flight_cache": FLIGHT_CACHE.inc,
+    "hotel_catalog": HOTEL_CATALOG.inc,
+    "amadeus_rate_limit_wait_seconds": AMADEUS_RATE_LIMIT_WAIT_SECONDS.observe,
+    "amadeus_quota_exceeded": AMADEUS_QUOTA_EXCEEDED.inc,
+}
+
+
+def record_framework_metric(kind, name, value, labels):
+    """Observer for the travel framework's instrumentation hooks."""
+    record = _FRAMEWORK_METRICS.get(name)
+    if record is not None:
+        record(value, **labels)
+
+
+def record_agent_event(event: dict):
+    """Records the timings carried by the team's progress events."""
+    event_type = event.get("type")
+    if event_type in ("manager_turn", "final_answer"):
+        MANAGER_TURN_SECONDS.observe(event["seconds"], final=str(event_type == "final_answer").lower())
+    elif event_type == "delegation_result":
+        DELEGATION_SECONDS.observe(event["seconds"], worker=event["worker"])
+    elif event_type == "invalid_action":
+        # the manager gets another turn to correct itself
+        RETRIES.inc(component="manager", reason="invalid_action")
@@ -0,0 +1,176 @@
+"""
+Turns a finished Itinerary into a downloadable file.
+
+PDF building is CPU-bound, so SimpleDocTemplate.build runs in a process pool
+where it can't compete with the event loop, and the paragraph styles are built
+once per process instead of once per request. Clients that don't need a PDF can
+ask for HTML, Markdown or JSON, which skip PDF generation entirely.
+"""
+import asyncio
+import html
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+from .metrics import RENDER_SECONDS
+
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+# size of each piece of a streamed download
+CHUNK_SIZE = 64 * 1024
+
+
+def _build_body_style():
+    styles = getSampleStyleSheet()
+    body = styles["BodyText"]
+    body.fontName = "Helvetica"
+    body.fontSize = 10
+    body.leading = 14  # line spacing
+    body.encoding = "UTF-8"
+    return body
+
+
+# built once when the module loads, in the server and in every render process
+BODY_STYLE = _build_body_style()
+BLANK_LINE_HEIGHT = 0.2 * inch
+
+
+def build_pdf_bytes(itinerary_text: str) -> bytes:
+    """Builds the itinerary PDF. Runs inside the render process pool."""
+    buffer = BytesIO()
+
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=letter,
+        rightMargin=40,
+        leftMargin=40,
+        topMargin=40,
+        bottomMargin=40,
+    )
+
+    story = []
+
+    # Convert each line to a Paragraph (auto-wraps)
+    for line in itinerary_text.split("\n"):
+        if line.strip() == "":
+            story.append(Spacer(1, BLANK_LINE_HEIGHT))
+        else:
+            # paragraphs are parsed as markup, so stray '&' or '<' from the LLM must be escaped
+            story.append(Paragraph(escape(line), BODY_STYLE))
+
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def render_markdown(itinerary) -> str:
+    # fall back to the raw answer when the sections couldn't be picked out
+    if not (itinerary.flights or itinerary.hotels or itinerary.activities):
+        return itinerary.text + "\n"
+
+    lines = [f"# {itinerary.title or 'Travel Itinerary'}", ""]
+    for heading, items in (("Flights", itinerary.flights), ("Hotels", itinerary.hotels), ("Daily Activities", itinerary.activities)):
+        if items:
+            lines.append(f"## {heading}")
+            lines.extend(f"- {item}" for item in items)
+            lines.append("")
+    if itinerary.costs:
+        lines.append("## Costs")
+        for name, label in (("flights", "Flights"), ("hotels", "Hotels"), ("total", "Total")):
+            if name in itinerary.costs:
+                lines.append(f"- {label}: ${itinerary.costs[name]:,.2f}")
+        lines.append("")
+    if itinerary.notes:
+        lines.append("## Notes")
+        lines.extend(itinerary.notes)
+        lines.append("")
+    return "\n".join(lines)
+
+
+def render_html(itinerary) -> str:
+    title = html.escape(itinerary.title or "Travel Itinerary")
+    body = html.escape(itinerary.text)
+    return (
+        "<!doctype html>\n<html lang=\"en\">\n<head>\n<meta charset=\"utf-8\">\n"
+        f"<title>{title}</title>\n"
+        "<style>body { font-family: Helvetica, Arial, sans-serif; max-width: 800px; margin: 40px auto; }"
+        " pre { white-space: pre-wrap; font-family: inherit; font-size: 14px; line-height: 1.4; }</style>\n"
+        f"</head>\n<body>\n<pre>{body}</pre>\n</body>\n</html>\n"
+    )
+
+
+def render_json(itinerary) -> str:
+    return json.dumps(itinerary.to_dict(), indent=2)
+
+
+# format -> (media type, file extension)
+FORMATS = {
+    "pdf": ("application/pdf", "pdf"),
+    "html": ("text/html; charset=utf-8", "html"),
+    "md": ("text/markdown; charset=utf-8", "md"),
+    "json": ("application/json", "json"),
+}
+
+_TEXT_RENDERERS = {
+    "html": render_html,
+    "md": render_markdown,
+    "json": render_json,
+}
+
+_executor = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn rather than fork, the server process has agent threads running
+        _executor = ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+async def render(itinerary, output_format: str = "pdf") -> bytes:
+    """Renders the itinerary in the requested format. Raises ValueError for an unknown format."""
+    if output_format not in FORMATS:
+        raise ValueError(f"Unknown format '{output_format}', expected one of {', '.join(FORMATS)}")
+    start = time.perf_counter()
+    if output_format == "pdf":
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(_get_executor(), build_pdf_bytes, itinerary.to_text())
+    else:
+        data = _TEXT_RENDERERS[output_format](itinerary).encode("utf-8")
+    RENDER_SECONDS.observe(time.perf_counter() - start, format=output_format)
+    return data
+
+
+async def warm_up():
+    """Starts every render process and has it build a throwaway PDF, so the first real one isn't slow."""
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    try:
+        await asyncio.gather(*(loop.run_in_executor(executor, build_pdf_bytes, "warm-up") for _ in range(RENDER_WORKERS)))
+    except BrokenProcessPool:
+        # a process that failed to start breaks the whole pool, the next try gets a new one
+        shutdown()
+        raise
+
+
+def iter_chunks(data: bytes, chunk_size: int = CHUNK_SIZE):
+    """Yields the rendered file in pieces so large downloads are streamed."""
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        yield bytes(view[start:start + chunk_size])
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -1,46 +1,80 @@
-import subprocess
-import shlex
+import asyncio
+import json
 import os
-import re
+import subprocess
 import sys
 
+# the travel framework uses flat imports (from hotel_tool import HotelTool)
+FRAMEWORK_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Travel_agent_framework'))
+if FRAMEWORK_DIR not in sys.path:
+    sys.path.insert(0, FRAMEWORK_DIR)
+
+from itinerary import Itinerary  # noqa: E402
+
+# where the agent runs' debug output goes, rotated by size
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", os.path.join(os.path.dirname(__file__), "log.txt"))
 
-def run_multi_agent_and_get_itinerary(user_request: str, timeout: int = 5000) -> str:
+
+def run_multi_agent_and_get_itinerary(user_request: str, timeout: int = 5000) -> Itinerary:
     """
     Runs the multi-agent script as a subprocess, provides the user_request to its stdin,
-    captures stdout, and extracts the itinerary block.
-
+    and reads the structured itinerary back as JSON from its stdout.
 
-    Assumes `multi_agent_script.py` is in the repository root.
+    The script's own output goes straight to the rotating trace log, so nothing
+    but the result comes back through the pipe.
     """
-    script_path = os.path.join(os.path.dirname(__file__), '..', 'Travel_agent_framework', 'travel_multi_agent.py')
-    script_path = os.path.abspath(script_path)
+    # Run the script and provide the user_request as stdin plus newline
+    proc = subprocess.run(_script_command(), input=user_request + "\n", capture_output=True, text=True, encoding="utf-8", timeout=timeout)
+    return _read_itinerary(proc.returncode, proc.stdout, proc.stderr)
 
 
-    # Use python executable from current environment
-    cmd = [sys.executable, script_path]
+async def run_multi_agent_in_subprocess(user_request: str, timeout: int = 5000) -> Itinerary:
+    """
+    Same as run_multi_agent_and_get_itinerary, but awaitable. Cancelling it (or
+    hitting the timeout) kills the child so it stops using LLM and Amadeus quota.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *_script_command(),
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate((user_request + "\n").encode("utf-8")), timeout)
+    except BaseException:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    return _read_itinerary(proc.returncode, stdout.decode("utf-8"), stderr.decode("utf-8", errors="replace"))
 
 
-    # Run the script and provide the user_request as stdin plus newline
-    proc = subprocess.run(cmd, input=user_request + "\n", capture_output=True, text=True, timeout=timeout)
+def _script_command() -> list:
+    script_path = os.path.join(FRAMEWORK_DIR, 'travel_multi_agent.py')
+    # Use python executable from current environment
+    return [sys.executable, script_path, "--json", "--trace-log", TRACE_LOG_PATH]
 
 
-    if proc.returncode != 0:
+def _read_itinerary(returncode: int, stdout: str, stderr: str) -> Itinerary:
+    if returncode != 0:
         # include stderr for debugging
-        raise RuntimeError(f"Script failed (code={proc.returncode}): {proc.stderr}")
+        raise RuntimeError(f"Script failed (code={returncode}): {stderr}")
 
+    try:
+        itinerary = Itinerary.from_dict(json.loads(stdout))
+    except (json.JSONDecodeError, TypeError) as e:
+        raise RuntimeError(f"Script returned an unreadable itinerary ({e}): {stderr}")
 
-    stdout = proc.stdout
-    with open(r"C:\Users\Peter.Marriott\Documents\final-project-peter-griffin\backend\log.txt", "w") as fp:
-        fp.write(stdout)
+    if itinerary.error:
+        raise RuntimeError(itinerary.error)
+    return itinerary
 
-    # Extract itinerary starting at the marker if present
-    marker = '_________________________TRAVEL ITINERARY_________________________'
-    if marker in stdout:
-        itinerary = stdout.split(marker, 1)[1].strip()
-        # Prepend marker for clarity
-        return marker + "\n\n" + itinerary
 
-
-    # If marker not present, return full stdout
-    return stdout
\ No newline at end of file
+async def run_itinerary_in_pool(pool, user_request: str, timeout: int = 5000, on_event=None, revision: dict = None) -> Itinerary:
+    """
+    Runs the user_request on a warm team from the backend's AgentPool instead of
+    starting a new interpreter. Returns the same Itinerary as
+    run_multi_agent_and_get_itinerary. on_event receives the team's progress events,
+    and revision (see AgentPool.run) revises an earlier itinerary.
+    """
+    return await pool.run(user_request, timeout, on_event, revision)
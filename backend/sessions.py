@@ -0,0 +1,118 @@
+"""
+Planning sessions for refining an itinerary over a WebSocket.
+
+A session remembers the last trip it planned: the form fields and the finished
+Itinerary, including what every worker found. When the user edits the trip only
+the stages the edit affects are redone. A new budget re-runs the cost
+calculation, new notes only need the manager to rewrite the activities, and
+the earlier flight and hotel searches are handed back to the manager instead of
+being repeated. Changing where or when the trip happens redoes the searches.
+"""
+import asyncio
+import os
+import time
+import uuid
+
+from .cache import normalize_request
+from .metrics import REGISTRY
+
+SESSION_TTL = int(os.getenv("SESSION_TTL", "3600"))
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "200"))
+
+# planning stages (see travel_multi_agent.STAGE_WORKERS) each form field invalidates
+INVALIDATES = {
+    "origin": {"flights", "costs"},
+    "destination": {"flights", "hotels", "costs"},
+    "departure_date": {"flights", "hotels", "costs"},
+    "nights": {"flights", "hotels", "costs"},
+    "budget": {"costs"},
+    "notes": set(),
+}
+ALL_STAGES = {"flights", "hotels", "costs"}
+
+FULL = "full"
+INCREMENTAL = "incremental"
+UNCHANGED = "unchanged"
+# the same trip was planned recently somewhere else and came from the itinerary cache
+CACHED = "cached"
+
+SESSION_PLANS = REGISTRY.counter("travel_session_plans_total", "Plans made in refinement sessions, by mode (full, incremental, unchanged, cached).")
+
+
+class SessionLimitError(Exception):
+    """Raised when MAX_SESSIONS sessions are already open."""
+
+
+def changed_fields(old: dict, new: dict) -> list:
+    """The form fields that differ once both trips are normalized."""
+    old_normalized = normalize_request(**old)
+    new_normalized = normalize_request(**new)
+    return [field for field in INVALIDATES if old_normalized[field] != new_normalized[field]]
+
+
+def describe_changes(old: dict, new: dict, fields: list) -> str:
+    return "; ".join(f"{field} changed from '{old[field]}' to '{new[field]}'" for field in fields)
+
+
+class PlanningSession:
+    """The last trip planned in a session and what it found."""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.fields = None
+        self.itinerary = None
+        self.plans = 0
+        self.last_used = time.time()
+        # one plan at a time per session, an edit waits for the plan before it
+        self.lock = asyncio.Lock()
+
+    def plan_for(self, fields: dict):
+        """
+        Decides how to get from the session's last itinerary to one for fields.
+        Returns (mode, stages to redo, description of the change).
+        """
+        if self.itinerary is None or self.itinerary.error is not None:
+            return FULL, ALL_STAGES, ""
+        changed = changed_fields(self.fields, fields)
+        if not changed:
+            return UNCHANGED, set(), ""
+        stages = set().union(*(INVALIDATES[field] for field in changed))
+        if stages == ALL_STAGES:
+            # nothing worth keeping, a normal run has the simpler prompt
+            return FULL, ALL_STAGES, ""
+        return INCREMENTAL, stages, describe_changes(self.fields, fields, changed)
+
+    def remember(self, fields: dict, itinerary, mode: str):
+        self.fields = dict(fields)
+        self.itinerary = itinerary
+        self.plans += 1
+        self.last_used = time.time()
+        SESSION_PLANS.inc(mode=mode)
+
+
+class SessionStore:
+    def __init__(self, ttl: int = SESSION_TTL, max_sessions: int = MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.sessions = {}
+
+    def open(self, session_id: str = None) -> PlanningSession:
+        """Resumes session_id if it is still around, otherwise starts a new session."""
+        self._prune()
+        session = self.sessions.get(session_id) if session_id else None
+        if session is None:
+            if len(self.sessions) >= self.max_sessions:
+                raise SessionLimitError(f"{self.max_sessions} planning sessions are already open")
+            session = PlanningSession()
+            self.sessions[session.id] = session
+        session.last_used = time.time()
+        return session
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        expired = [session_id for session_id, session in self.sessions.items() if session.last_used < cutoff and not session.lock.locked()]
+        for session_id in expired:
+            del self.sessions[session_id]
+
+    def stats(self) -> dict:
+        return {"sessions": len(self.sessions), "ttl": self.ttl, "max_sessions": self.max_sessions}
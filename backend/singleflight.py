@@ -0,0 +1,64 @@
+"""
+Single-flight deduplication for agent runs.
+
+When the same trip is submitted several times within seconds (double clicks,
+retries after a slow response) only the first caller starts an agent run. Every
+other caller with the same key awaits that run and gets the same result, so
+bursts of identical requests cost one run of LLM and Amadeus quota.
+"""
+import asyncio
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Shares one in-flight call per key between every concurrent caller."""
+
+    def __init__(self):
+        self._calls = {}
+        self.started = 0
+        self.deduplicated = 0
+
+    async def do(self, key: str, fn):
+        """
+        Runs fn() (an async callable) unless a call for key is already in flight,
+        in which case it waits for that call instead.
+
+        A caller that is cancelled stops waiting without disturbing the others.
+        The run itself is only cancelled once every caller waiting on it has gone.
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._forget(key, call))
+            self.started += 1
+        else:
+            self.deduplicated += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # everyone waiting on this run gave up, stop it
+                call.task.cancel()
+
+    def _forget(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight(),
+            "started": self.started,
+            "deduplicated": self.deduplicated,
+        }
@@ -0,0 +1,126 @@
+"""
+Persistent store of finished itineraries and their rendered files.
+
+Jobs only live in memory for JOB_RESULT_TTL, so without this a user who lost
+their PDF had to pay for a whole new agent run. Every finished job is written to
+a SQLite file with the structured itinerary and its timings, and every file
+rendered from it is kept next to it. GET /itineraries/{id} then serves the file
+straight from the store, or renders a new format from the stored itinerary.
+
+Rendered files are dropped after ARTIFACT_RETENTION_DAYS since they can always
+be rebuilt, and whole itineraries after ITINERARY_RETENTION_DAYS. compact() does
+both and hands the freed pages back to the file system; the app runs it every
+ITINERARY_COMPACT_INTERVAL seconds.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+ITINERARY_STORE_PATH = os.getenv("ITINERARY_STORE_PATH", os.path.join(os.path.dirname(__file__), "itineraries.db"))
+ITINERARY_RETENTION_DAYS = float(os.getenv("ITINERARY_RETENTION_DAYS", "30"))
+ARTIFACT_RETENTION_DAYS = float(os.getenv("ARTIFACT_RETENTION_DAYS", "7"))
+ITINERARY_COMPACT_INTERVAL = int(os.getenv("ITINERARY_COMPACT_INTERVAL", "3600"))
+
+DAY = 24 * 60 * 60
+
+
+class ItineraryStore:
+    """SQLite table of finished itineraries plus a table of files rendered from them."""
+
+    def __init__(self, path: str = ITINERARY_STORE_PATH, retention_days: float = ITINERARY_RETENTION_DAYS, artifact_retention_days: float = ARTIFACT_RETENTION_DAYS):
+        self.path = path
+        self.retention_days = retention_days
+        self.artifact_retention_days = artifact_retention_days
+        # one writer at a time from this process, other processes wait on SQLite's own lock
+        self._lock = threading.Lock()
+        with self._connect() as db:
+            # must be set before the first table is created to take effect
+            db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS itineraries ("
+                "id TEXT PRIMARY KEY, request TEXT NOT NULL, request_key TEXT, itinerary TEXT NOT NULL, "
+                "cached INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, started_at REAL, finished_at REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS itineraries_finished_at ON itineraries (finished_at)")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS artifacts ("
+                "itinerary_id TEXT NOT NULL REFERENCES itineraries (id) ON DELETE CASCADE, format TEXT NOT NULL, "
+                "data BLOB NOT NULL, render_seconds REAL, created_at REAL NOT NULL, PRIMARY KEY (itinerary_id, format))"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS artifacts_created_at ON artifacts (created_at)")
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute("PRAGMA foreign_keys=ON")
+        return db
+
+    def save(self, job, itinerary, cached: bool = False):
+        """Stores a finished job's itinerary under the job's ID."""
+        with self._lock, self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO itineraries (id, request, request_key, itinerary, cached, created_at, started_at, finished_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.user_request, job.key, json.dumps(itinerary.to_dict()), int(cached), job.created_at, job.started_at, job.finished_at or time.time()),
+            )
+
+    def get(self, itinerary_id: str):
+        """Returns (itinerary dict, info dict) or None if the ID is unknown or was compacted away."""
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT itinerary, request, cached, created_at, started_at, finished_at FROM itineraries WHERE id = ?",
+                (itinerary_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            formats = [format for (format,) in db.execute("SELECT format FROM artifacts WHERE itinerary_id = ? ORDER BY format", (itinerary_id,))]
+        itinerary, request, cached, created_at, started_at, finished_at = row
+        info = {
+            "id": itinerary_id,
+            "request": request,
+            "cached": bool(cached),
+            "created_at": created_at,
+            "started_at": started_at,
+            "finished_at": finished_at,
+            "run_seconds": round(finished_at - started_at, 3) if started_at else None,
+            "rendered_formats": formats,
+            "expires_at": finished_at + self.retention_days * DAY,
+        }
+        return json.loads(itinerary), info
+
+    def get_artifact(self, itinerary_id: str, output_format: str):
+        with self._connect() as db:
+            row = db.execute("SELECT data FROM artifacts WHERE itinerary_id = ? AND format = ?", (itinerary_id, output_format)).fetchone()
+        return row[0] if row is not None else None
+
+    def save_artifact(self, itinerary_id: str, output_format: str, data: bytes, render_seconds: float = None):
+        with self._lock, self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO artifacts (itinerary_id, format, data, render_seconds, created_at) VALUES (?, ?, ?, ?, ?)",
+                (itinerary_id, output_format, sqlite3.Binary(data), render_seconds, time.time()),
+            )
+
+    def compact(self) -> dict:
+        """Deletes expired itineraries and rendered files, then gives the free pages back."""
+        now = time.time()
+        with self._lock, self._connect() as db:
+            artifacts = db.execute("DELETE FROM artifacts WHERE created_at < ?", (now - self.artifact_retention_days * DAY,)).rowcount
+            itineraries = db.execute("DELETE FROM itineraries WHERE finished_at < ?", (now - self.retention_days * DAY,)).rowcount
+        with self._lock, self._connect() as db:
+            db.execute("PRAGMA incremental_vacuum")
+            db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return {"itineraries": itineraries, "artifacts": artifacts}
+
+    def stats(self) -> dict:
+        with self._connect() as db:
+            itineraries = db.execute("SELECT COUNT(*) FROM itineraries").fetchone()[0]
+            artifacts, artifact_bytes = db.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM artifacts").fetchone()
+        return {
+            "itineraries": itineraries,
+            "artifacts": artifacts,
+            "artifact_bytes": artifact_bytes,
+            "retention_days": self.retention_days,
+            "artifact_retention_days": self.artifact_retention_days,
+        }
@@ -0,0 +1,112 @@
+"""
+Start-up warm-up and readiness.
+
+Building the agent teams (OpenAI adapters and the shared Amadeus token),
+starting the PDF render processes and loading the page template all happen when
+the server starts instead of on the first /plan. The stages run side by side in
+the background so the server can answer liveness checks meanwhile. A stage that
+fails is tried again with backoff until it works. /health/ready only reports
+ready once the stages trips need (the agent teams) are warm, and again reports
+not ready while the server shuts down, so a load balancer never sends trips to a
+cold or draining instance. The other stages just make their first use faster.
+"""
+import asyncio
+import logging
+import time
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+OK = "ok"
+FAILED = "failed"
+
+# a rough wait to suggest to clients while warming up
+WARMUP_RETRY_AFTER = 30
+# a failed stage is retried after this many seconds, doubling up to WARMUP_MAX_RETRY_DELAY
+WARMUP_RETRY_DELAY = 1
+WARMUP_MAX_RETRY_DELAY = 60
+
+
+class WarmUp:
+    """
+    Runs the named warm-up stages concurrently and tracks whether the server is ready.
+
+    required names the stages trips can't do without; the server is ready once
+    those are done, the rest keep retrying in the background.
+    """
+
+    def __init__(self, required=()):
+        self.required = set(required)
+        self.stages = {}
+        self.started_at = None
+        self.finished_at = None
+        self.draining = False
+        self._task = None
+        REGISTRY.gauge("travel_ready", "1 when the server has warmed up and is taking trips.", lambda: int(self.ready))
+        REGISTRY.gauge(
+            "travel_warmup_seconds",
+            "How long each warm-up stage took.",
+            lambda: {(("stage", name),): stage["seconds"] for name, stage in self.stages.items() if stage["seconds"] is not None},
+        )
+
+    @property
+    def ready(self) -> bool:
+        return (
+            not self.draining
+            and self.started_at is not None
+            and all(stage["status"] == OK for name, stage in self.stages.items() if name in self.required)
+        )
+
+    async def _run_stage(self, name: str, run):
+        stage = self.stages[name]
+        start = time.perf_counter()
+        delay = WARMUP_RETRY_DELAY
+        while True:
+            stage["attempts"] += 1
+            try:
+                await run()
+            except Exception as e:
+                # a token fetch or a process spawn can fail for a moment, don't stay cold until a restart
+                logger.exception("Warm-up stage %s failed, trying again in %ss", name, delay)
+                stage["status"] = FAILED
+                stage["error"] = str(e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, WARMUP_MAX_RETRY_DELAY)
+            else:
+                stage["status"] = OK
+                stage["error"] = None
+                stage["seconds"] = round(time.perf_counter() - start, 3)
+                return
+
+    async def _run(self, stages: dict):
+        await asyncio.gather(*(self._run_stage(name, run) for name, run in stages.items()))
+        self.finished_at = time.time()
+        logger.info("Warm-up finished in %.1fs: %s", self.finished_at - self.started_at, {name: stage["status"] for name, stage in self.stages.items()})
+
+    def start(self, **stages):
+        """Starts the stages (name=async callable, called again for every retry) in the background."""
+        self.started_at = time.time()
+        self.stages = {name: {"status": PENDING, "seconds": None, "error": None, "attempts": 0} for name in stages}
+        self._task = asyncio.create_task(self._run(stages))
+
+    async def wait(self):
+        if self._task is not None:
+            await self._task
+
+    async def stop(self):
+        """Marks the server as draining and stops an unfinished warm-up."""
+        self.draining = True
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "draining": self.draining,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "stages": self.stages,
+        }
@@ -0,0 +1,407 @@
+"""
+Local stand-in for the parts of the Amadeus API the travel tools use.
+
+Serves the OAuth token, flight-offers, hotels-by-city and hotel-offers routes
+from the recorded responses in benchmarks/fixtures/amadeus, adjusted to the
+query: airports, dates and fares of the flights, the city of the hotels and a
+price per hotel. Fares and prices are the same for every run with the same seed.
+Point the tools at it with
+
+    python benchmarks/amadeus_standin.py --port 8001 --latency lognormal:150,0.5 --error-rate 0.01 --rate-limit 40
+    AMADEUS_API_ENDPOINT=http://127.0.0.1:8001
+
+Every request can be slowed down, failed or rate limited:
+  --latency SPEC            delay for every route: 80 (fixed ms), uniform:20,80,
+                            normal:100,25 (mean, sd) or lognormal:100,0.5 (median ms, sigma)
+  --latency ROUTE=SPEC      delay for one route (oauth, flight-offers, hotels-by-city, hotel-offers)
+  --error-rate P            answer this share of requests with Amadeus's 500 error
+  --rate-limit N            allow N requests per second (bursts of N), answer the rest with 429
+  --handshake-ms MS         delay on every new connection, standing in for TCP and TLS set-up
+
+GET /__standin/stats returns the requests seen per route and status. Use
+start_standin() to run it inside a benchmark. Replace the fixture files with
+real responses (saved JSON bodies) to change what it serves.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "amadeus")
+
+ROUTES = {
+    "/v1/security/oauth2/token": "oauth",
+    "/v2/shopping/flight-offers": "flight-offers",
+    "/v1/reference-data/locations/hotels/by-city": "hotels-by-city",
+    "/v3/shopping/hotel-offers": "hotel-offers",
+}
+
+# the error bodies Amadeus sends
+RATE_LIMITED = {"errors": [{"status": 429, "code": 38194, "title": "Too many requests", "detail": "The network rate limit is exceeded, please try again later"}]}
+SERVER_ERROR = {"errors": [{"status": 500, "code": 141, "title": "SYSTEM ERROR HAS OCCURRED"}]}
+BAD_TOKEN = {"errors": [{"status": 401, "code": 38190, "title": "Invalid access token", "detail": "The access token provided in the Authorization header is invalid"}]}
+NOT_FOUND = {"errors": [{"status": 404, "code": 38196, "title": "Resource not found"}]}
+
+
+def parse_latency(spec: str):
+    """Turns a latency spec into a function taking a random.Random and returning seconds."""
+    name, _, args = spec.partition(":")
+    if not args:
+        milliseconds = float(name)
+        return lambda rnd: milliseconds / 1000
+    values = [float(value) for value in args.split(",")]
+    if name == "fixed":
+        return lambda rnd: values[0] / 1000
+    if name == "uniform":
+        return lambda rnd: rnd.uniform(values[0], values[1]) / 1000
+    if name == "normal":
+        return lambda rnd: max(0.0, rnd.gauss(values[0], values[1])) / 1000
+    if name == "lognormal":
+        # values are the median in ms and sigma, so "lognormal:100,0.5" is around 100ms with a long tail
+        return lambda rnd: rnd.lognormvariate(0, values[1]) * values[0] / 1000
+    raise ValueError(f"Unknown latency distribution {name!r}")
+
+
+class TokenBucket:
+    """Allows rate requests per second with bursts of up to burst requests."""
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+def _load(name):
+    with open(os.path.join(FIXTURES_DIR, name)) as f:
+        return json.load(f)
+
+
+def _stable_random(*parts) -> random.Random:
+    # the same hotel on the same dates gets the same price in every run
+    return random.Random(hashlib.sha256("|".join(str(part) for part in parts).encode()).hexdigest())
+
+
+def _shift(timestamp: str, days: int) -> str:
+    return (datetime.fromisoformat(timestamp) + timedelta(days=days)).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+class StandinState:
+    """Fixtures, fault settings and counters shared by every request handler."""
+
+    def __init__(self, latency=None, error_rate=0.0, rate_limit=None, handshake_ms=0.0, token_ttl=1799, seed=0):
+        self.latency = latency or {}
+        self.error_rate = error_rate
+        self.bucket = TokenBucket(rate_limit) if rate_limit else None
+        self.handshake_seconds = handshake_ms / 1000
+        self.token_ttl = token_ttl
+        self.random = random.Random(seed)
+        self.seed = seed
+        self.flight_offers = _load("flight_offers.json")
+        self.hotels_by_city = _load("hotels_by_city.json")
+        self.hotel_offers = _load("hotel_offers.json")
+        # by-city entries by the number after the chain and city codes, for the hotel details in offers
+        self.hotel_details = {hotel["hotelId"][5:]: hotel for hotel in self.hotels_by_city["data"]}
+        self.tokens = set()
+        self.connections = 0
+        self.requests = Counter()
+        self._lock = threading.Lock()
+
+    def delay(self, route) -> float:
+        sample = self.latency.get(route) or self.latency.get("*")
+        if sample is None:
+            return 0.0
+        with self._lock:
+            return sample(self.random)
+
+    def should_fail(self) -> bool:
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self.random.random() < self.error_rate
+
+    def issue_token(self) -> str:
+        with self._lock:
+            token = f"standin-{len(self.tokens) + 1}-{self.seed}"
+            self.tokens.add(token)
+        return token
+
+    def record(self, route, status):
+        with self._lock:
+            self.requests[(route, status)] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "connections": self.connections,
+                "requests": [{"route": route, "status": status, "count": n} for (route, status), n in sorted(self.requests.items())],
+            }
+
+    # --- responses built from the fixtures ---
+
+    def flights(self, query) -> dict:
+        origin = query.get("originLocationCode", "DEN").upper()
+        destination = query.get("destinationLocationCode", "MCO").upper()
+        departure = query.get("departureDate")
+        return_date = query.get("returnDate")
+        max_price = float(query.get("maxPrice") or "inf")
+        limit = int(query.get("max") or 250)
+
+        # fares move with the route and dates, the same way in every run with the same seed
+        fare_factor = _stable_random(self.seed, origin, destination, departure, return_date).uniform(0.75, 1.4)
+        offers = []
+        for recorded in self.flight_offers["data"]:
+            total = round(float(recorded["price"]["total"]) * fare_factor, 2)
+            if total > max_price:
+                continue
+            offer = json.loads(json.dumps(recorded))
+            offer["price"]["total"] = offer["price"]["grandTotal"] = f"{total:.2f}"
+            offer["price"]["base"] = f"{total * 0.86:.2f}"
+            itineraries = offer["itineraries"][:2 if return_date else 1]
+            offer["oneWay"] = not return_date
+            for itinerary, (start, end, date) in zip(itineraries, ((origin, destination, departure), (destination, origin, return_date))):
+                segments = itinerary["segments"]
+                recorded_day = datetime.fromisoformat(segments[0]["departure"]["at"]).date()
+                days = (datetime.fromisoformat(date).date() - recorded_day).days if date else 0
+                for segment in segments:
+                    segment["departure"]["at"] = _shift(segment["departure"]["at"], days)
+                    segment["arrival"]["at"] = _shift(segment["arrival"]["at"], days)
+                segments[0]["departure"]["iataCode"] = start
+                segments[-1]["arrival"]["iataCode"] = end
+            offer["itineraries"] = itineraries
+            offers.append(offer)
+            if len(offers) >= limit:
+                break
+        return {"meta": {"count": len(offers)}, "data": offers, "dictionaries": self.flight_offers.get("dictionaries", {})}
+
+    def hotels(self, query) -> dict:
+        city = query.get("cityCode", "PAR").upper()[:3]
+        ratings = {rating.strip() for rating in query.get("ratings", "").split(",") if rating.strip()}
+        hotels = []
+        for recorded in self.hotels_by_city["data"]:
+            if ratings and str(recorded.get("rating")) not in ratings:
+                continue
+            hotel = dict(recorded, iataCode=city, hotelId=recorded["hotelId"][:2] + city + recorded["hotelId"][5:])
+            hotels.append(hotel)
+        return {"data": hotels, "meta": {"count": len(hotels)}}
+
+    def offers(self, query, hotel_ids) -> dict:
+        check_in = query.get("checkInDate", "2025-11-20")
+        check_out = query.get("checkOutDate", "2025-11-21")
+        nights = max(1, (datetime.fromisoformat(check_out) - datetime.fromisoformat(check_in)).days)
+        low, _, high = query.get("priceRange", "").partition("-")
+        low = float(low) if low else 0.0
+        high = float(high) if high else float("inf")
+        template = self.hotel_offers["data"][0]
+
+        data = []
+        for hotel_id in hotel_ids:
+            rnd = _stable_random(self.seed, hotel_id, check_in, check_out)
+            # about a third of the hotels have nothing free on those dates
+            if rnd.random() < 0.3:
+                continue
+            nightly = round(rnd.uniform(70, 420), 2)
+            offers = []
+            for number, recorded in enumerate(rnd.sample(template["offers"], rnd.randint(1, 2))):
+                rate = round(nightly * (1 + 0.35 * number), 2)
+                if not low <= rate <= high:
+                    continue
+                offer = json.loads(json.dumps(recorded))
+                offer["id"] = hashlib.sha1(f"{hotel_id}{check_in}{number}".encode()).hexdigest()[:10].upper()
+                offer["checkInDate"], offer["checkOutDate"] = check_in, check_out
+                offer["guests"] = {"adults": int(query.get("adults", 1))}
+                total = round(rate * nights * 1.13, 2)
+                offer["price"]["base"] = f"{rate * nights:.2f}"
+                offer["price"]["total"] = f"{total:.2f}"
+                offer["price"]["currency"] = query.get("currency", "USD")
+                offer["price"]["variations"] = {"average": {"base": f"{rate:.2f}"}, "changes": [{"startDate": check_in, "endDate": check_out, "total": f"{total:.2f}"}]}
+                offers.append(offer)
+            if not offers:
+                continue
+            hotel = dict(template["hotel"], hotelId=hotel_id, chainCode=hotel_id[:2], cityCode=hotel_id[2:5])
+            details = self.hotel_details.get(hotel_id[5:])
+            if details is not None:
+                hotel.update(name=details["name"], latitude=details["geoCode"]["latitude"], longitude=details["geoCode"]["longitude"])
+            data.append({"type": "hotel-offers", "hotel": hotel, "available": True, "offers": offers})
+        return {"data": data}
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep the connection open, like the real API
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes, without this delayed ACKs add ~40ms per call
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        state = self.server.state
+        with state._lock:
+            state.connections += 1
+        if state.handshake_seconds:
+            time.sleep(state.handshake_seconds)
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, route, status, body, headers=None):
+        self.server.state.record(route, status)
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/vnd.amadeus+json" if status < 400 else "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _faults(self, route) -> bool:
+        """Applies the configured delay, rate limit and errors. Returns True if a response was sent."""
+        state = self.server.state
+        if state.bucket is not None and not state.bucket.take():
+            self._send(route, 429, RATE_LIMITED, {"Retry-After": "1"})
+            return True
+        time.sleep(state.delay(route))
+        if state.should_fail():
+            self._send(route, 500, SERVER_ERROR)
+            return True
+        return False
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        route = ROUTES.get(url.path)
+        if route != "oauth":
+            self._send("unknown", 404, NOT_FOUND)
+            return
+        if self._faults(route):
+            return
+        state = self.server.state
+        self._send(route, 200, {
+            "type": "amadeusOAuth2Token",
+            "username": "standin@example.com",
+            "application_name": "travel-standin",
+            "token_type": "Bearer",
+            "access_token": state.issue_token(),
+            "expires_in": state.token_ttl,
+            "state": "approved",
+            "scope": "",
+        })
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        state = self.server.state
+        if url.path == "/__standin/stats":
+            payload = json.dumps(state.stats()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        route = ROUTES.get(url.path)
+        if route is None or route == "oauth":
+            self._send("unknown", 404, NOT_FOUND)
+            return
+        token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        if token not in state.tokens:
+            self._send(route, 401, BAD_TOKEN)
+            return
+        if self._faults(route):
+            return
+
+        raw = parse_qs(url.query)
+        query = {name: values[-1] for name, values in raw.items()}
+        if route == "flight-offers":
+            self._send(route, 200, state.flights(query))
+        elif route == "hotels-by-city":
+            self._send(route, 200, state.hotels(query))
+        else:
+            # the tools repeat hotelIds once per ID, the API docs use one comma separated value
+            hotel_ids = [hotel_id for value in raw.get("hotelIds", []) for hotel_id in value.split(",") if hotel_id]
+            self._send(route, 200, state.offers(query, hotel_ids))
+
+
+def start_standin(host: str = "127.0.0.1", port: int = 0, **options) -> ThreadingHTTPServer:
+    """
+    Starts the stand-in on a background thread and returns the server. Its url
+    attribute is what AMADEUS_API_ENDPOINT should be set to. options are the
+    StandinState arguments; latency is a dict of route (or "*") to a spec.
+    """
+    latency = {route: parse_latency(spec) for route, spec in (options.pop("latency", None) or {}).items()}
+    server = ThreadingHTTPServer((host, port), StandinHandler)
+    server.daemon_threads = True
+    server.state = StandinState(latency=latency, **options)
+    server.url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, name="amadeus-standin", daemon=True).start()
+    return server
+
+
+def parse_latency_args(values) -> dict:
+    latency = {}
+    for value in values or []:
+        route, _, spec = value.rpartition("=")
+        if route and route not in ROUTES.values():
+            raise SystemExit(f"Unknown route {route!r}, expected one of {', '.join(ROUTES.values())}")
+        parse_latency(spec)
+        latency[route or "*"] = spec
+    return latency
+
+
+def add_standin_arguments(parser):
+    """The fault-injection options, shared with the benchmarks that start a stand-in."""
+    parser.add_argument("--latency", action="append", help="SPEC or ROUTE=SPEC, can be repeated")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=None, help="requests per second")
+    parser.add_argument("--handshake-ms", type=float, default=0.0)
+    parser.add_argument("--token-ttl", type=int, default=1799, help="expires_in of the issued tokens")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def standin_options(args) -> dict:
+    return {
+        "latency": parse_latency_args(args.latency),
+        "error_rate": args.error_rate,
+        "rate_limit": args.rate_limit,
+        "handshake_ms": args.handshake_ms,
+        "token_ttl": args.token_ttl,
+        "seed": args.seed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    add_standin_arguments(parser)
+    args = parser.parse_args()
+
+    server = start_standin(args.host, args.port, **standin_options(args))
+    print(f"Amadeus stand-in listening on {server.url}, set AMADEUS_API_ENDPOINT={server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
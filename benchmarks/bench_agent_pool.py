@@ -0,0 +1,86 @@
+"""
+Compares /plan latency for the cold subprocess runner against the warm agent pool.
+
+Both modes run the full multi-agent team, so this uses real OpenAI and Amadeus
+quota. Keep --requests small.
+
+    python benchmarks/bench_agent_pool.py --requests 3 --pool-size 2
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from backend.agent_pool import AgentPool  # noqa: E402
+from backend.run_agents import run_itinerary_in_pool, run_multi_agent_and_get_itinerary  # noqa: E402
+
+DEFAULT_REQUEST = (
+    "I want to leave Denver and go to Rome, Italy for 5 nights starting 2026-06-03. "
+    "I don't want to spend more than 4000 on flights and hotels. EXTRA NOTES: None"
+)
+
+
+def summarize(label, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(round(0.95 * (len(latencies) - 1))))]
+    print(
+        f"{label:<18} n={len(latencies):<3} "
+        f"mean={statistics.mean(latencies):8.2f}s  "
+        f"p50={statistics.median(latencies):8.2f}s  "
+        f"p95={p95:8.2f}s  "
+        f"min={latencies[0]:8.2f}s  max={latencies[-1]:8.2f}s"
+    )
+
+
+async def bench_cold(user_request, n, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await asyncio.to_thread(run_multi_agent_and_get_itinerary, user_request, 5000)
+            return time.perf_counter() - start
+
+    return await asyncio.gather(*(one() for _ in range(n)))
+
+
+async def bench_warm(user_request, n, pool_size):
+    pool = AgentPool(pool_size)
+    start = time.perf_counter()
+    await pool.start()
+    print(f"pool warm-up ({pool_size} teams): {time.perf_counter() - start:.2f}s (not counted below)")
+
+    async def one():
+        start = time.perf_counter()
+        await run_itinerary_in_pool(pool, user_request, 5000)
+        return time.perf_counter() - start
+
+    try:
+        return await asyncio.gather(*(one() for _ in range(n)))
+    finally:
+        pool.stop()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3, help="requests to run in each mode")
+    parser.add_argument("--pool-size", type=int, default=2, help="warm teams in the pool (also the cold concurrency)")
+    parser.add_argument("--request", default=DEFAULT_REQUEST, help="user request to plan")
+    parser.add_argument("--skip-cold", action="store_true")
+    parser.add_argument("--skip-warm", action="store_true")
+    args = parser.parse_args()
+
+    if not args.skip_cold:
+        summarize("cold subprocess", await bench_cold(args.request, args.requests, args.pool_size))
+    if not args.skip_warm:
+        summarize("warm pool", await bench_warm(args.request, args.requests, args.pool_size))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
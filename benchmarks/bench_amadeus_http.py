@@ -0,0 +1,107 @@
+"""
+Per-call latency of Amadeus-style GETs with a new connection per call (bare
+requests.get, how the tools used to call Amadeus) against the pooled keep-alive
+clients in amadeus_http.
+
+Runs against the local Amadeus stand-in (amadeus_standin.py), so no Amadeus
+quota is used. Every new connection waits --handshake-ms before it is served,
+which stands in for the TCP and TLS handshakes to api.amadeus.com, and every
+request takes --server-ms.
+
+    python benchmarks/bench_amadeus_http.py --calls 200 --concurrency 8 --handshake-ms 60
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+FRAMEWORK_DIR = os.path.join(ROOT_DIR, "Travel_agent_framework")
+if FRAMEWORK_DIR not in sys.path:
+    sys.path.insert(0, FRAMEWORK_DIR)
+
+# this measures connection reuse, so the Amadeus rate limiter stays out of the way
+os.environ["AMADEUS_RATE_LIMIT"] = "0"
+
+import amadeus_http  # noqa: E402
+from amadeus_auth import TokenManager  # noqa: E402
+from amadeus_standin import start_standin  # noqa: E402
+
+PARAMS = {"originLocationCode": "DEN", "destinationLocationCode": "MCO", "departureDate": "2026-06-03", "adults": 1}
+
+
+def summarize(label, latencies, wall, connections):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(round(0.95 * (len(latencies) - 1))))]
+    print(
+        f"{label:<22} n={len(latencies):<4} "
+        f"mean={statistics.mean(latencies) * 1000:7.1f}ms  "
+        f"p50={statistics.median(latencies) * 1000:7.1f}ms  "
+        f"p95={p95 * 1000:7.1f}ms  "
+        f"wall={wall:6.2f}s  connections={connections}"
+    )
+
+
+def bench_threads(call, url, n, concurrency):
+    def one(_):
+        start = time.perf_counter()
+        call(url).raise_for_status()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(one, range(n)))
+    return latencies, time.perf_counter() - start
+
+
+async def bench_async(url, auth, n, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            (await amadeus_http.aget(url, PARAMS, auth)).raise_for_status()
+            return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(one() for _ in range(n)))
+    wall = time.perf_counter() - start
+    await amadeus_http.aclose()
+    return latencies, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--handshake-ms", type=float, default=60, help="delay on every new connection")
+    parser.add_argument("--server-ms", type=float, default=20, help="delay on every request")
+    args = parser.parse_args()
+
+    server = start_standin(latency={"*": str(args.server_ms)}, handshake_ms=args.handshake_ms)
+    url = amadeus_http.api_url(server.url, "/v2/shopping/flight-offers")
+    auth = TokenManager(server.url, "bench", "bench")
+    headers = {"Authorization": "Bearer " + auth.get_token()}
+    print(f"{args.calls} calls, {args.concurrency} at a time, handshake {args.handshake_ms}ms, server {args.server_ms}ms, pool size {amadeus_http.POOL_SIZE}")
+
+    runs = [
+        ("new connection/call", lambda: bench_threads(lambda u: requests.get(u, params=PARAMS, headers=headers, timeout=30), url, args.calls, args.concurrency)),
+        ("pooled session", lambda: bench_threads(lambda u: amadeus_http.get(u, PARAMS, auth), url, args.calls, args.concurrency)),
+        ("pooled async client", lambda: asyncio.run(bench_async(url, auth, args.calls, args.concurrency))),
+    ]
+    for label, run in runs:
+        before = server.state.connections
+        latencies, wall = run()
+        summarize(label, latencies, wall, server.state.connections - before)
+
+    amadeus_http.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Throughput and tail latency of FlightTool and HotelTool calls, run offline
+against the local Amadeus stand-in (amadeus_standin.py).
+
+Each call is a tool invocation the way an agent makes it, a JSON expression
+through ause() (one event loop) or use() (a thread pool). The searches cycle
+through a fixed list of routes, cities and dates, so with the same --seed every
+run sends the same requests and the stand-in answers them the same way.
+
+    python benchmarks/bench_travel_tools.py --calls 200 --concurrency 16 --latency lognormal:120,0.6
+    python benchmarks/bench_travel_tools.py --mode threads --cold --error-rate 0.02 --rate-limit 50
+
+--cold turns the flight cache off so every flight search reaches the stand-in.
+The hotel catalog always starts empty (a temporary file), so the first search
+for each city fetches its listing. Pass --endpoint to use a stand-in (or the
+Amadeus test environment) that is already running instead of starting one.
+
+The tools keep to AMADEUS_RATE_LIMIT requests per second, set it in the
+environment to see how they cope with the stand-in's --rate-limit.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+FRAMEWORK_DIR = os.path.join(ROOT_DIR, "Travel_agent_framework")
+if FRAMEWORK_DIR not in sys.path:
+    sys.path.insert(0, FRAMEWORK_DIR)
+
+from amadeus_standin import add_standin_arguments, standin_options, start_standin  # noqa: E402
+
+ROUTES = [("DEN", "MCO"), ("BOS", "LAX"), ("JFK", "CDG"), ("SFO", "NRT"), ("ORD", "FCO"), ("SEA", "ANC")]
+CITIES = ["PAR", "ROM", "NYC", "LON", "TYO", "BCN"]
+DATES = [("2026-06-03", "2026-06-08"), ("2026-07-14", "2026-07-21"), ("2026-09-01", "2026-09-04")]
+
+
+def workload(n, hotel_share):
+    """The tool calls to make, in order: (tool name, expression)."""
+    calls = []
+    hotel_every = round(1 / hotel_share) if hotel_share else 0
+    for i in range(n):
+        start, end = DATES[i % len(DATES)]
+        if hotel_every and i % hotel_every == 0:
+            city = CITIES[(i // hotel_every) % len(CITIES)]
+            expression = {"cityCode": city, "ratings": "3,4,5", "adults": "2", "checkInDate": start, "checkOutDate": end, "priceRange": "50-600"}
+            calls.append(("hotel", json.dumps(expression)))
+        else:
+            origin, destination = ROUTES[i % len(ROUTES)]
+            expression = {"Origin": origin, "Destination": destination, "Departure": start, "Return": end, "Max_Price": "900"}
+            calls.append(("flight", json.dumps(expression)))
+    return calls
+
+
+def percentile(latencies, p):
+    return latencies[min(len(latencies) - 1, int(round(p * (len(latencies) - 1))))]
+
+
+def summarize(label, results, wall):
+    print(f"\n{label}: {len(results)} calls in {wall:.2f}s, {len(results) / wall:.1f} calls/s")
+    for tool in ("flight", "hotel"):
+        latencies = sorted(latency for name, latency, _ in results if name == tool)
+        if not latencies:
+            continue
+        failed = sum(1 for name, _, ok in results if name == tool and not ok)
+        print(
+            f"  {tool:<7} n={len(latencies):<4} "
+            f"p50={statistics.median(latencies) * 1000:8.1f}ms  "
+            f"p95={percentile(latencies, 0.95) * 1000:8.1f}ms  "
+            f"p99={percentile(latencies, 0.99) * 1000:8.1f}ms  "
+            f"max={latencies[-1] * 1000:8.1f}ms  failed={failed}"
+        )
+
+
+def succeeded(output) -> bool:
+    return isinstance(output, str) and not output.startswith("API request failed")
+
+
+async def run_async(tools, calls, concurrency):
+    import amadeus_http
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(name, expression):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                ok = succeeded(await tools[name].ause(expression))
+            except Exception:
+                ok = False
+            return name, time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(name, expression) for name, expression in calls))
+    wall = time.perf_counter() - start
+    await amadeus_http.aclose()
+    return results, wall
+
+
+def run_threads(tools, calls, concurrency):
+    def one(call):
+        name, expression = call
+        start = time.perf_counter()
+        try:
+            ok = succeeded(tools[name].use(expression))
+        except Exception:
+            ok = False
+        return name, time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(one, calls))
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16, help="tool calls in flight at once")
+    parser.add_argument("--mode", choices=["async", "threads"], default="async")
+    parser.add_argument("--hotel-share", type=float, default=0.25, help="share of the calls that are hotel searches")
+    parser.add_argument("--cold", action="store_true", help="turn the flight cache off")
+    parser.add_argument("--endpoint", help="use this running server instead of starting a stand-in")
+    add_standin_arguments(parser)
+    args = parser.parse_args()
+    # failed chunks are counted below, the tools' warnings about each one would bury the report
+    logging.basicConfig(level=logging.ERROR)
+
+    server = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        server = start_standin(**standin_options(args))
+        endpoint = server.url
+
+    # the tools read these when they are imported
+    os.environ["AMADEUS_API_ENDPOINT"] = endpoint
+    os.environ.setdefault("AMADEUS_KEY", "standin")
+    os.environ.setdefault("AMADEUS_SECRET", "standin")
+    os.environ["HOTEL_CATALOG_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench-catalog-"), "hotel_catalog.db")
+
+    import amadeus_http
+    from amadeus_limiter import get_rate_limiter
+    from flight_cache import FlightCache
+    from flight_tool import FlightTool
+    from hotel_tool import HotelTool
+
+    tools = {"flight": FlightTool(), "hotel": HotelTool()}
+    if args.cold:
+        tools["flight"].cache = FlightCache(ttl=0, stale_ttl=0, max_entries=0, path="")
+
+    calls = workload(args.calls, args.hotel_share)
+    print(
+        f"{len(calls)} tool calls ({args.mode}), {args.concurrency} at a time against {endpoint}, "
+        f"flight cache {'off' if args.cold else 'on'}, pool size {amadeus_http.POOL_SIZE}"
+    )
+    if args.mode == "async":
+        results, wall = asyncio.run(run_async(tools, calls, args.concurrency))
+    else:
+        results, wall = run_threads(tools, calls, args.concurrency)
+    summarize(args.mode, results, wall)
+
+    print(f"\nflight cache: {tools['flight'].cache.stats()}")
+    print(f"hotel catalog: {tools['hotel'].catalog.stats()}")
+    print(f"rate limiter: {get_rate_limiter().stats()}")
+    if server is not None:
+        stats = server.state.stats()
+        print(f"stand-in: {stats['connections']} connections")
+        for row in stats["requests"]:
+            print(f"  {row['route']:<15} {row['status']}  {row['count']}")
+
+    amadeus_http.close()
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
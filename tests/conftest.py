@@ -0,0 +1,9 @@
+import os
+import sys
+
+# the backend is imported as a package from the repo root, the travel framework uses flat imports
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+FRAMEWORK_DIR = os.path.join(ROOT_DIR, "Travel_agent_framework")
+for path in (ROOT_DIR, FRAMEWORK_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from backend.admission import AdmissionController, Rejected
+
+
+class Scheduler:
+    max_concurrent = 2
+
+    def __init__(self, active=0, queued=0):
+        self._active = active
+        self._queued = queued
+
+    def active(self):
+        return self._active
+
+    def queue_depth(self):
+        return self._queued
+
+    def running(self):
+        return self._active
+
+    def average_run_seconds(self):
+        return 60
+
+
+class Batch:
+    finished = False
+
+
+def test_client_limit_counts_batches_and_session_plans():
+    async def scenario():
+        admission = AdmissionController(Scheduler(), max_per_client=2, max_active=10, shed_queue_depth=10)
+        batch = Batch()
+        admission.track("alice", batch)
+        plan = asyncio.create_task(asyncio.sleep(10))
+        admission.track("alice", plan)
+        with pytest.raises(Rejected) as rejected:
+            admission.admit("alice")
+        assert rejected.value.status_code == 429
+        admission.admit("bob")
+
+        # a finished batch or session plan frees the slot
+        plan.cancel()
+        await asyncio.gather(plan, return_exceptions=True)
+        admission.admit("alice")
+        batch.finished = True
+        assert admission.stats()["active_clients"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_outside_runs_count_against_the_overall_limit():
+    admission = AdmissionController(Scheduler(active=1), max_per_client=5, max_active=2, shed_queue_depth=10)
+    admission.admit("alice")
+    with admission.outside_run():
+        assert admission.active() == 2
+        with pytest.raises(Rejected) as rejected:
+            admission.admit("alice")
+        assert rejected.value.status_code == 503
+    assert admission.outside_runs == 0
+    admission.admit("alice")
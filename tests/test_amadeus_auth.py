@@ -0,0 +1,59 @@
+import asyncio
+import threading
+import time
+
+import amadeus_auth
+from amadeus_auth import EXPIRY_MARGIN, REFRESH_AHEAD, TokenManager
+
+
+def manager_with_fake_fetch(expires_in=1799):
+    manager = TokenManager("standin", "key", "secret")
+    fetched = threading.Event()
+
+    def fetch():
+        manager.fetches += 1
+        manager._current = (f"token-{manager.fetches}", time.monotonic() + expires_in)
+        fetched.set()
+
+    manager._fetch = fetch
+    return manager, fetched
+
+
+def test_concurrent_callers_share_one_fetch():
+    manager, _ = manager_with_fake_fetch()
+    threads = [threading.Thread(target=manager.get_token) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert manager.fetches == 1
+    assert manager.get_token() == "token-1"
+
+
+def test_async_token_near_expiry_is_returned_inline(monkeypatch):
+    manager, fetched = manager_with_fake_fetch()
+    manager._current = ("old", time.monotonic() + REFRESH_AHEAD - 10)
+
+    async def no_thread(*args):
+        raise AssertionError("a usable token must not leave the event loop")
+
+    monkeypatch.setattr(amadeus_auth.asyncio, "to_thread", no_thread)
+    assert asyncio.run(manager.aget_token()) == "old"
+    # the refresh runs on its own thread
+    assert fetched.wait(1)
+    assert manager._current[0] == "token-1"
+
+
+def test_async_expired_token_waits_for_a_fetch():
+    manager, _ = manager_with_fake_fetch()
+    manager._current = ("old", time.monotonic() + EXPIRY_MARGIN - 1)
+    assert asyncio.run(manager.aget_token()) == "token-1"
+
+
+def test_invalidate_only_drops_the_rejected_token():
+    manager, _ = manager_with_fake_fetch()
+    manager.get_token()
+    manager.invalidate("someone-elses-token")
+    assert manager.get_token() == "token-1"
+    manager.invalidate("token-1")
+    assert manager.get_token() == "token-2"
@@ -0,0 +1,81 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import amadeus_limiter
+from amadeus_limiter import AmadeusQuotaExceeded, RateLimiter, retry_delay
+from conftest import FRAMEWORK_DIR
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(amadeus_limiter.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_burst_is_free_then_calls_are_spaced_at_the_rate(clock):
+    limiter = RateLimiter(rate=10, burst=2, monthly_quota=0, path="")
+    assert [limiter.reserve() for _ in range(2)] == [0.0, 0.0]
+    # callers queue up behind each other, one slot every 1/rate seconds
+    assert [round(limiter.reserve(), 3) for _ in range(3)] == [0.1, 0.2, 0.3]
+    clock[0] += 1
+    assert limiter.reserve() == 0.0
+    stats = limiter.stats()
+    assert (stats["calls"], stats["waits"], stats["waited_seconds"]) == (6, 3, 0.6)
+
+
+def test_back_off_holds_every_caller_without_stacking(clock):
+    limiter = RateLimiter(rate=10, burst=10, monthly_quota=0, path="")
+    limiter.back_off(2)
+    limiter.back_off(2)
+    assert round(limiter.reserve(), 3) == 2.1
+    assert round(limiter.reserve(), 3) == 2.2
+    assert limiter.stats()["backoffs"] == 2
+
+
+def test_zero_rate_never_waits(clock):
+    limiter = RateLimiter(rate=0, burst=0, monthly_quota=0, path="")
+    limiter.back_off(5)
+    assert all(limiter.reserve() == 0.0 for _ in range(100))
+
+
+@pytest.mark.parametrize("on_disk", [False, True])
+def test_monthly_quota(tmp_path, on_disk):
+    path = str(tmp_path / "usage.db") if on_disk else ""
+    limiter = RateLimiter(rate=0, burst=0, monthly_quota=3, path=path)
+    for _ in range(3):
+        limiter.reserve()
+    with pytest.raises(AmadeusQuotaExceeded):
+        limiter.reserve()
+    assert limiter.used_this_month() == 3
+    if on_disk:
+        # the count is shared through the file
+        with pytest.raises(AmadeusQuotaExceeded):
+            RateLimiter(rate=0, burst=0, monthly_quota=3, path=path).reserve()
+
+
+def test_retry_delay(monkeypatch):
+    monkeypatch.setattr(amadeus_limiter, "AMADEUS_MAX_RETRIES", 3)
+    monkeypatch.setattr(amadeus_limiter, "AMADEUS_RETRY_BASE_DELAY", 0.5)
+    monkeypatch.setattr(amadeus_limiter, "AMADEUS_RETRY_MAX_DELAY", 8)
+    assert retry_delay(400, None, 0) is None
+    assert retry_delay(503, None, 3) is None
+    assert retry_delay(429, "2", 0) == 2.0
+    assert retry_delay(429, "120", 0) == 8
+    for attempt, backoff in ((0, 0.5), (1, 1.0), (2, 2.0)):
+        # half fixed, half random
+        assert backoff / 2 <= retry_delay(500, "soon", attempt) <= backoff
+
+
+def test_empty_burst_setting_defaults_to_the_rate():
+    # a fresh interpreter, since the settings are read when the module is imported
+    env = dict(os.environ, AMADEUS_RATE_LIMIT="7", AMADEUS_RATE_BURST="")
+    result = subprocess.run(
+        [sys.executable, "-c", "import amadeus_limiter; print(amadeus_limiter.AMADEUS_RATE_BURST)"],
+        cwd=FRAMEWORK_DIR, env=env, capture_output=True, text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "7.0"
@@ -0,0 +1,48 @@
+import asyncio
+import io
+import zipfile
+
+import pytest
+
+from backend import batch as batch_module
+from backend.batch import Batch, BatchError, parse_trips, render_zip
+from backend.jobs import DONE, FAILED
+from itinerary import Itinerary
+
+
+def test_parse_trips_reads_csv_and_fills_defaults():
+    trips = parse_trips(b"Departure_Date , Destination\n2026-06-01, Paris\n\n2026-07-01,\n", "trips.csv")
+    assert [trip["destination"] for trip in trips] == ["Paris", "Rome, Italy"]
+    assert trips[0]["nights"] == 7 and trips[0]["budget"] == "4000"
+
+
+def test_parse_trips_reads_json_and_reports_the_bad_trip():
+    assert parse_trips(b'{"trips": [{"departure_date": "2026-06-01", "nights": "3"}]}')[0]["nights"] == 3
+    with pytest.raises(BatchError, match="Trip 2: nights"):
+        parse_trips(b'[{"departure_date": "2026-06-01"}, {"departure_date": "2026-06-02", "nights": "a week"}]')
+
+
+def test_zip_is_rendered_once(monkeypatch):
+    renders = []
+
+    async def render(itinerary, file_format):
+        renders.append(itinerary.text)
+        await asyncio.sleep(0.01)
+        return b"%PDF " + itinerary.text.encode()
+
+    monkeypatch.setattr(batch_module.renderer, "render", render)
+    batch = Batch([{"destination": "Paris"}, {"destination": "Rome"}])
+    batch.trips[0].status, batch.trips[0].result = DONE, Itinerary("paris", costs={"total": 900.0})
+    batch.trips[1].status, batch.trips[1].error = FAILED, "no flights"
+    batch.status = DONE
+
+    async def downloads():
+        first = await asyncio.gather(render_zip(batch), render_zip(batch))
+        return first + [await render_zip(batch)]
+
+    data = asyncio.run(downloads())
+    assert renders == ["paris"]
+    assert data[0] == data[1] == data[2]
+    with zipfile.ZipFile(io.BytesIO(data[0])) as archive:
+        assert archive.namelist() == ["summary.csv", "itinerary-001-paris.pdf"]
+        assert archive.read("itinerary-001-paris.pdf") == b"%PDF paris"
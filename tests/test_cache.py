@@ -0,0 +1,45 @@
+import time
+
+from backend.cache import ItineraryCache, normalize_request, request_key
+
+TRIP = ("DEN", "Paris", "2026-06-03", 5, "2000", "museums")
+
+
+def test_equivalent_forms_share_a_key():
+    assert request_key(*TRIP) == request_key("  den ", "PARIS.", "06/03/2026", "5", "$2,000.00", "Museums ")
+    assert request_key("DEN", "Paris", "2026-06-03", 5, "USD 2000", "") == request_key("DEN", "Paris", "2026/06/03", 5, "2000", "n/a")
+
+
+def test_different_trips_get_different_keys():
+    assert request_key(*TRIP) != request_key("DEN", "Rome", "2026-06-03", 5, "2000", "museums")
+    assert request_key(*TRIP) != request_key("DEN", "Paris", "2026-06-04", 5, "2000", "museums")
+    assert request_key(*TRIP) != request_key("DEN", "Paris", "2026-06-03", 6, "2000", "museums")
+
+
+def test_normalize_request_keeps_unreadable_values():
+    normalized = normalize_request("DEN", "Paris", "next friday", 3, "cheap", "None")
+    assert normalized["departure_date"] == "next friday"
+    assert normalized["budget"] == "cheap"
+    assert normalized["notes"] == ""
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    cache = ItineraryCache(ttl=60, max_entries=4, path="")
+    cache.set("trip", "itinerary")
+    assert cache.get("trip") == "itinerary"
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.get("trip") is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    for path in ("", str(tmp_path / "cache.db")):
+        cache = ItineraryCache(ttl=60, max_entries=2, path=path)
+        cache.set("a", "A")
+        cache.set("b", "B")
+        cache.get("a")
+        cache.set("c", "C")
+        assert cache.get("b") is None
+        assert cache.get("a") == "A" and cache.get("c") == "C"
+        assert cache.stats()["evictions"] == 1
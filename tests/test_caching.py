@@ -0,0 +1,89 @@
+import asyncio
+import threading
+
+from caching import MemoryStore, SQLiteStore, StaleWhileRevalidate, iso_date
+
+
+def test_iso_date_reads_the_usual_formats():
+    assert iso_date(" 06/03/2026") == iso_date("2026/06/03") == "2026-06-03"
+    assert iso_date("next friday") is None
+
+
+def test_sqlite_store_keeps_json_values_and_evicts_least_recently_used(tmp_path):
+    store = SQLiteStore(str(tmp_path / "store.db"), "entries", 2, json_values=True)
+    store.set("a", 1.0, {"data": [1]})
+    store.set("b", 2.0, {"data": [2]})
+    assert store.get("a") == (1.0, {"data": [1]})
+    assert store.set("c", 3.0, {"data": [3]}) == 1
+    assert store.get("b") is None and len(store) == 2
+    memory = MemoryStore(1)
+    memory.set("a", 1.0, "A")
+    assert memory.set("b", 2.0, "B") == 1 and memory.get("a") is None
+
+
+class RacingCache:
+    """A cache whose first lookup misses but only returns once the first fetch has saved its value."""
+
+    def __init__(self):
+        self.values = {}
+        self.saved = threading.Event()
+        self.first_lookup = True
+
+    def lookup(self, key):
+        if self.first_lookup:
+            self.first_lookup = False
+            self.saved.wait(1)
+            return None, False
+        return self.values.get(key), key in self.values
+
+    def save(self, key, value):
+        self.values[key] = value
+        self.saved.set()
+
+
+def test_a_miss_that_raced_a_finished_fetch_looks_again():
+    cache = RacingCache()
+    revalidator = StaleWhileRevalidate(cache.lookup, cache.save, "test_cache", "a test value")
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        return "value"
+
+    # the slow lookup starts first and misses, the fetch ends before it checks for fetches in flight
+    slow = threading.Thread(target=lambda: fetches.append(revalidator.get_or_fetch("key", fetch)))
+    slow.start()
+    while cache.first_lookup:
+        pass
+    assert revalidator.get_or_fetch("key", fetch) == "value"
+    slow.join()
+    assert fetches == [1, "value"]
+    assert revalidator.stats()["coalesced"] == 1
+
+
+def test_async_miss_waits_for_a_thread_already_fetching():
+    values = {}
+    revalidator = StaleWhileRevalidate(lambda key: (values.get(key), key in values), values.__setitem__, "test_cache", "a test value")
+    started = threading.Event()
+    release = threading.Event()
+
+    def fetch():
+        started.set()
+        release.wait(1)
+        return "from thread"
+
+    async def afetch():
+        raise AssertionError("the thread's fetch should be shared")
+
+    thread = threading.Thread(target=revalidator.get_or_fetch, args=("key", fetch))
+    thread.start()
+    started.wait(1)
+
+    async def search():
+        waiting = asyncio.create_task(revalidator.aget_or_fetch("key", afetch))
+        await asyncio.sleep(0.01)
+        release.set()
+        return await waiting
+
+    assert asyncio.run(search()) == "from thread"
+    thread.join()
@@ -0,0 +1,141 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import flight_cache
+from flight_cache import FlightCache, flight_cache_key
+
+PARAMS = {"originLocationCode": "DEN", "destinationLocationCode": "CDG", "departureDate": "2026-06-03", "adults": 1, "maxPrice": "900"}
+
+
+def test_equivalent_searches_share_a_key():
+    same = {**PARAMS, "originLocationCode": " den", "departureDate": "06/03/2026", "maxPrice": "$900.00", "returnDate": ""}
+    assert flight_cache_key(PARAMS, "standin") == flight_cache_key(same, "standin")
+    assert flight_cache_key(PARAMS, "standin") != flight_cache_key(PARAMS, "api.amadeus.com")
+    assert flight_cache_key(PARAMS) != flight_cache_key({**PARAMS, "departureDate": "2026-06-04"})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [time.time()]
+    monkeypatch.setattr(flight_cache.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.mark.parametrize("on_disk", [False, True])
+def test_fresh_stale_and_expired_entries(clock, tmp_path, on_disk):
+    cache = FlightCache(ttl=60, stale_ttl=60, max_entries=8, path=str(tmp_path / "flights.db") if on_disk else "")
+    cache.set("key", {"data": [1]})
+    assert cache.lookup("key") == ({"data": [1]}, True)
+    clock[0] += 90
+    assert cache.lookup("key") == ({"data": [1]}, False)
+    clock[0] += 60
+    assert cache.lookup("key") == (None, False)
+    stats = cache.stats()
+    assert (stats["hits"], stats["stale_hits"], stats["misses"], stats["entries"]) == (1, 1, 1, 0)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = FlightCache(ttl=60, stale_ttl=60, max_entries=2, path="")
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.lookup("a")
+    cache.set("c", 3)
+    assert cache.lookup("b") == (None, False)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_stale_entry_is_returned_and_refreshed_once(clock):
+    cache = FlightCache(ttl=60, stale_ttl=600, max_entries=8, path="")
+    cache.set("key", "old")
+    clock[0] += 90
+    refreshed = threading.Event()
+    release = threading.Event()
+
+    def fetch():
+        release.wait(1)
+        refreshed.set()
+        return "new"
+
+    assert cache.get_or_fetch("key", fetch) == "old"
+    assert cache.get_or_fetch("key", fetch) == "old"
+    release.set()
+    assert refreshed.wait(1)
+    for _ in range(100):
+        if cache.lookup("key")[0] == "new":
+            break
+        time.sleep(0.01)
+    assert cache.lookup("key") == ("new", True)
+    assert cache.stats()["refreshes"] == 1
+
+
+def test_concurrent_misses_share_one_fetch():
+    cache = FlightCache(ttl=60, stale_ttl=60, max_entries=8, path="")
+    fetches = []
+    barrier = threading.Barrier(6)
+
+    def fetch():
+        fetches.append(1)
+        time.sleep(0.05)
+        return {"data": ["offer"]}
+
+    def search():
+        barrier.wait()
+        return cache.get_or_fetch("key", fetch)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(search())) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(fetches) == 1
+    assert results == [{"data": ["offer"]}] * 6
+    assert cache.stats()["coalesced"] >= 1
+
+
+def test_concurrent_async_misses_share_one_fetch_and_its_error():
+    cache = FlightCache(ttl=60, stale_ttl=60, max_entries=8, path="")
+    fetches = []
+
+    async def afetch():
+        fetches.append(1)
+        await asyncio.sleep(0.01)
+        return "offers"
+
+    async def afail():
+        fetches.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("Amadeus is down")
+
+    async def scenario():
+        found = await asyncio.gather(*(cache.aget_or_fetch("key", afetch) for _ in range(5)))
+        failed = await asyncio.gather(*(cache.aget_or_fetch("other", afail) for _ in range(3)), return_exceptions=True)
+        return found, failed
+
+    found, failed = asyncio.run(scenario())
+    assert found == ["offers"] * 5
+    assert all(isinstance(error, RuntimeError) for error in failed)
+    assert len(fetches) == 2
+    # errors aren't cached, the next search tries again
+    assert cache.lookup("other") == (None, False)
+
+
+def test_cancelled_caller_leaves_the_fetch_to_the_others():
+    cache = FlightCache(ttl=60, stale_ttl=60, max_entries=8, path="")
+
+    async def afetch():
+        await asyncio.sleep(0.02)
+        return "offers"
+
+    async def scenario():
+        leaving = asyncio.create_task(cache.aget_or_fetch("key", afetch))
+        staying = asyncio.create_task(cache.aget_or_fetch("key", afetch))
+        await asyncio.sleep(0.005)
+        leaving.cancel()
+        return await staying
+
+    assert asyncio.run(scenario()) == "offers"
+    assert cache.lookup("key") == ("offers", True)
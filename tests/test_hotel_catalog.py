@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+
+import hotel_catalog
+from hotel_catalog import HotelCatalog, normalize_ratings
+
+HOTELS = [
+    {"hotelId": "HLPAR001", "name": "HOTEL ONE", "iataCode": "PAR", "rating": 4, "geoCode": {"latitude": 48.86, "longitude": 2.35}},
+    {"hotelId": "HLPAR002", "name": "HOTEL TWO", "iataCode": "PAR"},
+]
+
+
+def test_listing_round_trip_keeps_the_order(tmp_path):
+    catalog = HotelCatalog(str(tmp_path / "catalog.db"))
+    assert catalog.get("PAR", "3,4") is None
+    catalog.save(" par", "4, 3", HOTELS)
+    hotels, _ = catalog.get("PAR", "3,4")
+    assert [hotel["hotelId"] for hotel in hotels] == ["HLPAR001", "HLPAR002"]
+    assert hotels[0]["rating"] == "4" and hotels[0]["geoCode"]["latitude"] == 48.86
+    assert "rating" not in hotels[1]
+    assert normalize_ratings("5, 3,5") == "3,5"
+
+
+def test_concurrent_misses_fetch_the_listing_once(tmp_path):
+    catalog = HotelCatalog(str(tmp_path / "catalog.db"))
+    fetches = []
+    barrier = threading.Barrier(4)
+
+    def fetch():
+        fetches.append(1)
+        time.sleep(0.05)
+        return HOTELS
+
+    def search():
+        barrier.wait()
+        return catalog.get_or_fetch("PAR", "3,4", fetch)
+
+    threads = [threading.Thread(target=search) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(fetches) == 1
+
+    async def afetch():
+        fetches.append(1)
+        await asyncio.sleep(0.01)
+        return HOTELS[:1]
+
+    async def asearches():
+        return await asyncio.gather(*(catalog.aget_or_fetch("ROM", "4", afetch) for _ in range(4)))
+
+    assert all(len(hotels) == 1 for hotels in asyncio.run(asearches()))
+    assert len(fetches) == 2
+    assert catalog.stats()["listings"] == 2
+
+
+def test_old_listing_is_used_and_refreshed(tmp_path, monkeypatch):
+    catalog = HotelCatalog(str(tmp_path / "catalog.db"), max_age_days=1)
+    catalog.save("PAR", "4", HOTELS[:1])
+    now = time.time()
+    monkeypatch.setattr(hotel_catalog.time, "time", lambda: now + 2 * hotel_catalog.DAY)
+    refreshed = threading.Event()
+
+    def fetch():
+        refreshed.set()
+        return HOTELS
+
+    assert len(catalog.get_or_fetch("PAR", "4", fetch)) == 1
+    assert refreshed.wait(1)
+    for _ in range(100):
+        if len(catalog.get("PAR", "4")[0]) == 2:
+            break
+        time.sleep(0.01)
+    assert len(catalog.get("PAR", "4")[0]) == 2
+    stats = catalog.stats()
+    assert (stats["stale_hits"], stats["refreshes"]) == (1, 1)
@@ -0,0 +1,102 @@
+import asyncio
+
+import httpx
+import pytest
+import requests
+
+from hotel_catalog import HotelCatalog
+
+# the tools are fairlib AbstractTools
+pytest.importorskip("fairlib")
+import hotel_tool  # noqa: E402
+
+INFO = {"ADULTS": "2", "CHECKINDATE": "2026-06-03", "CHECKOUTDATE": "2026-06-07", "PRICERANGE": "100-300"}
+HOTEL_IDS = [f"HL{i:03d}" for i in range(7)]
+
+
+class Response:
+    def __init__(self, hotel_ids):
+        self.hotel_ids = hotel_ids
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        # every hotel is priced at 100 plus its number
+        return {"data": [
+            {"hotel": {"hotelId": hotel_id, "name": hotel_id}, "offers": [{"price": {"total": str(100 + int(hotel_id[2:])), "currency": "USD"}}]}
+            for hotel_id in self.hotel_ids
+        ]}
+
+
+class Amadeus:
+    """Stands in for amadeus_http.get/aget, failing the requests for chunks that include fail_on."""
+
+    def __init__(self, fail_on=()):
+        self.fail_on = set(fail_on)
+        self.chunks = []
+
+    def respond(self, params, error):
+        chunk = params["hotelIds"]
+        self.chunks.append(chunk)
+        if self.fail_on & set(chunk):
+            raise error
+        return Response(chunk)
+
+    def get(self, url, params=None, auth=None):
+        return self.respond(params, requests.exceptions.ConnectionError("connection reset"))
+
+    async def aget(self, url, params=None, auth=None):
+        await asyncio.sleep(0)
+        return self.respond(params, httpx.ConnectError("connection reset"))
+
+
+@pytest.fixture
+def tool(tmp_path, monkeypatch):
+    monkeypatch.setattr(hotel_tool, "get_hotel_catalog", lambda api_endpoint: HotelCatalog(str(tmp_path / "catalog.db")))
+    monkeypatch.setattr(hotel_tool, "HOTEL_OFFERS_CHUNK_SIZE", 3)
+    monkeypatch.setattr(hotel_tool, "HOTEL_OFFERS_MAX_HOTELS", 7)
+    tool = hotel_tool.HotelTool()
+    tool.top_k = 10
+    return tool
+
+
+def search(tool, amadeus, monkeypatch, hotel_ids, asynchronous):
+    monkeypatch.setattr(hotel_tool.amadeus_http, "get", amadeus.get)
+    monkeypatch.setattr(hotel_tool.amadeus_http, "aget", amadeus.aget)
+    if asynchronous:
+        return asyncio.run(tool.asearch_hotels(INFO, hotel_ids))
+    return tool.search_hotels(INFO, hotel_ids)
+
+
+def test_chunk_boundaries(tool, monkeypatch):
+    assert tool.chunk_ids(HOTEL_IDS[:6]) == [HOTEL_IDS[0:3], HOTEL_IDS[3:6]]
+    assert tool.chunk_ids(HOTEL_IDS[:4]) == [HOTEL_IDS[0:3], HOTEL_IDS[3:4]]
+    assert tool.chunk_ids([]) == []
+    # past HOTEL_OFFERS_MAX_HOTELS the rest aren't priced
+    monkeypatch.setattr(hotel_tool, "HOTEL_OFFERS_MAX_HOTELS", 5)
+    assert tool.chunk_ids(HOTEL_IDS) == [HOTEL_IDS[0:3], HOTEL_IDS[3:5]]
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_every_chunk_is_searched_and_merged(tool, monkeypatch, asynchronous):
+    amadeus = Amadeus()
+    output = search(tool, amadeus, monkeypatch, HOTEL_IDS, asynchronous)
+    assert sorted(amadeus.chunks) == [HOTEL_IDS[0:3], HOTEL_IDS[3:6], HOTEL_IDS[6:7]]
+    assert output.startswith("--- Cheapest 7 of 7 hotels with offers (7 hotels searched) ---")
+    # cheapest first across the chunks
+    assert output.index("HL000") < output.index("HL003") < output.index("HL006")
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_failed_chunk_leaves_out_only_its_hotels(tool, monkeypatch, asynchronous):
+    output = search(tool, Amadeus(fail_on={"HL004"}), monkeypatch, HOTEL_IDS, asynchronous)
+    assert "Cheapest 4 of 4 hotels with offers (7 hotels searched)" in output
+    assert "(1 of 3 searches failed, some hotels are missing)" in output
+    assert "HL003" not in output and "HL006" in output
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_every_chunk_failing_is_an_error(tool, monkeypatch, asynchronous):
+    output = search(tool, Amadeus(fail_on=HOTEL_IDS), monkeypatch, HOTEL_IDS, asynchronous)
+    assert output == "API request failed: connection reset"
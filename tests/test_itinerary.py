@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from backend.run_agents import _read_itinerary
+from itinerary import ITINERARY_MARKER, Itinerary, parse_itinerary
+
+ANSWER = """**Rome Getaway: June 3-10, 2026**
+
+## Flights
+- Outbound: AZ 611, DEN 17:05 -> FCO 11:40 (+1)
+- Return: AZ 610, FCO 10:15 -> DEN 14:50
+
+## Hotel
+- Hotel Artemide, Via Nazionale 22 (4 stars)
+
+## Day-by-Day Activities
+Rome (June 4-7):
+- Day 1: Colosseum and Roman Forum
+- Day 2: Vatican Museums
+
+## Cost Breakdown
+- Flight cost: 2 tickets x $650 = $1,300
+- Hotel cost: $1,540.50
+- Total cost: $2,840.50
+"""
+
+RESULTS = [{"worker": "flight_researcher", "seconds": 3.2, "result": "AZ 611 ..."}]
+
+
+def test_answer_is_split_into_sections():
+    itinerary = parse_itinerary(ANSWER, RESULTS)
+    assert itinerary.title == "Rome Getaway: June 3-10, 2026"
+    assert itinerary.flights == ["Outbound: AZ 611, DEN 17:05 -> FCO 11:40 (+1)", "Return: AZ 610, FCO 10:15 -> DEN 14:50"]
+    assert itinerary.hotels == ["Hotel Artemide, Via Nazionale 22 (4 stars)"]
+    # an unknown sub-heading stays in the section it appears in
+    assert itinerary.activities == ["Rome (June 4-7):", "Day 1: Colosseum and Roman Forum", "Day 2: Vatican Museums"]
+    assert itinerary.costs == {"flights": 1300.0, "hotels": 1540.5, "total": 2840.5}
+    assert itinerary.worker_results == RESULTS
+    assert itinerary.error is None
+
+
+def test_marker_is_stripped_and_added_back_for_the_pdf():
+    itinerary = parse_itinerary(f"{ITINERARY_MARKER}\n\n{ANSWER}")
+    assert itinerary.text == ANSWER.strip()
+    assert itinerary.flights == parse_itinerary(ANSWER).flights
+    assert itinerary.to_text() == f"{ITINERARY_MARKER}\n\n{ANSWER.strip()}"
+
+
+def test_text_without_headings_ends_up_in_the_notes():
+    itinerary = parse_itinerary("Could not find flights\nTry other dates.\nTotal: $0")
+    assert itinerary.title == "Could not find flights"
+    assert itinerary.notes == ["Try other dates.", "Total: $0"]
+    assert (itinerary.flights, itinerary.hotels, itinerary.activities) == ([], [], [])
+    # costs outside a cost section are still picked up
+    assert itinerary.costs == {"total": 0.0}
+
+
+def test_empty_answer():
+    itinerary = parse_itinerary(None)
+    assert (itinerary.text, itinerary.title, itinerary.costs) == ("", "", {})
+
+
+def test_round_trip_through_a_dict():
+    itinerary = parse_itinerary(ANSWER, RESULTS)
+    data = json.loads(json.dumps(itinerary.to_dict()))
+    assert Itinerary.from_dict(data) == itinerary
+
+
+def test_subprocess_result_is_read_back():
+    itinerary = parse_itinerary(ANSWER, RESULTS)
+    assert _read_itinerary(0, json.dumps(itinerary.to_dict()), "") == itinerary
+
+
+def test_subprocess_errors_are_raised():
+    failed = Itinerary(text="", error="A an error occurred: LLM timed out")
+    with pytest.raises(RuntimeError, match="LLM timed out"):
+        _read_itinerary(0, json.dumps(failed.to_dict()), "")
+    with pytest.raises(RuntimeError, match="unreadable itinerary"):
+        _read_itinerary(0, "Traceback (most recent call last):", "")
+    with pytest.raises(RuntimeError, match=r"code=1"):
+        _read_itinerary(1, "", "ImportError: fairlib")
@@ -0,0 +1,276 @@
+import asyncio
+
+import pytest
+
+from backend import jobs
+from backend.jobs import (
+    CANCELLED,
+    DONE,
+    FAILED,
+    MAX_CONCURRENT_RUNS,
+    QUEUED,
+    RUNNING,
+    JobScheduler,
+    QueueFullError,
+)
+
+
+async def settle():
+    # let the workers pick up and finish whatever is ready
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+class Runs:
+    """run_fn that holds every run until release() and records how many overlap."""
+
+    def __init__(self):
+        self.release_event = asyncio.Event()
+        self.running = 0
+        self.most_running = 0
+        self.started = []
+
+    async def __call__(self, job):
+        self.started.append(job.user_request)
+        self.running += 1
+        self.most_running = max(self.most_running, self.running)
+        try:
+            await self.release_event.wait()
+            return f"itinerary for {job.user_request}"
+        finally:
+            self.running -= 1
+
+    def release(self):
+        self.release_event.set()
+
+
+def test_runs_at_most_max_concurrent_at_a_time():
+    async def main():
+        runs = Runs()
+        scheduler = JobScheduler(runs, max_concurrent=2, max_queue=10)
+        await scheduler.start()
+        jobs = [scheduler.submit(f"trip {i}") for i in range(5)]
+        await settle()
+        busy = (scheduler.running(), scheduler.queue_depth(), scheduler.active())
+        runs.release()
+        await settle()
+        await scheduler.stop()
+        return runs, jobs, busy
+
+    runs, jobs, busy = asyncio.run(main())
+    assert busy == (2, 3, 5)
+    assert runs.most_running == 2
+    assert JobScheduler(runs).max_concurrent == MAX_CONCURRENT_RUNS
+    # first in, first out
+    assert runs.started == [f"trip {i}" for i in range(5)]
+    assert [job.status for job in jobs] == [DONE] * 5
+    assert jobs[0].result == "itinerary for trip 0"
+
+
+def test_full_queue_turns_jobs_away():
+    async def main():
+        runs = Runs()
+        scheduler = JobScheduler(runs, max_concurrent=1, max_queue=1)
+        await scheduler.start()
+        scheduler.submit("running")
+        await settle()
+        scheduler.submit("waiting")
+        with pytest.raises(QueueFullError):
+            scheduler.submit("one too many")
+        runs.release()
+        await settle()
+        await scheduler.stop()
+
+    asyncio.run(main())
+
+
+def test_same_key_shares_the_unfinished_job():
+    async def main():
+        runs = Runs()
+        scheduler = JobScheduler(runs, max_concurrent=1)
+        await scheduler.start()
+        first = scheduler.submit("trip", key="k")
+        second = scheduler.submit("trip", key="k")
+        runs.release()
+        await settle()
+        # once it's finished the key starts a new job
+        third = scheduler.submit("trip", key="k")
+        await settle()
+        await scheduler.stop()
+        return scheduler, first, second, third
+
+    scheduler, first, second, third = asyncio.run(main())
+    assert first is second and first.clients == 2
+    assert third is not first
+    assert scheduler.deduplicated == 1
+
+
+def test_failed_run_is_reported_on_the_job():
+    async def fail(job):
+        raise RuntimeError("no flights")
+
+    async def main():
+        scheduler = JobScheduler(fail, max_concurrent=1)
+        await scheduler.start()
+        job = scheduler.submit("trip")
+        await settle()
+        await scheduler.stop()
+        return job
+
+    job = asyncio.run(main())
+    assert (job.status, job.error) == (FAILED, "no flights")
+
+
+def test_subscriber_gets_every_event_in_order():
+    async def main():
+        release = asyncio.Event()
+
+        async def run(job):
+            job.publish({"type": "turn", "n": 1})
+            await asyncio.sleep(0)
+            job.publish({"type": "turn", "n": 2})
+            await release.wait()
+            job.publish({"type": "turn", "n": 3})
+            return "itinerary"
+
+        scheduler = JobScheduler(run, max_concurrent=1)
+        await scheduler.start()
+        job = scheduler.submit("trip")
+        await settle()
+
+        # a late subscriber first gets what it missed, then the rest as it happens
+        async def listen():
+            return [event async for event in job.stream()]
+
+        listener = asyncio.create_task(listen())
+        await settle()
+        release.set()
+        events = await listener
+        await scheduler.stop()
+        return events
+
+    events = asyncio.run(main())
+    assert [event.get("status") or event.get("n") for event in events] == [RUNNING, 1, 2, 3, DONE]
+    elapsed = [event["elapsed"] for event in events]
+    assert elapsed == sorted(elapsed)
+
+
+def test_new_job_is_queued_until_a_worker_takes_it():
+    async def main():
+        runs = Runs()
+        scheduler = JobScheduler(runs, max_concurrent=1)
+        await scheduler.start()
+        job = scheduler.submit("trip")
+        status = job.status
+        await settle()
+        runs.release()
+        await settle()
+        await scheduler.stop()
+        return status, job.to_dict()
+
+    status, info = asyncio.run(main())
+    assert status == QUEUED
+    assert info["status"] == DONE and info["started_at"] <= info["finished_at"]
+
+
+def test_cancelling_a_queued_job_drops_it_from_the_line():
+    async def main():
+        runs = Runs()
+        scheduler = JobScheduler(runs, max_concurrent=1)
+        await scheduler.start()
+        scheduler.submit("running")
+        queued = scheduler.submit("queued", key="k")
+        await settle()
+        cancelled = scheduler.cancel(queued, "client_left")
+        status = queued.status
+        runs.release()
+        await settle()
+        await scheduler.stop()
+        return runs, queued, cancelled, status, scheduler
+
+    runs, queued, cancelled, status, scheduler = asyncio.run(main())
+    assert cancelled and status == CANCELLED
+    assert queued.error == "Job was cancelled (client_left)"
+    # the worker skipped it and the key is free again
+    assert runs.started == ["running"]
+    assert scheduler.join("k") is None
+    assert not scheduler.cancel(queued, "client_left")
+
+
+def test_cancelling_a_running_job_stops_its_run_and_frees_the_worker():
+    async def main():
+        stopped = []
+
+        async def run(job):
+            if job.user_request == "next":
+                return "itinerary"
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                stopped.append(job.user_request)
+                raise
+
+        scheduler = JobScheduler(run, max_concurrent=1)
+        await scheduler.start()
+        running = scheduler.submit("running")
+        following = scheduler.submit("next")
+        await settle()
+        scheduler.cancel(running, "client_left")
+        await settle()
+        await scheduler.stop()
+        return stopped, running, following
+
+    stopped, running, following = asyncio.run(main())
+    assert stopped == ["running"]
+    assert (running.status, running.cancel_reason) == (CANCELLED, "client_left")
+    assert following.status == DONE
+
+
+def test_job_is_only_cancelled_once_every_client_has_left():
+    async def main():
+        runs = Runs()
+        scheduler = JobScheduler(runs, max_concurrent=1)
+        await scheduler.start()
+        job = scheduler.submit("trip", key="k")
+        scheduler.join("k")
+        await settle()
+        first = scheduler.leave(job)
+        status = job.status
+        second = scheduler.leave(job)
+        await settle()
+        await scheduler.stop()
+        return first, status, second, job
+
+    first, status, second, job = asyncio.run(main())
+    assert not first and status == RUNNING
+    assert second and job.status == CANCELLED
+
+
+def test_reaper_cancels_jobs_nobody_is_watching(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_ABANDON_AFTER", 0.05)
+    monkeypatch.setattr(jobs, "ABANDON_CHECK_INTERVAL", 0.01)
+
+    async def main():
+        runs = Runs()
+        scheduler = JobScheduler(runs, max_concurrent=2)
+        await scheduler.start()
+        abandoned = scheduler.submit("abandoned")
+        streamed = scheduler.submit("streamed")
+
+        async def listen():
+            async for event in streamed.stream():
+                pass
+
+        listener = asyncio.create_task(listen())
+        # the client of the first job went away, the second one keeps its event stream open
+        await asyncio.sleep(0.2)
+        status = streamed.status
+        runs.release()
+        await listener
+        await scheduler.stop()
+        return abandoned, status, streamed
+
+    abandoned, status, streamed = asyncio.run(main())
+    assert (abandoned.status, abandoned.cancel_reason) == (CANCELLED, "disconnected")
+    assert status == RUNNING
+    assert streamed.status == DONE
@@ -0,0 +1,21 @@
+from backend.metrics import Registry
+
+
+def test_totals_kept_elsewhere_are_exposed_as_counters():
+    registry = Registry()
+    rejected = {"client": 3, "overload": 1}
+    registry.counter_func(
+        "travel_admission_rejections_total",
+        "Plan requests turned away by admission control, by reason.",
+        lambda: {(("reason", reason),): count for reason, count in rejected.items()},
+    )
+    registry.gauge("travel_queue_depth", "Jobs waiting for a free agent team.", lambda: 2)
+    assert registry.expose().splitlines() == [
+        "# HELP travel_admission_rejections_total Plan requests turned away by admission control, by reason.",
+        "# TYPE travel_admission_rejections_total counter",
+        'travel_admission_rejections_total{reason="client"} 3',
+        'travel_admission_rejections_total{reason="overload"} 1',
+        "# HELP travel_queue_depth Jobs waiting for a free agent team.",
+        "# TYPE travel_queue_depth gauge",
+        "travel_queue_depth 2",
+    ]
@@ -0,0 +1,170 @@
+import asyncio
+from contextlib import contextmanager
+
+import pytest
+
+from backend.cache import ItineraryCache
+from backend.sessions import (
+    ALL_STAGES,
+    FULL,
+    INCREMENTAL,
+    UNCHANGED,
+    PlanningSession,
+    SessionLimitError,
+    SessionStore,
+)
+from itinerary import Itinerary
+
+TRIP = {
+    "origin": "Denver",
+    "destination": "Rome, Italy",
+    "departure_date": "2026-06-03",
+    "nights": 7,
+    "budget": "4000",
+    "notes": "None",
+}
+
+
+def planned_session(error=None):
+    session = PlanningSession()
+    itinerary = Itinerary("Rome", worker_results=[{"worker": "flight_researcher", "seconds": 1.0, "result": "flights"}], error=error)
+    session.remember(TRIP, itinerary, FULL)
+    return session
+
+
+def test_first_plan_is_full():
+    assert PlanningSession().plan_for(TRIP) == (FULL, ALL_STAGES, "")
+
+
+def test_same_trip_written_differently_is_unchanged():
+    edit = dict(TRIP, origin="  denver ", departure_date="06/03/2026", budget="$4,000", notes="n/a")
+    assert planned_session().plan_for(edit) == (UNCHANGED, set(), "")
+
+
+def test_new_notes_only_need_the_manager():
+    mode, stages, changes = planned_session().plan_for(dict(TRIP, notes="museums"))
+    assert (mode, stages) == (INCREMENTAL, set())
+    assert changes == "notes changed from 'None' to 'museums'"
+
+
+def test_new_budget_reruns_the_costs():
+    mode, stages, changes = planned_session().plan_for(dict(TRIP, budget="3000"))
+    assert (mode, stages) == (INCREMENTAL, {"costs"})
+    assert "budget" in changes
+
+
+def test_new_origin_reruns_flights_and_costs():
+    mode, stages, _ = planned_session().plan_for(dict(TRIP, origin="Boston"))
+    assert (mode, stages) == (INCREMENTAL, {"flights", "costs"})
+
+
+def test_new_destination_is_a_full_plan():
+    assert planned_session().plan_for(dict(TRIP, destination="Paris")) == (FULL, ALL_STAGES, "")
+
+
+def test_plan_after_an_error_is_full():
+    assert planned_session(error="LLM timed out").plan_for(dict(TRIP, notes="museums")) == (FULL, ALL_STAGES, "")
+
+
+def test_session_store_resumes_and_limits_sessions():
+    store = SessionStore(ttl=60, max_sessions=1)
+    session = store.open()
+    assert store.open(session.id) is session
+    with pytest.raises(SessionLimitError):
+        store.open("unknown")
+
+
+class Admission:
+    def admit(self, client):
+        pass
+
+    def track(self, client, job):
+        pass
+
+    @contextmanager
+    def outside_run(self):
+        yield
+
+
+def test_incremental_plan_without_the_pool_runs_in_full(monkeypatch):
+    # backend.app builds the agent team, which needs fairlib
+    app_module = pytest.importorskip("backend.app")
+    runs = []
+
+    async def run_itinerary(user_request, on_event=None, key=None, revision=None):
+        runs.append((key, revision))
+        return Itinerary("Rome with museums")
+
+    monkeypatch.setattr(app_module, "run_itinerary", run_itinerary)
+    monkeypatch.setattr(app_module.app.state, "agent_pool", None, raising=False)
+    monkeypatch.setattr(app_module.app.state, "admission", Admission(), raising=False)
+    monkeypatch.setattr(app_module.app.state, "itinerary_cache", ItineraryCache(), raising=False)
+
+    session = planned_session()
+    messages = []
+    asyncio.run(app_module.plan_in_session(session, dict(TRIP, notes="museums"), messages.append, "client"))
+
+    started = messages[0]
+    assert (started["type"], started["mode"], started["rerun"]) == ("plan_started", FULL, sorted(ALL_STAGES))
+    # a new interpreter has no earlier run to revise, it plans the whole trip
+    assert len(runs) == 1 and runs[0][1] is None
+    assert messages[-1]["type"] == "itinerary" and messages[-1]["mode"] == FULL
+    assert session.itinerary.text == "Rome with museums"
+
+
+class Worker:
+    role_description = "searches flights"
+
+    def __init__(self, name):
+        self.name = name
+
+
+class Team:
+    def __init__(self, fail=False):
+        self.workers = {name: Worker(name) for name in ("flight_researcher", "hotel_researcher", "Analyst", "trip_researcher")}
+        self.fail = fail
+        self.seen_workers = None
+
+    async def arun(self, prompt, on_event=None):
+        self.seen_workers = dict(self.workers)
+        if self.fail:
+            raise RuntimeError("LLM timed out")
+        on_event({"type": "delegation_result", "worker": "Analyst", "seconds": 0.5, "result": "Total: $3,000"})
+        return "Rome trip\nCosts:\nTotal: $3,000"
+
+
+def test_replan_trip_replays_kept_workers_and_puts_them_back():
+    travel_multi_agent = pytest.importorskip("travel_multi_agent")
+    team = Team()
+    originals = dict(team.workers)
+    previous = Itinerary(
+        "Rome trip",
+        worker_results=[
+            {"worker": "flight_researcher", "seconds": 2.0, "result": "flight AZ1"},
+            {"worker": "hotel_researcher", "seconds": 2.0, "result": "Hotel Roma"},
+            {"worker": "Analyst", "seconds": 0.5, "result": "Total: $3,500"},
+        ],
+    )
+
+    itinerary = asyncio.run(travel_multi_agent.replan_trip(team, "new budget", previous, {"costs"}, "budget changed"))
+
+    # the searches were stood in for by their earlier results, the analyst ran again
+    assert isinstance(team.seen_workers["flight_researcher"], travel_multi_agent.ReplayWorker)
+    assert isinstance(team.seen_workers["hotel_researcher"], travel_multi_agent.ReplayWorker)
+    assert team.seen_workers["Analyst"] is originals["Analyst"]
+    assert team.workers == originals
+    assert [result["result"] for result in itinerary.worker_results] == ["flight AZ1", "Hotel Roma", "Total: $3,000"]
+    assert itinerary.costs == {"total": 3000.0}
+
+
+def test_replan_trip_puts_the_workers_back_after_an_error():
+    travel_multi_agent = pytest.importorskip("travel_multi_agent")
+    team = Team(fail=True)
+    originals = dict(team.workers)
+    previous = Itinerary("Rome trip", worker_results=[{"worker": "flight_researcher", "seconds": 2.0, "result": "flight AZ1"}])
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(travel_multi_agent.replan_trip(team, "new notes", previous, set(), "notes changed"))
+
+    assert isinstance(team.seen_workers["flight_researcher"], travel_multi_agent.ReplayWorker)
+    assert team.workers == originals
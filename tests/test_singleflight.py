@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from backend.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_run():
+    async def scenario():
+        flight = SingleFlight()
+        runs = 0
+
+        async def run():
+            nonlocal runs
+            runs += 1
+            await asyncio.sleep(0.01)
+            return "itinerary"
+
+        results = await asyncio.gather(*(flight.do("trip", run) for _ in range(5)))
+        return flight, runs, results
+
+    flight, runs, results = asyncio.run(scenario())
+    assert runs == 1
+    assert results == ["itinerary"] * 5
+    assert flight.stats() == {"in_flight": 0, "started": 1, "deduplicated": 4}
+
+
+def test_a_finished_key_starts_a_new_run():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def run():
+            calls.append(1)
+            return len(calls)
+
+        return await flight.do("trip", run), await flight.do("trip", run)
+
+    assert asyncio.run(scenario()) == (1, 2)
+
+
+def test_errors_reach_every_waiter():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def run():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("no flights")
+
+        return await asyncio.gather(flight.do("trip", run), flight.do("trip", run), return_exceptions=True)
+
+    first, second = asyncio.run(scenario())
+    assert isinstance(first, RuntimeError) and first is second
+
+
+def test_cancelled_waiter_leaves_the_run_to_the_others():
+    async def scenario():
+        flight = SingleFlight()
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def run():
+            started.set()
+            await release.wait()
+            return "itinerary"
+
+        leaving = asyncio.create_task(flight.do("trip", run))
+        staying = asyncio.create_task(flight.do("trip", run))
+        await started.wait()
+        leaving.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+        return await staying
+
+    assert asyncio.run(scenario()) == "itinerary"
+
+
+def test_run_is_cancelled_once_every_waiter_has_gone():
+    async def scenario():
+        flight = SingleFlight()
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def run():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiters = [asyncio.create_task(flight.do("trip", run)) for _ in range(2)]
+        await started.wait()
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), 1)
+        await asyncio.sleep(0)
+        return flight.in_flight()
+
+    assert asyncio.run(scenario()) == 0
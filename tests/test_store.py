@@ -0,0 +1,78 @@
+import time
+
+from backend import store
+from backend.jobs import Job
+from backend.store import DAY, ItineraryStore
+from itinerary import Itinerary
+
+
+def finished_job(request="Denver to Rome"):
+    job = Job(request, key="k")
+    job.started_at = job.created_at + 1
+    job.finished_at = job.created_at + 31
+    return job
+
+
+def test_saved_itinerary_is_read_back_by_a_new_store(tmp_path):
+    path = str(tmp_path / "itineraries.db")
+    job = finished_job()
+    itinerary = Itinerary("Rome trip", costs={"total": 2840.5})
+    ItineraryStore(path).save(job, itinerary, cached=True)
+
+    data, info = ItineraryStore(path, retention_days=30).get(job.id)
+    assert Itinerary.from_dict(data) == itinerary
+    assert (info["request"], info["cached"], info["run_seconds"]) == ("Denver to Rome", True, 30.0)
+    assert info["expires_at"] == job.finished_at + 30 * DAY
+    assert ItineraryStore(path).get("unknown") is None
+
+
+def test_rendered_files_are_kept_per_format(tmp_path):
+    itineraries = ItineraryStore(str(tmp_path / "itineraries.db"))
+    job = finished_job()
+    itineraries.save(job, Itinerary("Rome trip"))
+    itineraries.save_artifact(job.id, "pdf", b"%PDF-1.4", render_seconds=0.2)
+    itineraries.save_artifact(job.id, "md", b"# Rome")
+
+    assert itineraries.get_artifact(job.id, "pdf") == b"%PDF-1.4"
+    assert itineraries.get_artifact(job.id, "html") is None
+    assert itineraries.get(job.id)[1]["rendered_formats"] == ["md", "pdf"]
+    stats = itineraries.stats()
+    assert (stats["itineraries"], stats["artifacts"], stats["artifact_bytes"]) == (1, 2, 14)
+
+
+def test_compact_drops_old_files_then_old_itineraries(tmp_path, monkeypatch):
+    now = [time.time()]
+    monkeypatch.setattr(store.time, "time", lambda: now[0])
+    itineraries = ItineraryStore(str(tmp_path / "itineraries.db"), retention_days=30, artifact_retention_days=7)
+    old, recent = finished_job("old"), finished_job("recent")
+    old.finished_at = now[0]
+    recent.finished_at = now[0] + 20 * DAY
+    itineraries.save(old, Itinerary("old trip"))
+    itineraries.save_artifact(old.id, "pdf", b"old")
+
+    # a week and a bit later the file can be rebuilt, the itinerary is still kept
+    now[0] += 8 * DAY
+    itineraries.save(recent, Itinerary("recent trip"))
+    itineraries.save_artifact(recent.id, "pdf", b"recent")
+    assert itineraries.compact() == {"itineraries": 0, "artifacts": 1}
+    assert itineraries.get_artifact(old.id, "pdf") is None
+    assert itineraries.get(old.id) is not None
+
+    now[0] += 23 * DAY
+    assert itineraries.compact() == {"itineraries": 1, "artifacts": 1}
+    assert itineraries.get(old.id) is None
+    assert itineraries.get(recent.id) is not None
+
+
+def test_deleting_an_itinerary_deletes_its_files(tmp_path, monkeypatch):
+    now = [time.time()]
+    monkeypatch.setattr(store.time, "time", lambda: now[0])
+    itineraries = ItineraryStore(str(tmp_path / "itineraries.db"), retention_days=1, artifact_retention_days=7)
+    job = finished_job()
+    job.finished_at = now[0]
+    itineraries.save(job, Itinerary("Rome trip"))
+    now[0] += 2 * DAY
+    itineraries.save_artifact(job.id, "pdf", b"rendered just now")
+
+    assert itineraries.compact() == {"itineraries": 1, "artifacts": 0}
+    assert itineraries.stats()["artifacts"] == 0
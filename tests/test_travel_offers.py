@@ -0,0 +1,131 @@
+import json
+import os
+from datetime import date
+
+from travel_offers import (
+    flex_date_pairs,
+    format_duration,
+    format_flights,
+    format_hotels,
+    format_price_matrix,
+    parse_duration,
+    parse_flight_offers,
+    parse_hotel_offers,
+    rank_flights,
+    rank_hotels,
+)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "fixtures", "amadeus")
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def segment(origin, destination, departs="2026-06-03T08:00:00", arrives="2026-06-03T10:00:00"):
+    return {"departure": {"iataCode": origin, "at": departs}, "arrival": {"iataCode": destination, "at": arrives}, "carrierCode": "UA", "number": "100"}
+
+
+def offer(price, *itineraries, seats=4):
+    return {
+        "price": {"total": price, "currency": "USD"},
+        "numberOfBookableSeats": seats,
+        "itineraries": [{"duration": duration, "segments": segments} for duration, segments in itineraries],
+    }
+
+
+def test_durations():
+    assert parse_duration("PT5H30M") == 330
+    assert parse_duration("PT45M") == 45
+    assert parse_duration("P1D") == 0 and parse_duration(None) == 0
+    assert format_duration(65) == "1h05m"
+
+
+def test_parse_flight_offers_from_the_recorded_response():
+    offers = parse_flight_offers(fixture("flight_offers.json"))
+    assert len(offers) == 12
+    first = offers[0]
+    assert (first.price, first.currency, first.seats) == (280.72, "USD", 5)
+    assert [leg.minutes for leg in first.legs] == [167, 124]
+    assert first.legs[0].segments[0].flight_number == "B61680"
+    assert first.stops == 0 and first.minutes == 291
+
+
+def test_offers_without_a_price_or_segments_are_left_out():
+    data = {"data": [
+        offer("not a price", ("PT2H", [segment("DEN", "MCO")])),
+        offer("300", ("PT2H", [])),
+        offer("250", ("PT2H", [segment("DEN", "MCO")])),
+    ]}
+    assert [found.price for found in parse_flight_offers(data)] == [250.0]
+
+
+def test_rank_flights_orders_by_price_then_stops_then_duration_within_limits():
+    offers = parse_flight_offers({"data": [
+        offer("300", ("PT5H", [segment("DEN", "ORD"), segment("ORD", "MCO")])),
+        offer("300", ("PT3H", [segment("DEN", "MCO")])),
+        offer("300", ("PT2H", [segment("DEN", "MCO")])),
+        offer("200", ("PT9H", [segment("DEN", "ATL"), segment("ATL", "MCO")])),
+    ]})
+    assert [(found.price, found.minutes) for found in rank_flights(offers, 3)] == [(200, 540), (300, 120), (300, 180)]
+    assert [found.minutes for found in rank_flights(offers, 5, max_stops=0)] == [120, 180]
+    assert [found.minutes for found in rank_flights(offers, 5, max_minutes=240)] == [120, 180]
+
+
+def test_format_flights():
+    top = rank_flights(parse_flight_offers(fixture("flight_offers.json")), 2)
+    text = format_flights(top, 12)
+    assert text.startswith("--- Flight Options: best 2 of 12")
+    assert "Departure (nonstop, 2h47m):" in text and "flight number [B61680]: DEN -> MCO" in text
+    assert "None of the 12 flights" in format_flights([], 12)
+    assert "No available flights" in format_flights([], 0)
+
+
+def test_hotel_offers_are_parsed_ranked_and_shortened():
+    entries = fixture("hotel_offers.json")["data"]
+    hotels = parse_hotel_offers(entries, {"HLPAR000": "4"})
+    assert len(hotels) == 1
+    hotel = hotels[0]
+    assert hotel.rating == 4.0
+    assert [room.price for room in hotel.rooms] == sorted(room.price for room in hotel.rooms)
+    assert all(len(room.description) <= 80 and "\n" not in room.description for room in hotel.rooms)
+
+    cheap = parse_hotel_offers([{"hotel": {"hotelId": "A", "name": "A"}, "offers": [{"price": {"total": "100"}}]},
+                                {"hotel": {"hotelId": "B", "name": "B", "rating": "5"}, "offers": [{"price": {"total": "100"}}]},
+                                {"hotel": {"hotelId": "C", "name": "C"}, "offers": [{"price": {}}]}])
+    assert [found.hotel_id for found in rank_hotels(cheap, 5)] == ["B", "A"]
+    text = format_hotels(rank_hotels(cheap, 1), rooms_per_hotel=1)
+    assert "Option 1: B (N/A), 5 stars" in text
+    assert format_hotels([]) == "\nNo available hotels."
+
+
+def test_flex_dates_drop_past_departures_and_returns_before_departure():
+    departures, returns, pairs = flex_date_pairs(date(2026, 6, 3), date(2026, 6, 5), 2, today=date(2026, 6, 2))
+    assert departures == [date(2026, 6, d) for d in (2, 3, 4, 5)]
+    assert returns == [date(2026, 6, d) for d in (3, 4, 5, 6, 7)]
+    assert (date(2026, 6, 5), date(2026, 6, 4)) not in pairs
+    assert (date(2026, 6, 5), date(2026, 6, 5)) in pairs
+    assert all(back >= leave for leave, back in pairs)
+    assert len(pairs) == 5 + 5 + 4 + 3
+
+
+def test_flex_dates_one_way_and_all_in_the_past():
+    departures, returns, pairs = flex_date_pairs(date(2026, 6, 3), None, 1, today=date(2026, 1, 1))
+    assert returns == [None]
+    assert pairs == [(departure, None) for departure in departures] and len(pairs) == 3
+    assert flex_date_pairs(date(2026, 6, 3), None, 1, today=date(2026, 7, 1)) == ([], [None], [])
+
+
+def test_price_matrix():
+    june = [date(2026, 6, 3), date(2026, 6, 4)]
+    back = [date(2026, 6, 8), date(2026, 6, 9)]
+    cells = {(june[0], back[0]): 412.4, (june[0], back[1]): None, (june[1], back[0]): "error"}
+    lines = format_price_matrix(june, back, cells).splitlines()
+    assert lines[1].split() == ["06-08", "06-09"]
+    assert lines[2].split() == ["06-03", "412", "-"]
+    # pairs that weren't searched are blank
+    assert lines[3].split() == ["06-04", "error"]
+
+    one_way = format_price_matrix(june, [None], {(june[0], None): 99.6, (june[1], None): None}).splitlines()
+    assert one_way[1:] == [" 2026-06-03  100", " 2026-06-04  -"]
@@ -0,0 +1,118 @@
+import asyncio
+import json
+
+import pytest
+
+# the tools are fairlib AbstractTools
+pytest.importorskip("fairlib")
+import trip_tool  # noqa: E402
+
+TRIP = {
+    "Origin": "DEN",
+    "Adults": 2,
+    "Max_Price": 900,
+    "Ratings": "3,4,5",
+    "Hotel_Price": "100-300",
+    "Legs": [
+        {"City": "PAR", "Arrive": "2026-06-03", "Leave": "2026-06-07"},
+        {"City": "BRU", "Arrive": "2026-06-07", "Leave": "2026-06-09", "Flight": "no"},
+        {"City": "ROM", "Arrive": "2026-06-09", "Leave": "2026-06-13"},
+    ],
+}
+
+
+class Searches:
+    """Stands in for the flight and hotel tools, failing the flights into fail_into."""
+
+    def __init__(self, fail_into=None):
+        self.fail_into = fail_into
+        self.calls = []
+
+    def search_flights(self, info):
+        self.calls.append(("flight", info))
+        if info["DESTINATION"] == self.fail_into:
+            raise AttributeError("'int' object has no attribute 'strip'")
+        return f"flights {info['ORIGIN']}-{info['DESTINATION']} under {info['MAX_PRICE']}"
+
+    def search_city(self, info):
+        self.calls.append(("hotel", info))
+        return f"hotels in {info['CITYCODE']} for {info['ADULTS']}"
+
+    async def asearch_flights(self, info):
+        await asyncio.sleep(0)
+        return self.search_flights(info)
+
+    async def asearch_city(self, info):
+        await asyncio.sleep(0)
+        return self.search_city(info)
+
+
+def tool_with(searches):
+    tool = trip_tool.MultiCityTool()
+    tool.flight_tool = tool.hotel_tool = searches
+    return tool
+
+
+def sections(output):
+    return [section.split(" ===\n", 1) for section in output.split("\n\n=== ")[1:]]
+
+
+def test_failed_leg_is_reported_in_its_own_section():
+    output = tool_with(Searches(fail_into="ROM")).use(json.dumps(TRIP))
+    titles_and_results = sections(output)
+    assert [title for title, _ in titles_and_results] == [
+        "Leg 1 flight: DEN -> PAR on 2026-06-03",
+        "Leg 1 hotel: PAR, 2026-06-03 to 2026-06-07",
+        "Leg 2 hotel: BRU, 2026-06-07 to 2026-06-09",
+        "Leg 3 flight: BRU -> ROM on 2026-06-09",
+        "Leg 3 hotel: ROM, 2026-06-09 to 2026-06-13",
+        "Flight home: ROM -> DEN on 2026-06-13",
+    ]
+    results = dict(titles_and_results)
+    assert results["Leg 3 flight: BRU -> ROM on 2026-06-09"].startswith("This search failed (AttributeError:")
+    # the other legs still come back, numbers in the input reach the tools as text
+    assert results["Leg 1 flight: DEN -> PAR on 2026-06-03"] == "flights DEN-PAR under 900"
+    assert results["Leg 1 hotel: PAR, 2026-06-03 to 2026-06-07"] == "hotels in PAR for 2"
+
+
+def test_stop_without_a_flight_only_gets_a_hotel_search():
+    searches = Searches()
+    tool_with(searches).use(json.dumps(TRIP))
+    flights = [(info["ORIGIN"], info["DESTINATION"]) for kind, info in searches.calls if kind == "flight"]
+    assert sorted(flights) == [("BRU", "ROM"), ("DEN", "PAR"), ("ROM", "DEN")]
+    assert sorted(info["CITYCODE"] for kind, info in searches.calls if kind == "hotel") == ["BRU", "PAR", "ROM"]
+
+
+def test_no_flight_home():
+    trip = dict(TRIP, Return_To="none")
+    output = tool_with(Searches()).use(json.dumps(trip))
+    assert "Flight home" not in output
+
+
+def test_empty_legs_asks_for_the_legs():
+    searches = Searches()
+    tool = tool_with(searches)
+    trip = dict(TRIP, Legs=[])
+    assert tool.use(json.dumps(trip)) == "Missing or invalid field 'LEGS' in the trip, see the example input."
+    assert asyncio.run(tool.ause(json.dumps(trip))) == tool.use(json.dumps(trip))
+    assert searches.calls == []
+
+
+def test_sync_and_async_give_the_same_answer():
+    tool = tool_with(Searches(fail_into="PAR"))
+    assert tool.use(json.dumps(TRIP)) == asyncio.run(tool.ause(json.dumps(TRIP)))
+
+
+def test_cancelling_the_async_search_is_not_reported_as_a_failed_leg():
+    class Slow(Searches):
+        async def asearch_flights(self, info):
+            await asyncio.Event().wait()
+
+    async def main():
+        task = asyncio.create_task(tool_with(Slow()).ause(json.dumps(TRIP)))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await task
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(main())
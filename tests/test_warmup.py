@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from backend import warmup
+from backend.warmup import FAILED, OK, WarmUp
+
+
+@pytest.fixture(autouse=True)
+def no_retry_wait(monkeypatch):
+    monkeypatch.setattr(warmup, "WARMUP_RETRY_DELAY", 0)
+
+
+def flaky(failures):
+    calls = []
+
+    async def run():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise ConnectionError("token endpoint unreachable")
+
+    return run, calls
+
+
+def test_failed_stage_is_retried_until_it_works():
+    async def main():
+        agent_pool, calls = flaky(failures=1)
+        warm = WarmUp(required=("agent_pool",))
+        warm.start(agent_pool=agent_pool)
+        await warm.wait()
+        return warm, calls
+
+    warm, calls = asyncio.run(main())
+    assert len(calls) == 2
+    assert warm.ready
+    stage = warm.status()["stages"]["agent_pool"]
+    assert (stage["status"], stage["attempts"], stage["error"]) == (OK, 2, None)
+
+
+def test_only_required_stages_hold_up_readiness():
+    async def main():
+        agent_pool, _ = flaky(failures=0)
+        renderer, _ = flaky(failures=100)
+        warm = WarmUp(required=("agent_pool",))
+        warm.start(agent_pool=agent_pool, renderer=renderer)
+        # the renderer keeps failing, the agent teams are warm
+        for _ in range(20):
+            await asyncio.sleep(0)
+        ready, renderer_status = warm.ready, warm.stages["renderer"]["status"]
+        await warm.stop()
+        return ready, renderer_status, warm.ready
+
+    ready, renderer_status, ready_after_stop = asyncio.run(main())
+    assert ready
+    assert renderer_status == FAILED
+    # draining
+    assert not ready_after_stop
+
+
+def test_not_ready_until_required_stage_is_done():
+    async def main():
+        release = asyncio.Event()
+
+        async def agent_pool():
+            await release.wait()
+
+        warm = WarmUp(required=("agent_pool",))
+        warm.start(agent_pool=agent_pool)
+        await asyncio.sleep(0)
+        before = warm.ready
+        release.set()
+        await warm.wait()
+        return before, warm.ready
+
+    assert asyncio.run(main()) == (False, True)